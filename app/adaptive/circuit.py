@@ -1,13 +1,242 @@
 # =============================================================================
-# app/adaptive/circuit.py — Circuit breaker: skip provider when open
+# app/adaptive/circuit.py — Circuit breaker per (provider, model)
 # =============================================================================
-# Rules: 3 failures within 60 seconds → open circuit for 60 seconds.
-# When open, router skips provider (routing_reason = "circuit_open").
-# After cooldown, provider is allowed again.
+# States:
+#   closed:    calls pass. CIRCUIT_FAILURE_THRESHOLD failures within
+#              CIRCUIT_FAILURE_WINDOW_SEC → open.
+#   open:      calls are skipped (routing_reason = "circuit_open") until the
+#              cooldown expires → half-open.
+#   half_open: at most CIRCUIT_HALF_OPEN_PROBES calls are let through as probes;
+#              the rest are still skipped. That many probe successes → closed;
+#              a probe failure → open again.
+# The cooldown doubles on every trip without a successful close in between
+# (CIRCUIT_COOLDOWN_SEC, 2x, 4x, ... up to CIRCUIT_MAX_COOLDOWN_SEC), so a
+# provider that stays down is retried less and less often.
+# Circuits are kept per (provider, model): one failing model does not take
+# the provider's other models out of routing. Trips and closes are shared
+# with other workers through app.adaptive.shared_state (last change wins).
 # =============================================================================
 
-from app.adaptive.metrics import get_provider_metrics
+import time
+from collections import deque
 
+from app.core.config import get_settings
 
-def should_skip_provider(provider: str) -> bool:
-    return get_provider_metrics(provider).is_circuit_open()
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The circuit is open, or half-open with every probe slot taken."""
+
+
+class CircuitTicket:
+    """Admission to call through a circuit; release once with the outcome."""
+
+    __slots__ = ("breaker", "probe", "released")
+
+    def __init__(self, breaker: "CircuitBreaker", probe: bool) -> None:
+        self.breaker = breaker
+        self.probe = probe
+        self.released = False
+
+    def release(self, success: bool | None = None) -> None:
+        """success=None: the call was abandoned (cancelled, shed) and says nothing
+        about the provider."""
+        if self.released:
+            return
+        self.released = True
+        self.breaker._release(self, success)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int,
+        failure_window_sec: float,
+        cooldown_sec: float,
+        max_cooldown_sec: float,
+        half_open_probes: int,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.failure_window_sec = failure_window_sec
+        self.base_cooldown_sec = cooldown_sec
+        self.max_cooldown_sec = max(cooldown_sec, max_cooldown_sec)
+        self.half_open_probes = max(1, half_open_probes)
+        self._state = CLOSED
+        self._failures: deque[float] = deque()
+        self.open_until: float | None = None
+        self.cooldown_sec: float = 0.0
+        self.consecutive_trips = 0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self.trips = 0
+        self.changed_at: float = 0.0  # wall clock of the last trip/close
+        self.dirty = False  # changed since last published
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() >= self.open_until:
+            self._state = HALF_OPEN
+            self.probes_in_flight = 0
+            self.probe_successes = 0
+        return self._state
+
+    def is_blocked(self) -> bool:
+        """True when a call would be refused right now (routing check, no side effects)."""
+        state = self.state
+        if state == OPEN:
+            return True
+        return state == HALF_OPEN and self.probes_in_flight >= self.half_open_probes
+
+    def acquire(self) -> CircuitTicket:
+        if self.is_blocked():
+            raise CircuitOpenError(f"circuit {self._state}")
+        probe = self._state == HALF_OPEN
+        if probe:
+            self.probes_in_flight += 1
+        return CircuitTicket(self, probe)
+
+    def _release(self, ticket: CircuitTicket, success: bool | None) -> None:
+        if ticket.probe:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+        if success is None:
+            return
+        state = self.state
+        if state == HALF_OPEN:
+            # Only probe outcomes decide; late results of calls admitted while
+            # closed say nothing about whether the provider has recovered
+            if not ticket.probe:
+                return
+            if success:
+                self.probe_successes += 1
+                if self.probe_successes >= self.half_open_probes:
+                    self._close()
+            else:
+                self._trip()
+        elif state == CLOSED and not success:
+            now = time.monotonic()
+            self._failures.append(now)
+            cutoff = now - self.failure_window_sec
+            while self._failures and self._failures[0] < cutoff:
+                self._failures.popleft()
+            if len(self._failures) >= self.failure_threshold:
+                self._trip()
+
+    def _trip(self) -> None:
+        self.consecutive_trips += 1
+        self.trips += 1
+        self.cooldown_sec = min(
+            self.max_cooldown_sec,
+            self.base_cooldown_sec * (2 ** (self.consecutive_trips - 1)),
+        )
+        self._state = OPEN
+        self.open_until = time.monotonic() + self.cooldown_sec
+        self._failures.clear()
+        self._mark_changed()
+
+    def _close(self) -> None:
+        self._state = CLOSED
+        self.open_until = None
+        self.consecutive_trips = 0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        self._failures.clear()
+        self._mark_changed()
+
+    def _mark_changed(self) -> None:
+        self.changed_at = time.time()
+        self.dirty = True
+
+    def export(self) -> dict:
+        """Shareable state; open_until is converted to wall-clock time."""
+        open_until = None
+        if self._state != CLOSED and self.open_until is not None:
+            open_until = time.time() + (self.open_until - time.monotonic())
+        return {
+            "state": CLOSED if self._state == CLOSED else OPEN,
+            "open_until": open_until,
+            "cooldown_sec": self.cooldown_sec,
+            "consecutive_trips": self.consecutive_trips,
+            "changed_at": self.changed_at,
+        }
+
+    def apply_shared(self, data: dict) -> None:
+        """Adopt another worker's trip/close if it is newer than our last change."""
+        if data["changed_at"] <= self.changed_at:
+            return
+        self.changed_at = data["changed_at"]
+        self.dirty = False
+        self.cooldown_sec = data["cooldown_sec"]
+        self.consecutive_trips = data["consecutive_trips"]
+        self._failures.clear()
+        self.probe_successes = 0
+        if data["state"] == OPEN and data["open_until"] is not None:
+            self._state = OPEN
+            self.open_until = time.monotonic() + (data["open_until"] - time.time())
+        else:
+            self._state = CLOSED
+            self.open_until = None
+
+    def to_dict(self) -> dict:
+        state = self.state
+        retry_in = None
+        if state == OPEN:
+            retry_in = round(max(0.0, self.open_until - time.monotonic()), 2)
+        return {
+            "state": state,
+            "retry_in_sec": retry_in,
+            "cooldown_sec": self.cooldown_sec,
+            "recent_failures": len(self._failures),
+            "probes_in_flight": self.probes_in_flight,
+            "trips": self.trips,
+        }
+
+
+_CIRCUITS: dict[tuple[str, str], CircuitBreaker] = {}
+
+
+def get_circuit(provider: str, model: str) -> CircuitBreaker:
+    key = (provider, model)
+    breaker = _CIRCUITS.get(key)
+    if breaker is None:
+        s = get_settings()
+        breaker = CircuitBreaker(
+            failure_threshold=s.circuit_failure_threshold,
+            failure_window_sec=s.circuit_failure_window_sec,
+            cooldown_sec=s.circuit_cooldown_sec,
+            max_cooldown_sec=s.circuit_max_cooldown_sec,
+            half_open_probes=s.circuit_half_open_probes,
+        )
+        _CIRCUITS[key] = breaker
+    return breaker
+
+
+def should_skip_provider(provider: str, model: str) -> bool:
+    breaker = _CIRCUITS.get((provider, model))
+    return breaker is not None and breaker.is_blocked()
+
+
+def take_dirty_circuits() -> list[tuple[str, str, dict]]:
+    """(provider, model, export()) for circuits changed since the last call."""
+    changed = []
+    for (provider, model), breaker in _CIRCUITS.items():
+        if breaker.dirty:
+            breaker.dirty = False
+            changed.append((provider, model, breaker.export()))
+    return changed
+
+
+def export_circuits() -> list[tuple[str, str, dict]]:
+    """(provider, model, export()) for every circuit that has ever tripped."""
+    return [(p, model, b.export()) for (p, model), b in _CIRCUITS.items() if b.changed_at]
+
+
+def apply_shared_circuit(provider: str, model: str, data: dict) -> None:
+    get_circuit(provider, model).apply_shared(data)
+
+
+def provider_circuits(provider: str) -> dict[str, dict]:
+    """Circuit state of every model seen for `provider`, keyed by model."""
+    return {model: b.to_dict() for (p, model), b in _CIRCUITS.items() if p == provider}
@@ -0,0 +1,131 @@
+# =============================================================================
+# app/adaptive/health.py — Background provider health prober
+# =============================================================================
+# A single asyncio task (started in the FastAPI lifespan) probes every provider
+# and the database every HEALTH_PROBE_INTERVAL seconds and caches the result.
+# Routing and /health read the cache instead of doing a network round-trip
+# per request:
+#   - Ollama: GET /api/tags
+#   - Gemini: model metadata (GeminiClient.check_reachable)
+#   - OpenAI / Groq: GET /models (cheap, authenticated)
+# Providers without an API key are reported as "missing_key" and never probed.
+# =============================================================================
+
+import asyncio
+import time
+
+from app.core.config import get_settings
+from app.core.security import is_provider_configured
+from app.db.session import check_db_connected
+from app.llms.registry import get_client
+from app.utils.logger import logger
+
+PROBED_PROVIDERS = ("openai", "groq", "gemini", "ollama")
+STALE_AFTER_INTERVALS = 3  # cached results older than this many intervals are ignored
+
+
+class ProviderHealth:
+    def __init__(self) -> None:
+        self.configured: bool = False
+        self.reachable: bool | None = None  # None = not probed yet
+        self.checked_at: float | None = None  # wall clock, for display
+        self._checked_monotonic: float | None = None
+        self.probe_latency_ms: float | None = None
+
+    def update(self, configured: bool, reachable: bool | None, latency_ms: float | None) -> None:
+        self.configured = configured
+        self.reachable = reachable
+        self.probe_latency_ms = latency_ms
+        self.checked_at = time.time()
+        self._checked_monotonic = time.monotonic()
+
+    def is_fresh(self, max_age_sec: float) -> bool:
+        if self._checked_monotonic is None:
+            return False
+        return time.monotonic() - self._checked_monotonic <= max_age_sec
+
+    @property
+    def status(self) -> str:
+        if not self.configured:
+            return "missing_key"
+        if self.reachable is None:
+            return "unknown"
+        return "reachable" if self.reachable else "unreachable"
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "checked_at": self.checked_at,
+            "probe_latency_ms": round(self.probe_latency_ms, 2) if self.probe_latency_ms is not None else None,
+        }
+
+
+class HealthProber:
+    def __init__(self) -> None:
+        self.providers: dict[str, ProviderHealth] = {p: ProviderHealth() for p in PROBED_PROVIDERS}
+        self.db_ok: bool | None = None
+        self._task: asyncio.Task | None = None
+
+    async def _probe_provider(self, provider: str) -> None:
+        configured = is_provider_configured(provider)
+        if not configured:
+            self.providers[provider].update(False, False, None)
+            return
+        start = time.perf_counter()
+        try:
+            ok = await get_client(provider).check_reachable()
+        except Exception:
+            ok = False
+        self.providers[provider].update(True, ok, (time.perf_counter() - start) * 1000)
+
+    async def probe_once(self) -> None:
+        await asyncio.gather(
+            *(self._probe_provider(p) for p in PROBED_PROVIDERS),
+            return_exceptions=True,
+        )
+        self.db_ok = await asyncio.to_thread(check_db_connected)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logger.warning("health_probe_failed", extra={"error": str(e)})
+
+    async def start(self) -> None:
+        await self.probe_once()
+        if self._task is None or self._task.done():
+            interval = get_settings().health_probe_interval
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def is_reachable(self, provider: str) -> bool:
+        """Cached reachability; unprobed or stale entries count as reachable."""
+        health = self.providers.get(provider)
+        if health is None:
+            return False
+        if not is_provider_configured(provider):
+            return False
+        max_age = get_settings().health_probe_interval * STALE_AFTER_INTERVALS
+        if health.reachable is None or not health.is_fresh(max_age):
+            return True
+        return health.reachable
+
+    def to_dict(self) -> dict:
+        return {p: h.to_dict() for p, h in self.providers.items()}
+
+
+HEALTH_PROBER = HealthProber()
+
+
+def is_provider_reachable(provider: str) -> bool:
+    return HEALTH_PROBER.is_reachable(provider)
@@ -0,0 +1,131 @@
+# =============================================================================
+# app/adaptive/limiter.py — Adaptive (AIMD) outbound concurrency per provider
+# =============================================================================
+# Each provider gets a concurrency window `limit`:
+#   - success:  limit += 1 / limit   (about +1 per window of completed calls)
+#   - overload: limit *= LIMITER_BACKOFF (429 / 503 / timeout), at most once per
+#               "generation" — overloads from calls started before the last
+#               decrease are ignored so one burst does not collapse the window.
+# Calls above the window wait in a FIFO queue (bounded length and wait time);
+# when the wait is exceeded LimiterTimeout is raised so the router can shed
+# the call to a fallback instead of piling more load onto the provider.
+# =============================================================================
+
+import asyncio
+import time
+from collections import deque
+
+from app.core.config import get_settings
+
+LIMITER_BACKOFF = 0.5
+
+
+class LimiterTimeout(Exception):
+    """No concurrency slot became free within the allowed wait (or queue full)."""
+
+
+class Permit:
+    __slots__ = ("limiter", "started_at", "released")
+
+    def __init__(self, limiter: "AdaptiveLimiter") -> None:
+        self.limiter = limiter
+        self.started_at = time.monotonic()
+        self.released = False
+
+    def release(self, success: bool = True, overload: bool = False) -> None:
+        if self.released:
+            return
+        self.released = True
+        self.limiter._release(self, success, overload)
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int, min_limit: int, max_limit: int, max_queue: int) -> None:
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit: float = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._last_decrease_at = 0.0
+        self.overloads = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, max_wait: float) -> Permit:
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return Permit(self)
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LimiterTimeout("provider concurrency queue full")
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout=max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed to us just as we gave up: pass it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected += 1
+            raise LimiterTimeout(f"no provider concurrency slot within {max_wait:.1f}s") from e
+        return Permit(self)
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.in_flight += 1  # slot is reserved for the waiter being woken
+            fut.set_result(None)
+
+    def _release(self, permit: Permit, success: bool, overload: bool) -> None:
+        self.in_flight -= 1
+        if overload:
+            self.overloads += 1
+            if permit.started_at >= self._last_decrease_at:
+                self.limit = max(float(self.min_limit), self.limit * LIMITER_BACKOFF)
+                self._last_decrease_at = time.monotonic()
+        elif success:
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "overloads": self.overloads,
+            "rejected": self.rejected,
+        }
+
+
+_LIMITERS: dict[str, AdaptiveLimiter] = {}
+
+
+def get_limiter(provider: str) -> AdaptiveLimiter:
+    limiter = _LIMITERS.get(provider)
+    if limiter is None:
+        s = get_settings()
+        limiter = AdaptiveLimiter(
+            initial=s.limiter_initial,
+            min_limit=s.limiter_min,
+            max_limit=s.limiter_max,
+            max_queue=s.limiter_max_queue,
+        )
+        _LIMITERS[provider] = limiter
+    return limiter
@@ -1,74 +1,617 @@
 # =============================================================================
 # app/adaptive/metrics.py — Provider metrics and global registry
 # =============================================================================
+# Latency is tracked two ways:
+#   - an EMA (avg_latency), cheap and smooth, used by the default scorer;
+#   - fixed-bucket log-linear histograms (HDR-style, <= 1/16 relative error)
+#     kept in a ring of time buckets, giving p50/p95/p99 and failure rate over
+#     a sliding window (METRICS_WINDOW_SEC) instead of since process start.
+# Windows are kept per provider and per (provider, model).
+# With several workers (app.adaptive.shared_state), the other workers'
+# full-window totals are folded into this worker's provider-level reads.
+# =============================================================================
 
 import time
 
+from app.core.config import get_settings
+
 EMA_ALPHA = 0.2  # new sample weight; prev weight = 0.8
+HEDGE_BUDGET_MAX_TOKENS = 10.0
+
+# Histogram layout: values < 16 ms get one bucket per ms; above that each
+# power-of-two range is split into 16 linear sub-buckets, up to 2^18 ms.
+HIST_SUB_BITS = 4
+HIST_SUB_BUCKETS = 1 << HIST_SUB_BITS
+HIST_MAX_EXPONENT = 17
+HIST_BUCKETS = HIST_SUB_BUCKETS + (HIST_MAX_EXPONENT - HIST_SUB_BITS + 1) * HIST_SUB_BUCKETS
+REPORTED_PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+
+# Latency-vs-prompt-size regression: exponential forgetting so the fit follows drift
+REGRESSION_DECAY = 0.98
+REGRESSION_MIN_WEIGHT = 5.0
+
+
+def _bucket_index(latency_ms: float) -> int:
+    v = int(latency_ms)
+    if v < HIST_SUB_BUCKETS:
+        return max(v, 0)
+    exp = v.bit_length() - 1
+    if exp > HIST_MAX_EXPONENT:
+        return HIST_BUCKETS - 1
+    sub = (v >> (exp - HIST_SUB_BITS)) - HIST_SUB_BUCKETS
+    return HIST_SUB_BUCKETS + (exp - HIST_SUB_BITS) * HIST_SUB_BUCKETS + sub
+
+
+def _bucket_upper_ms(index: int) -> float:
+    if index < HIST_SUB_BUCKETS:
+        return float(index + 1)
+    i = index - HIST_SUB_BUCKETS
+    exp = i // HIST_SUB_BUCKETS + HIST_SUB_BITS
+    sub = i % HIST_SUB_BUCKETS
+    return float((HIST_SUB_BUCKETS + sub + 1) << (exp - HIST_SUB_BITS))
+
+
+class LatencyHistogram:
+    __slots__ = ("counts", "total", "sum_ms")
+
+    def __init__(self) -> None:
+        self.counts: list[int] = [0] * HIST_BUCKETS
+        self.total: int = 0
+        self.sum_ms: float = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        self.counts[_bucket_index(latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+
+    def merge(self, other: "LatencyHistogram", sign: int = 1) -> None:
+        if other.total == 0:
+            return
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += sign * c
+        self.total += sign * other.total
+        self.sum_ms += sign * other.sum_ms
+
+    def clear(self) -> None:
+        if self.total:
+            self.counts = [0] * HIST_BUCKETS
+        self.total = 0
+        self.sum_ms = 0.0
+
+    @property
+    def mean(self) -> float | None:
+        return self.sum_ms / self.total if self.total else None
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": {str(i): c for i, c in enumerate(self.counts) if c},
+            "sum_ms": self.sum_ms,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        hist = cls()
+        for i, c in data.get("counts", {}).items():
+            index = int(i)
+            if 0 <= index < HIST_BUCKETS:
+                hist.counts[index] += c
+                hist.total += c
+        hist.sum_ms = data.get("sum_ms", 0.0)
+        return hist
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound (ms) of the bucket holding quantile q; None when empty."""
+        if self.total <= 0:
+            return None
+        rank = max(1, int(q * self.total + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return _bucket_upper_ms(i)
+        return _bucket_upper_ms(HIST_BUCKETS - 1)
+
+
+class _TimeBucket:
+    __slots__ = ("epoch", "latency", "successes", "failures")
+
+    def __init__(self) -> None:
+        self.epoch: int = -1
+        self.latency = LatencyHistogram()
+        self.successes: int = 0
+        self.failures: int = 0
+
+
+class SlidingWindowStats:
+    """Ring of time buckets plus a running total of the live ones.
+
+    Recording is O(1); full-window percentiles walk one histogram. Shorter
+    windows (for reporting) merge the most recent buckets on demand.
+    """
+
+    __slots__ = ("bucket_sec", "_ring", "_total", "_successes", "_failures", "_epoch", "_peer")
+
+    def __init__(self, window_sec: float, buckets: int) -> None:
+        buckets = max(1, buckets)
+        self.bucket_sec = max(window_sec / buckets, 0.001)
+        self._ring = [_TimeBucket() for _ in range(buckets)]
+        self._total = LatencyHistogram()
+        self._successes = 0
+        self._failures = 0
+        self._epoch = -1
+        # Other workers' full-window (latency, successes, failures), see set_peer
+        self._peer: tuple[LatencyHistogram, int, int] | None = None
+
+    @property
+    def window_sec(self) -> float:
+        return self.bucket_sec * len(self._ring)
+
+    def _advance(self) -> _TimeBucket:
+        epoch = int(time.monotonic() / self.bucket_sec)
+        n = len(self._ring)
+        if epoch != self._epoch:
+            start = max(self._epoch + 1, epoch - n + 1)
+            for e in range(start, epoch + 1):
+                bucket = self._ring[e % n]
+                if bucket.epoch >= 0:
+                    self._total.merge(bucket.latency, sign=-1)
+                    self._successes -= bucket.successes
+                    self._failures -= bucket.failures
+                    bucket.latency.clear()
+                    bucket.successes = 0
+                    bucket.failures = 0
+                bucket.epoch = e
+            self._epoch = epoch
+        return self._ring[epoch % n]
+
+    def record_success(self, latency_ms: float) -> None:
+        bucket = self._advance()
+        bucket.latency.record(latency_ms)
+        bucket.successes += 1
+        self._total.record(latency_ms)
+        self._successes += 1
+
+    def record_failure(self) -> None:
+        self._advance().failures += 1
+        self._failures += 1
+
+    def _bucket_at(self, age_sec: float) -> _TimeBucket | None:
+        """Live bucket covering the moment `age_sec` ago, None if outside the window."""
+        self._advance()
+        back = int(age_sec / self.bucket_sec)
+        if back < 0 or back >= len(self._ring):
+            return None
+        bucket = self._ring[(self._epoch - back) % len(self._ring)]
+        return bucket if bucket.epoch == self._epoch - back else None
+
+    def add_at(self, age_sec: float, latency: LatencyHistogram, successes: int, failures: int) -> None:
+        """Add past samples (restore / seeding); dropped if older than the window."""
+        bucket = self._bucket_at(age_sec)
+        if bucket is None:
+            return
+        bucket.latency.merge(latency)
+        bucket.successes += successes
+        bucket.failures += failures
+        self._total.merge(latency)
+        self._successes += successes
+        self._failures += failures
+
+    def export(self) -> list[dict]:
+        """Non-empty buckets with their age, for snapshots."""
+        self._advance()
+        return [
+            {
+                "age_sec": (self._epoch - b.epoch) * self.bucket_sec,
+                "latency": b.latency.to_dict(),
+                "successes": b.successes,
+                "failures": b.failures,
+            }
+            for b in self._ring
+            if b.epoch >= 0 and (b.successes or b.failures)
+        ]
+
+    def restore(self, buckets: list[dict], extra_age_sec: float = 0.0) -> None:
+        """Load export()ed buckets, aged by `extra_age_sec` (e.g. downtime)."""
+        for b in buckets:
+            self.add_at(
+                b["age_sec"] + extra_age_sec,
+                LatencyHistogram.from_dict(b["latency"]),
+                b["successes"],
+                b["failures"],
+            )
+
+    def totals(self) -> tuple[LatencyHistogram, int, int]:
+        """This worker's own full-window totals (what gets shared with peers)."""
+        self._advance()
+        return self._total, self._successes, self._failures
+
+    def set_peer(self, latency: LatencyHistogram | None, successes: int = 0, failures: int = 0) -> None:
+        """Fold other workers' full-window totals into full-window reads; None clears."""
+        self._peer = (latency, successes, failures) if latency is not None else None
+
+    def _view(self, window_sec: float | None) -> tuple[LatencyHistogram, int, int]:
+        self._advance()
+        if window_sec is None or window_sec >= self.window_sec:
+            if self._peer is None:
+                return self._total, self._successes, self._failures
+            peer_latency, peer_successes, peer_failures = self._peer
+            merged = LatencyHistogram()
+            merged.merge(self._total)
+            merged.merge(peer_latency)
+            return merged, self._successes + peer_successes, self._failures + peer_failures
+        # Shorter (reporting) windows only cover this worker
+        keep = max(1, int(round(window_sec / self.bucket_sec)))
+        merged = LatencyHistogram()
+        successes = failures = 0
+        for bucket in self._ring:
+            if bucket.epoch > self._epoch - keep:
+                merged.merge(bucket.latency)
+                successes += bucket.successes
+                failures += bucket.failures
+        return merged, successes, failures
+
+    def count(self, window_sec: float | None = None) -> int:
+        _, successes, failures = self._view(window_sec)
+        return successes + failures
+
+    def latency_count(self, window_sec: float | None = None) -> int:
+        """Latency samples (successful calls) behind percentile()."""
+        return self._view(window_sec)[0].total
+
+    def percentile(self, q: float, window_sec: float | None = None) -> float | None:
+        return self._view(window_sec)[0].percentile(q)
+
+    def failure_rate(self, window_sec: float | None = None) -> float:
+        _, successes, failures = self._view(window_sec)
+        total = successes + failures
+        return failures / total if total else 0.0
+
+    def snapshot(self, window_sec: float | None = None) -> dict:
+        hist, successes, failures = self._view(window_sec)
+        total = successes + failures
+        out: dict = {
+            "requests": total,
+            "failure_rate": round(failures / total, 4) if total else 0.0,
+            "mean": round(hist.mean, 2) if hist.mean is not None else None,
+        }
+        for name, q in REPORTED_PERCENTILES:
+            out[name] = hist.percentile(q)
+        return out
+
+
+class LatencyRegression:
+    """Online least-squares fit of latency_ms = intercept + slope * prompt_tokens.
+
+    Sums are decayed by REGRESSION_DECAY per sample, so the fit reflects
+    roughly the last 1 / (1 - REGRESSION_DECAY) calls.
+    """
+
+    __slots__ = ("weight", "sx", "sy", "sxx", "sxy")
+
+    def __init__(self) -> None:
+        self.weight = 0.0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.sxx = 0.0
+        self.sxy = 0.0
+
+    def record(self, prompt_tokens: int, latency_ms: float) -> None:
+        d = REGRESSION_DECAY
+        x = float(prompt_tokens)
+        self.weight = self.weight * d + 1.0
+        self.sx = self.sx * d + x
+        self.sy = self.sy * d + latency_ms
+        self.sxx = self.sxx * d + x * x
+        self.sxy = self.sxy * d + x * latency_ms
+
+    def coefficients(self) -> tuple[float, float] | None:
+        """(intercept_ms, ms_per_token), or None until enough samples were seen."""
+        if self.weight < REGRESSION_MIN_WEIGHT:
+            return None
+        denom = self.weight * self.sxx - self.sx * self.sx
+        slope = 0.0
+        if denom > 1e-9:
+            # Bigger prompts are never predicted to be faster
+            slope = max(0.0, (self.weight * self.sxy - self.sx * self.sy) / denom)
+        intercept = (self.sy - slope * self.sx) / self.weight
+        return intercept, slope
+
+    def to_list(self) -> list[float]:
+        return [self.weight, self.sx, self.sy, self.sxx, self.sxy]
+
+    def add(self, sums: list[float]) -> None:
+        weight, sx, sy, sxx, sxy = sums
+        self.weight += weight
+        self.sx += sx
+        self.sy += sy
+        self.sxx += sxx
+        self.sxy += sxy
+
+    def combined(self, other: "LatencyRegression") -> "LatencyRegression":
+        merged = LatencyRegression()
+        merged.add(self.to_list())
+        merged.add(other.to_list())
+        return merged
+
+    def predict(self, prompt_tokens: int) -> float | None:
+        coeffs = self.coefficients()
+        if coeffs is None:
+            return None
+        intercept, slope = coeffs
+        return max(0.0, intercept + slope * prompt_tokens)
+
+
+def _new_window() -> SlidingWindowStats:
+    s = get_settings()
+    return SlidingWindowStats(s.metrics_window_sec, s.metrics_window_buckets)
 
 
 class ProviderMetrics:
+    __slots__ = (
+        "total_requests",
+        "success_count",
+        "failure_count",
+        "_avg_latency",
+        "_avg_ttft",
+        "last_failure_timestamp",
+        "window",
+        "models",
+        "latency_model",
+        "_peer_latency_model",
+        "_peer_avg_latency",
+        "hedge_requests",
+        "hedge_wins",
+        "hedge_losses",
+    )
+
     def __init__(self) -> None:
         self.total_requests: int = 0
         self.success_count: int = 0
         self.failure_count: int = 0
         self._avg_latency: float | None = None  # rolling EMA
+        self._avg_ttft: float | None = None  # rolling EMA of time-to-first-token (streams)
         self.last_failure_timestamp: float | None = None
-        self.circuit_open_until: float | None = None
-        self._failure_timestamps: list[float] = []  # for 3-in-60s rule
+        self.window = _new_window()
+        self.models: dict[str, SlidingWindowStats] = {}
+        self.latency_model = LatencyRegression()
+        # Other workers' view (shared state): regression sums and (EMA, weight)
+        self._peer_latency_model: LatencyRegression | None = None
+        self._peer_avg_latency: tuple[float, int] | None = None
+        self.hedge_requests: int = 0  # hedges fired while this provider was primary
+        self.hedge_wins: int = 0  # this provider was the hedge and answered first
+        self.hedge_losses: int = 0  # this provider was the hedge and was cancelled
 
     @property
     def failure_rate(self) -> float:
+        """Failure rate over the sliding window, so old outages stop counting."""
+        return self.window.failure_rate()
+
+    @property
+    def lifetime_failure_rate(self) -> float:
         if self.total_requests == 0:
             return 0.0
         return self.failure_count / self.total_requests
 
     @property
     def avg_latency(self) -> float:
+        if self._peer_avg_latency is not None:
+            peer_avg, peer_weight = self._peer_avg_latency
+            if self._avg_latency is None:
+                return peer_avg
+            _, own_weight, _ = self.window.totals()
+            own_weight = max(own_weight, 1)
+            return (self._avg_latency * own_weight + peer_avg * peer_weight) / (own_weight + peer_weight)
         return self._avg_latency if self._avg_latency is not None else 0.0
 
-    def record_success(self, latency_ms: float) -> None:
+    @property
+    def latency_sample_count(self) -> int:
+        # Failures record no latency: count only the samples the percentiles rest on
+        return self.window.latency_count()
+
+    def latency_percentile(self, q: float) -> float | None:
+        """Latency (ms) at quantile q (0-1) over the sliding window, None if no samples."""
+        return self.window.percentile(q)
+
+    def model_window(self, model: str) -> SlidingWindowStats:
+        stats = self.models.get(model)
+        if stats is None:
+            stats = _new_window()
+            self.models[model] = stats
+        return stats
+
+    @property
+    def avg_ttft(self) -> float:
+        return self._avg_ttft if self._avg_ttft is not None else 0.0
+
+    def record_ttft(self, ttft_ms: float) -> None:
+        if self._avg_ttft is None:
+            self._avg_ttft = ttft_ms
+        else:
+            self._avg_ttft = (self._avg_ttft * (1 - EMA_ALPHA)) + (ttft_ms * EMA_ALPHA)
+
+    def predict_latency(self, prompt_tokens: int) -> float | None:
+        """Expected latency (ms) for a prompt of this size, from observed history."""
+        if self._peer_latency_model is not None:
+            return self.latency_model.combined(self._peer_latency_model).predict(prompt_tokens)
+        return self.latency_model.predict(prompt_tokens)
+
+    def record_success(
+        self,
+        latency_ms: float,
+        model: str | None = None,
+        prompt_tokens: int | None = None,
+    ) -> None:
         self.total_requests += 1
         self.success_count += 1
+        self.window.record_success(latency_ms)
+        if prompt_tokens is not None:
+            self.latency_model.record(prompt_tokens, latency_ms)
+        if model:
+            self.model_window(model).record_success(latency_ms)
         if self._avg_latency is None:
             self._avg_latency = latency_ms
         else:
             self._avg_latency = (self._avg_latency * (1 - EMA_ALPHA)) + (latency_ms * EMA_ALPHA)
 
-    def record_failure(self) -> None:
+    def record_failure(self, model: str | None = None) -> None:
         self.total_requests += 1
         self.failure_count += 1
-        now = time.monotonic()
-        self.last_failure_timestamp = now
-        self._failure_timestamps.append(now)
-        # keep only last 60 seconds
-        cutoff = now - 60.0
-        self._failure_timestamps = [t for t in self._failure_timestamps if t >= cutoff]
-        if len(self._failure_timestamps) >= 3:
-            self.open_circuit(duration_sec=60)
-
-    def is_circuit_open(self) -> bool:
-        if self.circuit_open_until is None:
-            return False
-        if time.monotonic() >= self.circuit_open_until:
-            self.circuit_open_until = None
-            return False
-        return True
-
-    def open_circuit(self, duration_sec: int = 60) -> None:
-        self.circuit_open_until = time.monotonic() + duration_sec
+        self.window.record_failure()
+        if model:
+            self.model_window(model).record_failure()
+        self.last_failure_timestamp = time.monotonic()
+
+    def shared_snapshot(self) -> dict:
+        """This worker's routing inputs, published for the other workers."""
+        latency, successes, failures = self.window.totals()
+        return {
+            "latency": latency.to_dict(),
+            "successes": successes,
+            "failures": failures,
+            "avg_latency": self._avg_latency,
+            "regression": self.latency_model.to_list(),
+        }
+
+    def set_peers(self, snapshots: list[dict]) -> None:
+        """Merge the other workers' shared_snapshot()s into routing reads."""
+        if not snapshots:
+            self.window.set_peer(None)
+            self._peer_latency_model = None
+            self._peer_avg_latency = None
+            return
+        latency = LatencyHistogram()
+        successes = failures = 0
+        regression = LatencyRegression()
+        avg_sum = 0.0
+        avg_weight = 0
+        for snap in snapshots:
+            latency.merge(LatencyHistogram.from_dict(snap["latency"]))
+            successes += snap["successes"]
+            failures += snap["failures"]
+            regression.add(snap["regression"])
+            if snap.get("avg_latency") is not None:
+                weight = max(snap["successes"], 1)
+                avg_sum += snap["avg_latency"] * weight
+                avg_weight += weight
+        self.window.set_peer(latency, successes, failures)
+        self._peer_latency_model = regression
+        self._peer_avg_latency = (avg_sum / avg_weight, avg_weight) if avg_weight else None
+
+    def record_history(self, latency_ms: float, model: str | None, prompt_tokens: int | None, age_sec: float) -> None:
+        """Replay a past successful call (oldest first), e.g. from the logs table.
+
+        Feeds the windows, EMA and regression but not the lifetime counters.
+        """
+        sample = LatencyHistogram()
+        sample.record(latency_ms)
+        self.window.add_at(age_sec, sample, 1, 0)
+        if model:
+            self.model_window(model).add_at(age_sec, sample, 1, 0)
+        if prompt_tokens is not None:
+            self.latency_model.record(prompt_tokens, latency_ms)
+        if self._avg_latency is None:
+            self._avg_latency = latency_ms
+        else:
+            self._avg_latency = (self._avg_latency * (1 - EMA_ALPHA)) + (latency_ms * EMA_ALPHA)
+
+    def export(self) -> dict:
+        """Full state for snapshots (see app.adaptive.persistence)."""
+        return {
+            "total_requests": self.total_requests,
+            "success_count": self.success_count,
+            "failure_count": self.failure_count,
+            "avg_latency": self._avg_latency,
+            "avg_ttft": self._avg_ttft,
+            "window": self.window.export(),
+            "models": {model: stats.export() for model, stats in self.models.items()},
+            "regression": self.latency_model.to_list(),
+            "hedge_requests": self.hedge_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_losses": self.hedge_losses,
+        }
+
+    def restore(self, data: dict, downtime_sec: float, decay: float) -> None:
+        """Add export()ed state (one call per saved worker). Window samples age
+        by the downtime (and drop out of the window as usual); regression
+        weight is scaled by `decay`; EMAs are averaged by success count."""
+        own_weight, weight = self.success_count, max(data.get("success_count", 0), 1)
+        self._avg_latency = _weighted(self._avg_latency, own_weight, data.get("avg_latency"), weight)
+        self._avg_ttft = _weighted(self._avg_ttft, own_weight, data.get("avg_ttft"), weight)
+        self.total_requests += data.get("total_requests", 0)
+        self.success_count += data.get("success_count", 0)
+        self.failure_count += data.get("failure_count", 0)
+        self.window.restore(data.get("window", []), downtime_sec)
+        for model, buckets in data.get("models", {}).items():
+            self.model_window(model).restore(buckets, downtime_sec)
+        regression = data.get("regression")
+        if regression:
+            self.latency_model.add([v * decay for v in regression])
+        self.hedge_requests += data.get("hedge_requests", 0)
+        self.hedge_wins += data.get("hedge_wins", 0)
+        self.hedge_losses += data.get("hedge_losses", 0)
+
+    def record_hedge(self, won: bool) -> None:
+        if won:
+            self.hedge_wins += 1
+        else:
+            self.hedge_losses += 1
 
     def to_dict(self) -> dict:
+        windows = get_settings().metrics_report_windows
         return {
             "total_requests": self.total_requests,
             "success": self.success_count,
             "failure": self.failure_count,
             "failure_rate": round(self.failure_rate, 4),
+            "lifetime_failure_rate": round(self.lifetime_failure_rate, 4),
             "avg_latency": round(self.avg_latency, 2),
-            "circuit_open": self.is_circuit_open(),
+            "avg_ttft": round(self.avg_ttft, 2),
+            "latency_windows": {f"{int(w)}s": self.window.snapshot(w) for w in windows},
+            "models": {model: stats.snapshot() for model, stats in self.models.items()},
+            "latency_model": _coefficients_dict(self.latency_model.coefficients()),
+            "hedge_requests": self.hedge_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_losses": self.hedge_losses,
         }
 
 
+def _coefficients_dict(coeffs: tuple[float, float] | None) -> dict | None:
+    if coeffs is None:
+        return None
+    intercept, slope = coeffs
+    return {"intercept_ms": round(intercept, 2), "ms_per_1k_tokens": round(slope * 1000, 2)}
+
+
+def _weighted(own: float | None, own_weight: int, other: float | None, other_weight: int) -> float | None:
+    if own is None or own_weight <= 0:
+        return other if other is not None else own
+    if other is None:
+        return own
+    return (own * own_weight + other * other_weight) / (own_weight + other_weight)
+
+
+class HedgeBudget:
+    """Token bucket capping hedged calls to a fraction of routed requests.
+
+    Every request deposits `ratio` tokens (capped at HEDGE_BUDGET_MAX_TOKENS);
+    each hedge spends one, so over time hedges stay <= ratio * requests.
+    """
+
+    def __init__(self) -> None:
+        self.tokens: float = 0.0
+
+    def deposit(self, ratio: float) -> None:
+        self.tokens = min(HEDGE_BUDGET_MAX_TOKENS, self.tokens + max(0.0, ratio))
+
+    def try_spend(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
 PROVIDER_STATS: dict[str, ProviderMetrics] = {
     "openai": ProviderMetrics(),
     "groq": ProviderMetrics(),
@@ -77,5 +620,8 @@ PROVIDER_STATS: dict[str, ProviderMetrics] = {
 }
 
 
+HEDGE_BUDGET = HedgeBudget()
+
+
 def get_provider_metrics(provider: str) -> ProviderMetrics:
     return PROVIDER_STATS[provider]
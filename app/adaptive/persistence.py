@@ -0,0 +1,244 @@
+# =============================================================================
+# app/adaptive/persistence.py — Snapshot / restore of provider metrics
+# =============================================================================
+# Every METRICS_SNAPSHOT_SEC (and at shutdown) the metrics registry — EMA,
+# sliding-window histograms and failure counts, per-model windows, latency
+# regression, hedge counters — and the circuit states are written (JSON,
+# atomic replace). Each uvicorn worker writes only what it recorded itself, to
+# its own file beside METRICS_SNAPSHOT_PATH (metrics_snapshot.<worker>.json),
+# and holds an exclusive flock on metrics_snapshot.<worker>.lock while it runs.
+# On startup one worker — the holder of metrics_snapshot.lock — restores the
+# files of every worker that is no longer running, summed, then deletes them
+# once its own snapshot (which now includes them) is written. The others start
+# empty: restored samples reach them through shared state, counted once.
+# Restoring takes the downtime into account:
+#   - window samples are aged by the downtime, so anything older than
+#     METRICS_WINDOW_SEC simply drops out;
+#   - regression weight decays with half-life METRICS_RESTORE_HALF_LIFE_SEC;
+#   - open circuits stay open until their original deadline, then go half-open.
+# Without any snapshot (first deploy, deleted files) the restoring worker can
+# seed the latency stats from the last METRICS_SEED_WINDOW_SEC of the logs
+# table instead.
+# =============================================================================
+
+import asyncio
+import datetime
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+from app.adaptive.circuit import apply_shared_circuit, export_circuits
+from app.adaptive.metrics import PROVIDER_STATS
+from app.core.config import get_settings
+from app.db.session import get_recent_latencies
+from app.utils.file_lock import release, try_lock
+from app.utils.logger import logger
+
+SNAPSHOT_VERSION = 1
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def _snapshot_path() -> Path | None:
+    raw = get_settings().metrics_snapshot_path
+    if not raw:
+        return None
+    path = Path(raw)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def _worker_files(path: Path) -> dict[str, list[Path]]:
+    """Snapshot and lock files of every worker that wrote beside `path`, by worker id."""
+    pattern = re.compile(rf"^{re.escape(path.stem)}\.(\d+-\d+)(?:{re.escape(path.suffix)}|\.lock)$")
+    found: dict[str, list[Path]] = {}
+    for entry in path.parent.iterdir():
+        m = pattern.match(entry.name)
+        if m:
+            found.setdefault(m.group(1), []).append(entry)
+    return found
+
+
+def _remove(paths: list[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def build_snapshot() -> dict:
+    return {
+        "version": SNAPSHOT_VERSION,
+        "saved_at": time.time(),
+        "providers": {name: m.export() for name, m in PROVIDER_STATS.items()},
+        "circuits": [list(c) for c in export_circuits()],
+    }
+
+
+def _write_atomic(path: Path, data: dict) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def restore_snapshot(data: dict) -> float:
+    """Add a build_snapshot() dict to the registry; returns the downtime in seconds."""
+    downtime = max(0.0, time.time() - data.get("saved_at", time.time()))
+    half_life = get_settings().metrics_restore_half_life_sec
+    decay = 0.5 ** (downtime / half_life) if half_life > 0 else 1.0
+    for name, state in data.get("providers", {}).items():
+        metrics = PROVIDER_STATS.get(name)
+        if metrics is not None:
+            metrics.restore(state, downtime, decay)
+    for provider, model, state in data.get("circuits", []):
+        apply_shared_circuit(provider, model, state)
+    return downtime
+
+
+def seed_from_logs(window_sec: float) -> int:
+    """Replay recent successful calls from the logs table; returns rows used."""
+    now = datetime.datetime.utcnow()
+    used = 0
+    for row in get_recent_latencies(window_sec):
+        metrics = PROVIDER_STATS.get(row["provider"])
+        if metrics is None or row["latency_ms"] is None:
+            continue
+        try:
+            logged_at = datetime.datetime.fromisoformat(row["timestamp"])
+        except (TypeError, ValueError):
+            continue
+        age_sec = max(0.0, (now - logged_at).total_seconds())
+        metrics.record_history(row["latency_ms"], row["model"], row["prompt_length"], age_sec)
+        used += 1
+    return used
+
+
+class MetricsSnapshotter:
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self.worker_id = f"{os.getpid()}-{int(time.time() * 1000)}"
+        self._worker_lock: int | None = None  # held while this worker runs
+        self._restore_lock: int | None = None  # held by the one worker that restores
+        self._consumed: list[Path] = []  # restored files, deleted after our next save
+        self.last_saved_at: float | None = None
+
+    def _own_path(self, path: Path) -> Path:
+        return path.with_name(f"{path.stem}.{self.worker_id}{path.suffix}")
+
+    async def save(self) -> None:
+        path = _snapshot_path()
+        if path is None or self._worker_lock is None:
+            return
+        # Serialize on the event loop (consistent view), write in a thread
+        data = build_snapshot()
+        await asyncio.to_thread(_write_atomic, self._own_path(path), data)
+        self.last_saved_at = data["saved_at"]
+        if self._consumed:
+            consumed, self._consumed = self._consumed, []
+            await asyncio.to_thread(_remove, consumed)
+
+    def _collect(self, path: Path) -> tuple[list[dict], list[Path], list[int], bool]:
+        """Snapshots of the workers no longer running (runs in a thread).
+
+        Returns (snapshots, their files, the locks taken on them, whether any
+        worker snapshot exists at all, running or not).
+        """
+        snapshots: list[dict] = []
+        files: list[Path] = []
+        locks: list[int] = []
+        found_any = path.exists()
+        if found_any:
+            # Single snapshot written before snapshots were per worker
+            snapshots.append(json.loads(path.read_text("utf-8")))
+            files.append(path)
+        for worker_id, paths in _worker_files(path).items():
+            if worker_id == self.worker_id:
+                continue
+            found_any = found_any or any(p.suffix == path.suffix for p in paths)
+            fd = try_lock(path.with_name(f"{path.stem}.{worker_id}.lock"))
+            if fd is None:
+                continue  # still running: its samples reach us through shared state
+            locks.append(fd)
+            for p in paths:
+                if p.suffix == path.suffix:
+                    try:
+                        data = json.loads(p.read_text("utf-8"))
+                    except (OSError, ValueError) as e:
+                        logger.warning("metrics_restore_failed", extra={"path": str(p), "error": str(e)})
+                        continue
+                    snapshots.append(data)
+            files.extend(paths)
+        return [data for data in snapshots if data.get("version") == SNAPSHOT_VERSION], files, locks, found_any
+
+    async def load(self) -> None:
+        s = get_settings()
+        path = _snapshot_path()
+        if path is not None:
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            self._worker_lock = await asyncio.to_thread(try_lock, path.with_name(f"{path.stem}.{self.worker_id}.lock"))
+            self._restore_lock = await asyncio.to_thread(try_lock, path.with_name(f"{path.stem}.lock"))
+            if self._restore_lock is None:
+                return  # another worker restores; its samples reach us through shared state
+            try:
+                snapshots, files, locks, found_any = await asyncio.to_thread(self._collect, path)
+            except Exception as e:
+                logger.warning("metrics_restore_failed", extra={"error": str(e)})
+                snapshots, files, locks, found_any = [], [], [], True
+            downtime = None
+            for data in snapshots:
+                try:
+                    restored = restore_snapshot(data)
+                except Exception as e:
+                    logger.warning("metrics_restore_failed", extra={"error": str(e)})
+                    continue
+                downtime = restored if downtime is None else min(downtime, restored)
+            self._consumed = files
+            for fd in locks:
+                release(fd)
+            if downtime is not None:
+                logger.info(
+                    "metrics_restored",
+                    extra={"workers": len(snapshots), "downtime_sec": round(downtime, 1)},
+                )
+                await self.save()
+                return
+            if found_any:
+                return
+        if s.metrics_seed_from_logs:
+            try:
+                used = await asyncio.to_thread(seed_from_logs, s.metrics_seed_window_sec)
+                logger.info("metrics_seeded_from_logs", extra={"rows": used})
+            except Exception as e:
+                logger.warning("metrics_seed_failed", extra={"error": str(e)})
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.warning("metrics_snapshot_failed", extra={"error": str(e)})
+
+    async def start(self) -> None:
+        await self.load()
+        if _snapshot_path() is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(get_settings().metrics_snapshot_sec))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.save()
+        except Exception as e:
+            logger.warning("metrics_snapshot_failed", extra={"error": str(e)})
+        for fd in (self._worker_lock, self._restore_lock):
+            if fd is not None:
+                release(fd)
+        self._worker_lock = self._restore_lock = None
+
+
+METRICS_SNAPSHOTTER = MetricsSnapshotter()
@@ -0,0 +1,236 @@
+# =============================================================================
+# app/adaptive/shared_state.py — Routing state shared across uvicorn workers
+# =============================================================================
+# Each worker keeps its metrics, circuits and rate-limit counters in memory
+# (nothing on the request hot path touches the disk). When SHARED_STATE_PATH
+# is set, a background task syncs every SHARED_STATE_SYNC_SEC through a local
+# SQLite file in WAL mode:
+#   - provider metrics: each worker publishes its full-window latency
+#     histogram, success/failure counts, EMA and regression sums; the other
+#     workers' rows are merged into ProviderMetrics peer totals, so routing
+#     scores and percentiles cover every worker.
+#   - circuits: trips and closes are published as they happen; a newer change
+#     from another worker is adopted (last change wins).
+#   - rate limits: each worker publishes its per-IP request count for the
+#     current window; rate_limit_check adds the other workers' counts.
+# Rows of workers that stopped syncing are ignored after STALE_AFTER_SYNCS
+# intervals and deleted by the next writer.
+# =============================================================================
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Callable
+
+from app.adaptive.circuit import apply_shared_circuit, get_circuit, take_dirty_circuits
+from app.adaptive.metrics import PROVIDER_STATS
+from app.core.config import get_settings
+from app.utils.logger import logger
+
+STALE_AFTER_SYNCS = 5
+MIN_STALE_SEC = 10.0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=2.0, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS worker_metrics (
+            worker_id TEXT NOT NULL,
+            provider TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (worker_id, provider)
+        );
+        CREATE TABLE IF NOT EXISTS circuits (
+            provider TEXT NOT NULL,
+            model TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            changed_at REAL NOT NULL,
+            worker_id TEXT NOT NULL,
+            PRIMARY KEY (provider, model)
+        );
+        CREATE TABLE IF NOT EXISTS rate_counts (
+            worker_id TEXT NOT NULL,
+            ip TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (worker_id, ip)
+        );
+        """
+    )
+    return conn
+
+
+class SharedState:
+    def __init__(self) -> None:
+        self.worker_id = f"{os.getpid()}-{int(time.time() * 1000)}"
+        self.enabled = False
+        self._conn: sqlite3.Connection | None = None
+        self._task: asyncio.Task | None = None
+        self._rate_counts: Callable[[], dict[str, int]] | None = None
+        self._peer_rates: dict[str, int] = {}
+        self._circuits_seen_at = 0.0
+        self.peer_workers = 0
+        self.last_sync_at: float | None = None
+        self.sync_errors = 0
+
+    def peer_rate_count(self, ip: str) -> int:
+        """Requests from `ip` in the current window seen by the other workers."""
+        return self._peer_rates.get(ip, 0)
+
+    # -- sync -----------------------------------------------------------------
+
+    def _exchange(
+        self,
+        metrics: dict[str, dict],
+        circuits: list[tuple[str, str, dict]],
+        rates: dict[str, int],
+        stale_sec: float,
+    ) -> tuple[dict[str, list[dict]], list[tuple[str, str, dict]], dict[str, int], int]:
+        """Publish this worker's state and read everyone else's (runs in a thread)."""
+        conn = self._conn
+        now = time.time()
+        cutoff = now - stale_sec
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO worker_metrics VALUES (?, ?, ?, ?)",
+                [(self.worker_id, p, json.dumps(snap), now) for p, snap in metrics.items()],
+            )
+            for provider, model, data in circuits:
+                conn.execute(
+                    "INSERT INTO circuits VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (provider, model) DO UPDATE SET payload = excluded.payload, "
+                    "changed_at = excluded.changed_at, worker_id = excluded.worker_id "
+                    "WHERE excluded.changed_at > circuits.changed_at",
+                    (provider, model, json.dumps(data), data["changed_at"], self.worker_id),
+                )
+            conn.execute("DELETE FROM rate_counts WHERE worker_id = ?", (self.worker_id,))
+            conn.executemany(
+                "INSERT INTO rate_counts VALUES (?, ?, ?, ?)",
+                [(self.worker_id, ip, count, now) for ip, count in rates.items() if count],
+            )
+            conn.execute("DELETE FROM worker_metrics WHERE updated_at < ?", (cutoff,))
+            conn.execute("DELETE FROM rate_counts WHERE updated_at < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        peer_metrics: dict[str, list[dict]] = {}
+        workers: set[str] = set()
+        for worker_id, provider, payload in conn.execute(
+            "SELECT worker_id, provider, payload FROM worker_metrics WHERE worker_id != ?",
+            (self.worker_id,),
+        ):
+            workers.add(worker_id)
+            peer_metrics.setdefault(provider, []).append(json.loads(payload))
+        peer_circuits = [
+            (provider, model, json.loads(payload))
+            for provider, model, payload in conn.execute(
+                "SELECT provider, model, payload FROM circuits WHERE changed_at > ? AND worker_id != ?",
+                (self._circuits_seen_at, self.worker_id),
+            )
+        ]
+        peer_rates = dict(
+            conn.execute(
+                "SELECT ip, SUM(count) FROM rate_counts WHERE worker_id != ? GROUP BY ip",
+                (self.worker_id,),
+            ).fetchall()
+        )
+        return peer_metrics, peer_circuits, peer_rates, len(workers)
+
+    async def sync_once(self) -> None:
+        s = get_settings()
+        stale_sec = max(s.shared_state_sync_sec * STALE_AFTER_SYNCS, MIN_STALE_SEC)
+        # Snapshot on the event loop (no locks needed), do the disk I/O in a thread
+        metrics = {name: m.shared_snapshot() for name, m in PROVIDER_STATS.items()}
+        circuits = take_dirty_circuits()
+        rates = self._rate_counts() if self._rate_counts is not None else {}
+        try:
+            peer_metrics, peer_circuits, peer_rates, workers = await asyncio.to_thread(
+                self._exchange, metrics, circuits, rates, stale_sec
+            )
+        except Exception:
+            # Publish the circuit changes again next time
+            for provider, model, _ in circuits:
+                get_circuit(provider, model).dirty = True
+            raise
+        for name, m in PROVIDER_STATS.items():
+            m.set_peers(peer_metrics.get(name, []))
+        for provider, model, data in peer_circuits:
+            apply_shared_circuit(provider, model, data)
+            self._circuits_seen_at = max(self._circuits_seen_at, data["changed_at"])
+        self._peer_rates = peer_rates
+        self.peer_workers = workers
+        self.last_sync_at = time.time()
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sync_once()
+            except Exception as e:
+                self.sync_errors += 1
+                logger.warning("shared_state_sync_failed", extra={"error": str(e)})
+
+    async def start(self, rate_counts: Callable[[], dict[str, int]] | None = None) -> None:
+        """Open the shared file and start syncing; no-op unless SHARED_STATE_PATH is set.
+
+        `rate_counts` returns this worker's per-IP request counts for the
+        current rate-limit window.
+        """
+        s = get_settings()
+        if not s.shared_state_path:
+            return
+        self._rate_counts = rate_counts
+        self._conn = await asyncio.to_thread(_connect, s.shared_state_path)
+        self.enabled = True
+        try:
+            await self.sync_once()
+        except Exception as e:
+            self.sync_errors += 1
+            logger.warning("shared_state_sync_failed", extra={"error": str(e)})
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(s.shared_state_sync_sec))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._conn is not None:
+            conn = self._conn
+            self._conn = None
+            self.enabled = False
+
+            def _leave() -> None:
+                # Our counts must not keep weighing on the other workers
+                conn.execute("DELETE FROM worker_metrics WHERE worker_id = ?", (self.worker_id,))
+                conn.execute("DELETE FROM rate_counts WHERE worker_id = ?", (self.worker_id,))
+                conn.close()
+
+            try:
+                await asyncio.to_thread(_leave)
+            except Exception as e:
+                logger.warning("shared_state_close_failed", extra={"error": str(e)})
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "peer_workers": self.peer_workers,
+            "last_sync_at": self.last_sync_at,
+            "sync_errors": self.sync_errors,
+        }
+
+
+SHARED_STATE = SharedState()
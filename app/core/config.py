@@ -7,12 +7,135 @@ from pydantic import BaseModel
 load_dotenv()
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
 class Settings(BaseModel):
     openai_api_key: str = ""
     groq_api_key: str = ""
     gemini_api_key: str = ""
     ollama_base_url: str = "http://localhost:11434"
+    # Provider API roots (point at scripts/mock_providers.py to run offline)
+    openai_base_url: str = "https://api.openai.com/v1"
+    groq_base_url: str = "https://api.groq.com/openai/v1"
+    gemini_base_url: str = "https://generativelanguage.googleapis.com/v1beta"
     request_timeout: int = 30
+    # Per-IP requests per minute on the generate endpoints (raise for load tests)
+    rate_limit_requests: int = 15
+    # Ollama model residency and runtime options (0 = Ollama's default)
+    ollama_keep_alive: str = "30m"
+    ollama_num_ctx: int = 0
+    ollama_num_thread: int = 0
+    ollama_preload: bool = True
+    ollama_keep_warm_sec: float = 240.0
+    # Fallback chain: attempts share one REQUEST_TIMEOUT deadline
+    fallback_max_attempts: int = 3
+    fallback_attempt_share: float = 0.6
+    fallback_min_attempt_sec: float = 2.0
+    # Pooled HTTP clients (one per provider, owned by the app lifespan)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 60.0
+    http2_enabled: bool = False
+    http_prewarm_connections: int = 2
+    # Hedged requests (auto routing only): duplicate a slow call to the next-best provider
+    hedge_enabled: bool = False
+    hedge_percentile: float = 0.95
+    hedge_budget_ratio: float = 0.1
+    # Background provider/DB health probing (seconds between probes)
+    health_probe_interval: float = 15.0
+    # Response cache in front of the providers (exact + optional semantic layer)
+    response_cache_enabled: bool = True
+    response_cache_ttl_sec: float = 3600.0
+    response_cache_max_entries: int = 2048
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_semantic: bool = False
+    response_cache_similarity: float = 0.92
+    # Single-flight: identical in-flight /generate requests share one provider call
+    coalesce_requests: bool = True
+    # Tutoring sessions (server-side history)
+    session_ttl_sec: float = 3600.0
+    session_max_sessions: int = 1000
+    session_max_turns: int = 200
+    session_history_token_budget: int = 3000
+    session_rag_reuse_max_tokens: int = 24
+    # POST /generate/batch: max concurrent items per requested provider
+    batch_concurrency_per_provider: int = 4
+    # Adaptive (AIMD) outbound concurrency per provider
+    limiter_initial: int = 4
+    limiter_min: int = 1
+    limiter_max: int = 64
+    limiter_max_queue: int = 100
+    limiter_max_wait_sec: float = 5.0
+    # Sliding-window latency/failure metrics
+    metrics_window_sec: float = 300.0
+    metrics_window_buckets: int = 30
+    metrics_report_windows: list[float] = [60.0, 300.0]
+    score_latency_stat: str = "mean"  # "mean" (EMA) or "p95"
+    # Persistent RAG index ("" dir keeps it in memory only)
+    rag_data_dir: str = "data/rag"
+    rag_snapshot_sec: float = 300.0
+    rag_log_fsync: bool = True
+    # RAG index: exact flat search until RAG_PROMOTE_THRESHOLD chunks, then
+    # RAG_INDEX_TYPE (flat | hnsw | ivf_flat | ivf_pq) built in the background
+    rag_index_type: str = "hnsw"
+    rag_promote_threshold: int = 20000
+    rag_hnsw_m: int = 32
+    rag_hnsw_ef_construction: int = 200
+    rag_hnsw_ef_search: int = 64
+    rag_ivf_nlist: int = 0  # 0 = 4 * sqrt(chunks)
+    rag_ivf_nprobe: int = 16
+    rag_pq_m: int = 16  # sub-quantizers; must divide the embedding dimension
+    rag_pq_nbits: int = 8
+    # Vector storage: metric l2 | cosine, codes float32 | fp16 | int8 | pq,
+    # optional PCA; lossy indexes re-rank RAG_RERANK_FACTOR * k candidates exactly
+    rag_metric: str = "cosine"
+    rag_storage: str = "float32"
+    rag_pca_dim: int = 0
+    rag_rerank_factor: int = 4
+    rag_recall_sample: int = 100
+    # Content-addressed embedding cache ("" path = memory only)
+    rag_embedding_cache_size: int = 20000
+    rag_embedding_cache_path: str = "data/rag/embeddings.db"
+    # Query micro-batching: one encode + one search per window / max batch
+    rag_query_batch_window_ms: float = 5.0
+    rag_query_batch_max: int = 32
+    rag_embed_threads: int = 1
+    # Chunking: sentence-aware chunks of up to RAG_CHUNK_TOKENS estimated tokens
+    rag_chunk_tokens: int = 256
+    rag_chunk_overlap_tokens: int = 32
+    # Bulk ingest: chunks per embed batch, batches buffered between pipeline stages
+    rag_ingest_batch_size: int = 64
+    rag_ingest_queue_depth: int = 2
+    rag_ingest_max_line_bytes: int = 16 * 1024 * 1024
+    # Background ingest jobs (POST /rag/jobs): run below live query embedding
+    rag_job_workers: int = 1
+    rag_job_embed_threads: int = 1
+    rag_job_batch_size: int = 16
+    rag_job_yield_max_ms: float = 500.0
+    rag_job_queue_max: int = 100
+    rag_job_max_bytes: int = 256 * 1024 * 1024
+    rag_job_spool_max_bytes: int = 2 * 1024 * 1024 * 1024
+    rag_job_history: int = 200
+    # Metrics snapshot/restore across restarts ("" path disables snapshots)
+    metrics_snapshot_path: str = "metrics_snapshot.json"
+    metrics_snapshot_sec: float = 60.0
+    metrics_restore_half_life_sec: float = 1800.0
+    metrics_seed_from_logs: bool = True
+    metrics_seed_window_sec: float = 3600.0
+    # Circuit breaker per (provider, model)
+    circuit_failure_threshold: int = 3
+    circuit_failure_window_sec: float = 60.0
+    circuit_cooldown_sec: float = 60.0
+    circuit_max_cooldown_sec: float = 900.0
+    circuit_half_open_probes: int = 1
+    # Share metrics/circuits/rate limits across uvicorn workers via a SQLite (WAL) file
+    shared_state_path: str = ""
+    shared_state_sync_sec: float = 1.0
 
     @classmethod
     def from_env(cls) -> "Settings":
@@ -21,7 +144,99 @@ class Settings(BaseModel):
             groq_api_key=os.getenv("GROQ_API_KEY", ""),
             gemini_api_key=os.getenv("GEMINI_API_KEY", ""),
             ollama_base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            openai_base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            groq_base_url=os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
+            gemini_base_url=os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"),
             request_timeout=int(os.getenv("REQUEST_TIMEOUT", "30")),
+            rate_limit_requests=int(os.getenv("RATE_LIMIT_REQUESTS", "15")),
+            ollama_keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip(),
+            ollama_num_ctx=int(os.getenv("OLLAMA_NUM_CTX", "0")),
+            ollama_num_thread=int(os.getenv("OLLAMA_NUM_THREAD", "0")),
+            ollama_preload=_env_bool("OLLAMA_PRELOAD", True),
+            ollama_keep_warm_sec=float(os.getenv("OLLAMA_KEEP_WARM_SEC", "240")),
+            fallback_max_attempts=int(os.getenv("FALLBACK_MAX_ATTEMPTS", "3")),
+            fallback_attempt_share=float(os.getenv("FALLBACK_ATTEMPT_SHARE", "0.6")),
+            fallback_min_attempt_sec=float(os.getenv("FALLBACK_MIN_ATTEMPT_SEC", "2")),
+            http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            http_max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            http_keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+            http2_enabled=_env_bool("HTTP2_ENABLED", False),
+            http_prewarm_connections=int(os.getenv("HTTP_PREWARM_CONNECTIONS", "2")),
+            hedge_enabled=_env_bool("HEDGE_ENABLED", False),
+            hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", "0.95")),
+            hedge_budget_ratio=float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")),
+            health_probe_interval=float(os.getenv("HEALTH_PROBE_INTERVAL", "15")),
+            response_cache_enabled=_env_bool("RESPONSE_CACHE_ENABLED", True),
+            response_cache_ttl_sec=float(os.getenv("RESPONSE_CACHE_TTL_SEC", "3600")),
+            response_cache_max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048")),
+            response_cache_max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+            response_cache_semantic=_env_bool("RESPONSE_CACHE_SEMANTIC", False),
+            response_cache_similarity=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.92")),
+            coalesce_requests=_env_bool("COALESCE_REQUESTS", True),
+            session_ttl_sec=float(os.getenv("SESSION_TTL_SEC", "3600")),
+            session_max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+            session_max_turns=int(os.getenv("SESSION_MAX_TURNS", "200")),
+            session_history_token_budget=int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", "3000")),
+            session_rag_reuse_max_tokens=int(os.getenv("SESSION_RAG_REUSE_MAX_TOKENS", "24")),
+            batch_concurrency_per_provider=int(os.getenv("BATCH_CONCURRENCY_PER_PROVIDER", "4")),
+            limiter_initial=int(os.getenv("LIMITER_INITIAL", "4")),
+            limiter_min=int(os.getenv("LIMITER_MIN", "1")),
+            limiter_max=int(os.getenv("LIMITER_MAX", "64")),
+            limiter_max_queue=int(os.getenv("LIMITER_MAX_QUEUE", "100")),
+            limiter_max_wait_sec=float(os.getenv("LIMITER_MAX_WAIT_SEC", "5")),
+            metrics_window_sec=float(os.getenv("METRICS_WINDOW_SEC", "300")),
+            metrics_window_buckets=int(os.getenv("METRICS_WINDOW_BUCKETS", "30")),
+            metrics_report_windows=[
+                float(w) for w in os.getenv("METRICS_REPORT_WINDOWS", "60,300").split(",") if w.strip()
+            ],
+            score_latency_stat=os.getenv("SCORE_LATENCY_STAT", "mean").strip().lower(),
+            rag_data_dir=os.getenv("RAG_DATA_DIR", "data/rag").strip(),
+            rag_snapshot_sec=float(os.getenv("RAG_SNAPSHOT_SEC", "300")),
+            rag_log_fsync=_env_bool("RAG_LOG_FSYNC", True),
+            rag_index_type=os.getenv("RAG_INDEX_TYPE", "hnsw").strip().lower(),
+            rag_promote_threshold=int(os.getenv("RAG_PROMOTE_THRESHOLD", "20000")),
+            rag_hnsw_m=int(os.getenv("RAG_HNSW_M", "32")),
+            rag_hnsw_ef_construction=int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200")),
+            rag_hnsw_ef_search=int(os.getenv("RAG_HNSW_EF_SEARCH", "64")),
+            rag_ivf_nlist=int(os.getenv("RAG_IVF_NLIST", "0")),
+            rag_ivf_nprobe=int(os.getenv("RAG_IVF_NPROBE", "16")),
+            rag_pq_m=int(os.getenv("RAG_PQ_M", "16")),
+            rag_pq_nbits=int(os.getenv("RAG_PQ_NBITS", "8")),
+            rag_metric=os.getenv("RAG_METRIC", "cosine").strip().lower(),
+            rag_storage=os.getenv("RAG_STORAGE", "float32").strip().lower(),
+            rag_pca_dim=int(os.getenv("RAG_PCA_DIM", "0")),
+            rag_rerank_factor=int(os.getenv("RAG_RERANK_FACTOR", "4")),
+            rag_recall_sample=int(os.getenv("RAG_RECALL_SAMPLE", "100")),
+            rag_embedding_cache_size=int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "20000")),
+            rag_embedding_cache_path=os.getenv("RAG_EMBEDDING_CACHE_PATH", "data/rag/embeddings.db").strip(),
+            rag_query_batch_window_ms=float(os.getenv("RAG_QUERY_BATCH_WINDOW_MS", "5")),
+            rag_query_batch_max=int(os.getenv("RAG_QUERY_BATCH_MAX", "32")),
+            rag_embed_threads=int(os.getenv("RAG_EMBED_THREADS", "1")),
+            rag_chunk_tokens=int(os.getenv("RAG_CHUNK_TOKENS", "256")),
+            rag_chunk_overlap_tokens=int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", "32")),
+            rag_ingest_batch_size=int(os.getenv("RAG_INGEST_BATCH_SIZE", "64")),
+            rag_ingest_queue_depth=int(os.getenv("RAG_INGEST_QUEUE_DEPTH", "2")),
+            rag_ingest_max_line_bytes=int(os.getenv("RAG_INGEST_MAX_LINE_BYTES", str(16 * 1024 * 1024))),
+            rag_job_workers=int(os.getenv("RAG_JOB_WORKERS", "1")),
+            rag_job_embed_threads=int(os.getenv("RAG_JOB_EMBED_THREADS", "1")),
+            rag_job_batch_size=int(os.getenv("RAG_JOB_BATCH_SIZE", "16")),
+            rag_job_yield_max_ms=float(os.getenv("RAG_JOB_YIELD_MAX_MS", "500")),
+            rag_job_queue_max=int(os.getenv("RAG_JOB_QUEUE_MAX", "100")),
+            rag_job_max_bytes=int(os.getenv("RAG_JOB_MAX_BYTES", str(256 * 1024 * 1024))),
+            rag_job_spool_max_bytes=int(os.getenv("RAG_JOB_SPOOL_MAX_BYTES", str(2 * 1024 * 1024 * 1024))),
+            rag_job_history=int(os.getenv("RAG_JOB_HISTORY", "200")),
+            metrics_snapshot_path=os.getenv("METRICS_SNAPSHOT_PATH", "metrics_snapshot.json").strip(),
+            metrics_snapshot_sec=float(os.getenv("METRICS_SNAPSHOT_SEC", "60")),
+            metrics_restore_half_life_sec=float(os.getenv("METRICS_RESTORE_HALF_LIFE_SEC", "1800")),
+            metrics_seed_from_logs=_env_bool("METRICS_SEED_FROM_LOGS", True),
+            metrics_seed_window_sec=float(os.getenv("METRICS_SEED_WINDOW_SEC", "3600")),
+            circuit_failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3")),
+            circuit_failure_window_sec=float(os.getenv("CIRCUIT_FAILURE_WINDOW_SEC", "60")),
+            circuit_cooldown_sec=float(os.getenv("CIRCUIT_COOLDOWN_SEC", "60")),
+            circuit_max_cooldown_sec=float(os.getenv("CIRCUIT_MAX_COOLDOWN_SEC", "900")),
+            circuit_half_open_probes=int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1")),
+            shared_state_path=os.getenv("SHARED_STATE_PATH", "").strip(),
+            shared_state_sync_sec=float(os.getenv("SHARED_STATE_SYNC_SEC", "1")),
         )
 
 
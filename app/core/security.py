@@ -20,3 +20,15 @@ def require_gemini_key() -> str:
     if not key or not key.strip():
         raise ValueError("GEMINI_API_KEY is not set")
     return key
+
+
+def is_provider_configured(provider: str) -> bool:
+    s = get_settings()
+    if provider == "openai":
+        return bool(s.openai_api_key and s.openai_api_key.strip())
+    if provider == "groq":
+        return bool(s.groq_api_key and s.groq_api_key.strip())
+    if provider == "gemini":
+        return bool(s.gemini_api_key and s.gemini_api_key.strip())
+    # Ollama is local and needs no key
+    return provider == "ollama"
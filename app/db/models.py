@@ -48,3 +48,12 @@ def init_db() -> None:
         if "category" not in columns:
             conn.execute("ALTER TABLE logs ADD COLUMN category TEXT")
             conn.commit()
+        if "ttft_ms" not in columns:
+            conn.execute("ALTER TABLE logs ADD COLUMN ttft_ms REAL")
+            conn.commit()
+        if "attempts" not in columns:
+            conn.execute("ALTER TABLE logs ADD COLUMN attempts TEXT")
+            conn.commit()
+        if "aborted" not in columns:
+            conn.execute("ALTER TABLE logs ADD COLUMN aborted INTEGER")
+            conn.commit()
@@ -1,4 +1,5 @@
 import datetime
+import json
 import sqlite3
 from contextlib import contextmanager
 from typing import Any
@@ -16,6 +17,15 @@ def get_db_connection():
         conn.close()
 
 
+def check_db_connected() -> bool:
+    try:
+        with get_db_connection() as conn:
+            conn.execute("SELECT 1")
+        return True
+    except Exception:
+        return False
+
+
 def _infer_category(prompt: str) -> str:
     """Infer question category from prompt text (for dashboard)."""
     if not prompt or not prompt.strip():
@@ -32,6 +42,65 @@ def _infer_category(prompt: str) -> str:
     return "general"
 
 
+def _log_columns(conn: sqlite3.Connection) -> set[str]:
+    cursor = conn.execute("PRAGMA table_info(logs)")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def _log_values(
+    provider: str,
+    model: str,
+    prompt_length: int,
+    latency_ms: float,
+    original_provider: str | None = None,
+    routing_reason: str | None = None,
+    rag_used: bool | None = None,
+    risk_score: float | None = None,
+    fingerprint: str | None = None,
+    adaptive_score_used: float | None = None,
+    circuit_triggered: bool | None = None,
+    prompt_preview: str | None = None,
+    category: str | None = None,
+    ttft_ms: float | None = None,
+    attempts: list[dict[str, Any]] | None = None,
+    aborted: bool | None = None,
+) -> dict[str, Any]:
+    rag_val = 1 if rag_used else 0 if rag_used is False else None
+    circuit_val = 1 if circuit_triggered else 0 if circuit_triggered is False else None
+    return {
+        "provider": provider,
+        "model": model,
+        "prompt_length": prompt_length,
+        "latency_ms": latency_ms,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "original_provider": original_provider,
+        "routing_reason": routing_reason,
+        "rag_used": rag_val,
+        "risk_score": risk_score,
+        "fingerprint": fingerprint,
+        "adaptive_score_used": adaptive_score_used,
+        "circuit_triggered": circuit_val,
+        "prompt_preview": (prompt_preview or "")[:300],
+        "category": category or "general",
+        "ttft_ms": ttft_ms,
+        "attempts": json.dumps(attempts) if attempts else None,
+        "aborted": 1 if aborted else None,
+    }
+
+
+def _write_log_rows(rows: list[dict[str, Any]]) -> None:
+    if not rows:
+        return
+    with get_db_connection() as conn:
+        columns = _log_columns(conn)
+        # Only write columns this database has (older DBs may predate migrations)
+        names = [name for name in rows[0] if name in columns]
+        conn.executemany(
+            f"INSERT INTO logs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+            [[row[name] for name in names] for row in rows],
+        )
+
+
 def insert_log(
     provider: str,
     model: str,
@@ -46,57 +115,22 @@ def insert_log(
     circuit_triggered: bool | None = None,
     prompt_preview: str | None = None,
     category: str | None = None,
+    ttft_ms: float | None = None,
+    attempts: list[dict[str, Any]] | None = None,
+    aborted: bool | None = None,
 ) -> None:
-    with get_db_connection() as conn:
-        cursor = conn.execute("PRAGMA table_info(logs)")
-        columns = {row[1] for row in cursor.fetchall()}
-        has_preview = "prompt_preview" in columns and "category" in columns
-        has_extras = (
-            "rag_used" in columns
-            and "risk_score" in columns
-            and "fingerprint" in columns
-            and "adaptive_score_used" in columns
-            and "circuit_triggered" in columns
+    _write_log_rows([
+        _log_values(
+            provider, model, prompt_length, latency_ms, original_provider, routing_reason,
+            rag_used, risk_score, fingerprint, adaptive_score_used, circuit_triggered,
+            prompt_preview, category, ttft_ms, attempts, aborted,
         )
-        ts = datetime.datetime.utcnow().isoformat()
-        base = (provider, model, prompt_length, latency_ms, ts, original_provider, routing_reason)
-        rag_val = 1 if rag_used else 0 if rag_used is False else None
-        circuit_val = 1 if circuit_triggered else 0 if circuit_triggered is False else None
-        if has_extras and has_preview:
-            conn.execute(
-                """INSERT INTO logs (
-                    provider, model, prompt_length, latency_ms, timestamp,
-                    original_provider, routing_reason, rag_used, risk_score, fingerprint,
-                    adaptive_score_used, circuit_triggered, prompt_preview, category
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (*base, rag_val, risk_score, fingerprint, adaptive_score_used, circuit_val,
-                 (prompt_preview or "")[:300], category or "general"),
-            )
-        elif has_extras:
-            conn.execute(
-                """INSERT INTO logs (
-                    provider, model, prompt_length, latency_ms, timestamp,
-                    original_provider, routing_reason, rag_used, risk_score, fingerprint,
-                    adaptive_score_used, circuit_triggered
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (*base, rag_val, risk_score, fingerprint, adaptive_score_used, circuit_val),
-            )
-        elif "rag_used" in columns and "risk_score" in columns and "fingerprint" in columns:
-            conn.execute(
-                """INSERT INTO logs (
-                    provider, model, prompt_length, latency_ms, timestamp,
-                    original_provider, routing_reason, rag_used, risk_score, fingerprint
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (*base, rag_val, risk_score, fingerprint),
-            )
-        else:
-            conn.execute(
-                """INSERT INTO logs (
-                    provider, model, prompt_length, latency_ms, timestamp,
-                    original_provider, routing_reason
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                base,
-            )
+    ])
+
+
+def insert_logs(records: list[dict[str, Any]]) -> None:
+    """Insert many rows (each a dict of insert_log keyword arguments) in one transaction."""
+    _write_log_rows([_log_values(**record) for record in records])
 
 
 def get_last_logs(limit: int = 20) -> list[dict[str, Any]]:
@@ -107,7 +141,31 @@ def get_last_logs(limit: int = 20) -> list[dict[str, Any]]:
             (limit,),
         )
         rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+    logs = [dict(row) for row in rows]
+    for log in logs:
+        if log.get("attempts"):
+            log["attempts"] = json.loads(log["attempts"])
+    return logs
+
+
+def get_recent_latencies(since_sec: float) -> list[dict[str, Any]]:
+    """Provider calls logged in the last `since_sec` seconds, oldest first.
+
+    Cache hits, coalesced followers and aborted streams are skipped: their
+    latency is not (all of) a provider's.
+    """
+    cutoff = (datetime.datetime.utcnow() - datetime.timedelta(seconds=since_sec)).isoformat()
+    with get_db_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.execute(
+            """SELECT provider, model, prompt_length, latency_ms, timestamp FROM logs
+               WHERE timestamp >= ?
+                 AND COALESCE(routing_reason, '') NOT IN ('cache_hit', 'coalesced')
+                 AND aborted IS NULL
+               ORDER BY id""",
+            (cutoff,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
 
 
 def get_dashboard_stats() -> dict[str, Any]:
@@ -1,7 +1,52 @@
+import asyncio
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+
+import httpx
+
+WARM_TIMEOUT_SEC = 5.0
+
+
+def flatten_messages(messages: list[dict]) -> str:
+    """Render chat messages ({"role", "content"}) as one prompt, oldest first."""
+    return "\n\n".join(f"{m['role'].capitalize()}:\n{m['content']}" for m in messages)
 
 
 class BaseLLM(ABC):
+    # Any cheap URL on the provider host; a HEAD to it opens a pooled connection
+    warm_url: str | None = None
+
     @abstractmethod
     async def generate(self, prompt: str, model: str, temperature: float) -> str:
         pass
+
+    @abstractmethod
+    def stream(self, prompt: str, model: str, temperature: float) -> AsyncIterator[str]:
+        """Yield completion text incrementally as the provider produces it."""
+
+    async def chat(self, messages: list[dict], model: str, temperature: float) -> str:
+        """Multi-turn completion. Providers with a native chat endpoint override
+        this; the default sends the flattened conversation as one prompt."""
+        return await self.generate(flatten_messages(messages), model, temperature)
+
+    @abstractmethod
+    async def _get_client(self) -> httpx.AsyncClient:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def check_reachable(self) -> bool:
+        return True
+
+    async def warm(self, connections: int = 1) -> int:
+        """Open `connections` keep-alive connections (TCP+TLS) to the provider host; returns how many failed."""
+        if not self.warm_url or connections <= 0:
+            return 0
+        client = await self._get_client()
+        # Concurrent requests force the pool to open separate connections
+        results = await asyncio.gather(
+            *(client.head(self.warm_url, timeout=WARM_TIMEOUT_SEC) for _ in range(connections)),
+            return_exceptions=True,
+        )
+        return sum(1 for r in results if isinstance(r, Exception))
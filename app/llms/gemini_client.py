@@ -7,11 +7,15 @@
 # =============================================================================
 
 import asyncio
+from collections.abc import AsyncIterator
+
 import httpx
 
 from app.core.config import get_settings
 from app.core.security import require_gemini_key
 from app.llms.base import BaseLLM
+from app.llms.http_pool import build_http_client
+from app.llms.streaming import iter_sse_json, raise_for_stream_status
 
 GEMINI_DEFAULT_MODEL = "gemini-1.5-flash"
 RETRY_STATUSES = (429, 502)
@@ -26,15 +30,36 @@ def _resolve_gemini_model(model: str) -> str:
     return GEMINI_DEFAULT_MODEL
 
 
+def _build_payload(prompt: str, temperature: float) -> dict:
+    return {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "temperature": min(2.0, max(0.0, temperature)),
+            "maxOutputTokens": 8192,
+        },
+    }
+
+
+def _candidate_text(data: dict) -> str:
+    candidates = data.get("candidates") or []
+    if not candidates:
+        return ""
+    content = candidates[0].get("content") or {}
+    parts = content.get("parts") or []
+    return "".join(p.get("text") or "" for p in parts)
+
+
 class GeminiClient(BaseLLM):
     def __init__(self) -> None:
         self._client: httpx.AsyncClient | None = None
+        self._base_url = get_settings().gemini_base_url.rstrip("/")
+        self.warm_url = f"{self._base_url}/models"
 
     async def _get_client(self) -> httpx.AsyncClient:
         if self._client is None or self._client.is_closed:
             # Free tier: use longer timeout (env REQUEST_TIMEOUT, e.g. 60)
             timeout = max(get_settings().request_timeout, 45)
-            self._client = httpx.AsyncClient(timeout=timeout)
+            self._client = build_http_client(timeout)
         return self._client
 
     async def close(self) -> None:
@@ -47,7 +72,7 @@ class GeminiClient(BaseLLM):
             key = require_gemini_key()
             client = await self._get_client()
             r = await client.get(
-                f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_DEFAULT_MODEL}?key={key}",
+                f"{self._base_url}/models/{GEMINI_DEFAULT_MODEL}?key={key}",
                 timeout=5.0,
             )
             return r.status_code == 200
@@ -58,14 +83,8 @@ class GeminiClient(BaseLLM):
         key = require_gemini_key()
         resolved_model = _resolve_gemini_model(model)
         client = await self._get_client()
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{resolved_model}:generateContent?key={key}"
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "generationConfig": {
-                "temperature": min(2.0, max(0.0, temperature)),
-                "maxOutputTokens": 8192,
-            },
-        }
+        url = f"{self._base_url}/models/{resolved_model}:generateContent?key={key}"
+        payload = _build_payload(prompt, temperature)
         last_error = None
         for attempt in range(2):
             try:
@@ -102,3 +121,27 @@ class GeminiClient(BaseLLM):
                 raise ValueError(f"Gemini API error {last_error.response.status_code}") from last_error
             raise ValueError(f"Gemini API unreachable: {last_error!s}") from last_error
         return ""
+
+    async def stream(self, prompt: str, model: str, temperature: float) -> AsyncIterator[str]:
+        key = require_gemini_key()
+        resolved_model = _resolve_gemini_model(model)
+        client = await self._get_client()
+        url = (
+            f"{self._base_url}/models/{resolved_model}"
+            f":streamGenerateContent?alt=sse&key={key}"
+        )
+        try:
+            async with client.stream("POST", url, json=_build_payload(prompt, temperature)) as r:
+                await raise_for_stream_status(r)
+                async for payload in iter_sse_json(r):
+                    text = _candidate_text(payload)
+                    if text:
+                        yield text
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 400:
+                raise ValueError(f"Gemini model or request invalid: {(e.response.text or '')[:500]}") from e
+            if e.response.status_code in (401, 403):
+                raise ValueError("GEMINI_API_KEY invalid or not allowed") from e
+            raise ValueError(f"Gemini API error {e.response.status_code}: {(e.response.text or '')[:500]}") from e
+        except httpx.RequestError as e:
+            raise ValueError(f"Gemini API unreachable: {e!s}") from e
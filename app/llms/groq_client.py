@@ -1,17 +1,23 @@
+from collections.abc import AsyncIterator
+
 import httpx
 
 from app.core.config import get_settings
 from app.core.security import require_groq_key
 from app.llms.base import BaseLLM
+from app.llms.http_pool import build_http_client
+from app.llms.streaming import iter_sse_json, openai_delta_text, raise_for_stream_status
 
 
 class GroqClient(BaseLLM):
     def __init__(self) -> None:
         self._client: httpx.AsyncClient | None = None
+        self._base_url = get_settings().groq_base_url.rstrip("/")
+        self.warm_url = f"{self._base_url}/models"
 
     async def _get_client(self) -> httpx.AsyncClient:
         if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=get_settings().request_timeout)
+            self._client = build_http_client(get_settings().request_timeout)
         return self._client
 
     async def close(self) -> None:
@@ -19,11 +25,24 @@ class GroqClient(BaseLLM):
             await self._client.aclose()
             self._client = None
 
+    async def check_reachable(self) -> bool:
+        try:
+            key = require_groq_key()
+            client = await self._get_client()
+            r = await client.get(
+                f"{self._base_url}/models",
+                headers={"Authorization": f"Bearer {key}"},
+                timeout=5.0,
+            )
+            return r.status_code == 200
+        except Exception:
+            return False
+
     async def generate(self, prompt: str, model: str, temperature: float) -> str:
         key = require_groq_key()
         client = await self._get_client()
         r = await client.post(
-            "https://api.groq.com/openai/v1/chat/completions",
+            f"{self._base_url}/chat/completions",
             headers={"Authorization": f"Bearer {key}"},
             json={
                 "model": model,
@@ -34,3 +53,23 @@ class GroqClient(BaseLLM):
         r.raise_for_status()
         data = r.json()
         return data["choices"][0]["message"]["content"]
+
+    async def stream(self, prompt: str, model: str, temperature: float) -> AsyncIterator[str]:
+        key = require_groq_key()
+        client = await self._get_client()
+        async with client.stream(
+            "POST",
+            f"{self._base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {key}"},
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "stream": True,
+            },
+        ) as r:
+            await raise_for_stream_status(r)
+            async for payload in iter_sse_json(r):
+                text = openai_delta_text(payload)
+                if text:
+                    yield text
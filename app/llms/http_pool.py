@@ -0,0 +1,38 @@
+# =============================================================================
+# app/llms/http_pool.py — Connection-pooled httpx.AsyncClient factory
+# =============================================================================
+# Every provider client builds its httpx.AsyncClient here so pool limits,
+# keep-alive expiry and HTTP/2 are configured in one place (see Settings).
+# HTTP/2 needs the optional `h2` package (pip install "httpx[http2]"); when it
+# is missing we fall back to HTTP/1.1 instead of failing at startup.
+# =============================================================================
+
+import httpx
+
+from app.core.config import get_settings
+from app.utils.logger import logger
+
+_h2_available: bool | None = None
+
+
+def _http2_supported() -> bool:
+    global _h2_available
+    if _h2_available is None:
+        try:
+            import h2  # noqa: F401
+            _h2_available = True
+        except ImportError:
+            _h2_available = False
+            logger.warning("http2_unavailable", extra={"hint": 'pip install "httpx[http2]"'})
+    return _h2_available
+
+
+def build_http_client(timeout: float) -> httpx.AsyncClient:
+    s = get_settings()
+    limits = httpx.Limits(
+        max_connections=s.http_max_connections,
+        max_keepalive_connections=s.http_max_keepalive_connections,
+        keepalive_expiry=s.http_keepalive_expiry,
+    )
+    http2 = s.http2_enabled and _http2_supported()
+    return httpx.AsyncClient(timeout=timeout, limits=limits, http2=http2)
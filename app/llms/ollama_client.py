@@ -1,17 +1,40 @@
+import time
+from collections.abc import AsyncIterator
+
 import httpx
 
 from app.core.config import get_settings
 from app.llms.base import BaseLLM
+from app.llms.http_pool import build_http_client
+from app.llms.streaming import iter_ndjson, raise_for_stream_status
+
+# Loading a large model from disk can take far longer than a normal request
+PRELOAD_TIMEOUT_SEC = 300.0
 
 
 class OllamaClient(BaseLLM):
     def __init__(self) -> None:
         self._client: httpx.AsyncClient | None = None
         self._base_url = get_settings().ollama_base_url.rstrip("/")
+        self.warm_url = self._base_url
+        # Monotonic time of the last generate/stream/preload (keep-warm pings)
+        self.last_used: float | None = None
+
+    def _payload(self, model: str, temperature: float, stream: bool, **body) -> dict:
+        s = get_settings()
+        options: dict = {"temperature": temperature}
+        if s.ollama_num_ctx > 0:
+            options["num_ctx"] = s.ollama_num_ctx
+        if s.ollama_num_thread > 0:
+            options["num_thread"] = s.ollama_num_thread
+        payload = {"model": model, **body, "stream": stream, "options": options}
+        if s.ollama_keep_alive:
+            payload["keep_alive"] = s.ollama_keep_alive
+        return payload
 
     async def _get_client(self) -> httpx.AsyncClient:
         if self._client is None or self._client.is_closed:
-            self._client = httpx.AsyncClient(timeout=get_settings().request_timeout)
+            self._client = build_http_client(get_settings().request_timeout)
         return self._client
 
     async def close(self) -> None:
@@ -21,23 +44,60 @@ class OllamaClient(BaseLLM):
 
     async def generate(self, prompt: str, model: str, temperature: float) -> str:
         client = await self._get_client()
+        self.last_used = time.monotonic()
         r = await client.post(
             f"{self._base_url}/api/generate",
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": temperature},
-            },
+            json=self._payload(model, temperature, stream=False, prompt=prompt),
         )
         r.raise_for_status()
         data = r.json()
         return data.get("response", "")
 
+    async def chat(self, messages: list[dict], model: str, temperature: float) -> str:
+        # /api/chat keeps the conversation as messages, so the Ollama runner can
+        # reuse its KV cache for the unchanged prefix of earlier turns
+        client = await self._get_client()
+        self.last_used = time.monotonic()
+        r = await client.post(
+            f"{self._base_url}/api/chat",
+            json=self._payload(model, temperature, stream=False, messages=messages),
+        )
+        r.raise_for_status()
+        data = r.json()
+        return (data.get("message") or {}).get("content", "")
+
+    async def preload(self, model: str) -> None:
+        """Load `model` into memory (an empty prompt generates nothing) and reset
+        its keep_alive timer. Uses the same num_ctx/num_thread as real calls so
+        Ollama does not reload the model for the first request."""
+        client = await self._get_client()
+        self.last_used = time.monotonic()
+        payload = self._payload(model, 0.0, stream=False, prompt="")
+        r = await client.post(f"{self._base_url}/api/generate", json=payload, timeout=PRELOAD_TIMEOUT_SEC)
+        r.raise_for_status()
+
+    async def stream(self, prompt: str, model: str, temperature: float) -> AsyncIterator[str]:
+        client = await self._get_client()
+        self.last_used = time.monotonic()
+        async with client.stream(
+            "POST",
+            f"{self._base_url}/api/generate",
+            json=self._payload(model, temperature, stream=True, prompt=prompt),
+        ) as r:
+            await raise_for_stream_status(r)
+            async for payload in iter_ndjson(r):
+                if payload.get("error"):
+                    raise ValueError(f"Ollama error: {payload['error']}")
+                text = payload.get("response") or ""
+                if text:
+                    yield text
+                if payload.get("done"):
+                    return
+
     async def check_reachable(self) -> bool:
         try:
             client = await self._get_client()
-            r = await client.get(f"{self._base_url}/api/tags")
+            r = await client.get(f"{self._base_url}/api/tags", timeout=5.0)
             return r.status_code == 200
         except Exception:
             return False
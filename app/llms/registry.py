@@ -0,0 +1,89 @@
+# =============================================================================
+# app/llms/registry.py — Process-wide provider client registry
+# =============================================================================
+# One long-lived client (and so one pooled httpx.AsyncClient) per provider.
+# start_clients() is called from the FastAPI lifespan: it builds every client
+# and pre-warms keep-alive connections to configured providers so the first
+# /generate does not pay the TCP+TLS handshake. close_clients() drains the
+# pools on shutdown. get_client() also works outside the lifespan (scripts):
+# clients are then created lazily on first use.
+# =============================================================================
+
+import asyncio
+from typing import Callable, Literal
+
+from app.core.config import get_settings
+from app.core.security import is_provider_configured
+from app.llms.base import BaseLLM
+from app.llms.gemini_client import GeminiClient
+from app.llms.groq_client import GroqClient
+from app.llms.ollama_client import OllamaClient
+from app.llms.openai_client import OpenAIClient
+from app.utils.logger import logger
+
+ConcreteProvider = Literal["openai", "groq", "gemini", "ollama"]
+
+_CLIENT_FACTORIES: dict[str, Callable[[], BaseLLM]] = {
+    "openai": OpenAIClient,
+    "groq": GroqClient,
+    "gemini": GeminiClient,
+    "ollama": OllamaClient,
+}
+
+
+class ClientRegistry:
+    def __init__(self) -> None:
+        self._clients: dict[str, BaseLLM] = {}
+
+    def get(self, provider: str) -> BaseLLM:
+        client = self._clients.get(provider)
+        if client is None:
+            factory = _CLIENT_FACTORIES.get(provider)
+            if factory is None:
+                raise ValueError(f"Unknown provider: {provider}")
+            client = factory()
+            self._clients[provider] = client
+        return client
+
+    async def start(self) -> None:
+        connections = get_settings().http_prewarm_connections
+        providers = list(_CLIENT_FACTORIES)
+        clients = [self.get(p) for p in providers]
+        results = await asyncio.gather(
+            *(
+                c.warm(connections)
+                for p, c in zip(providers, clients)
+                if is_provider_configured(p)
+            ),
+            return_exceptions=True,
+        )
+        # Failed connections per provider, or the error that stopped its warm-up altogether
+        failed = sum(connections if isinstance(r, Exception) else r for r in results)
+        logger.info(
+            "http_clients_started",
+            extra={"providers": providers, "prewarm_connections": connections, "warm_failures": failed},
+        )
+
+    async def close(self) -> None:
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception:
+                pass
+
+
+CLIENT_REGISTRY = ClientRegistry()
+
+
+def get_client(provider: ConcreteProvider) -> BaseLLM:
+    return CLIENT_REGISTRY.get(provider)
+
+
+async def start_clients() -> None:
+    await CLIENT_REGISTRY.start()
+
+
+async def close_clients() -> None:
+    await CLIENT_REGISTRY.close()
@@ -4,19 +4,28 @@
 
 import asyncio
 import time
+from collections.abc import AsyncIterator
 from typing import Literal
 
-from app.adaptive.circuit import should_skip_provider
-from app.adaptive.metrics import get_provider_metrics
+import httpx
+
+from app.adaptive.circuit import CircuitOpenError, get_circuit, should_skip_provider
+from app.adaptive.health import is_provider_reachable
+from app.adaptive.limiter import LimiterTimeout, get_limiter
+from app.adaptive.metrics import HEDGE_BUDGET, get_provider_metrics
 from app.core.config import get_settings
 from app.core.providers import PROVIDERS
-from app.llms.gemini_client import GeminiClient
-from app.llms.groq_client import GroqClient
-from app.llms.ollama_client import OllamaClient
-from app.llms.openai_client import OpenAIClient
+from app.llms.registry import get_client
+from app.utils.token_estimator import estimate_tokens
 from app.utils.logger import logger
 
 Provider = Literal["openai", "groq", "gemini", "ollama", "auto"]
+ROUTABLE_PROVIDERS: tuple[Literal["openai", "groq", "gemini", "ollama"], ...] = (
+    "openai",
+    "groq",
+    "gemini",
+    "ollama",
+)
 
 # Default models when client sends empty model (free-tier friendly)
 PROVIDER_DEFAULT_MODELS = {
@@ -29,64 +38,99 @@ PROVIDER_DEFAULT_MODELS = {
 AUTO_MATH_KEYWORDS = ["math", "equation", "derivative", "integral", "quantum"]
 AUTO_PROMPT_LONG_THRESHOLD = 8000
 AUTO_PROMPT_SHORT_THRESHOLD = 2000
+# Tokens kept free in the context window for the completion itself
+AUTO_OUTPUT_TOKEN_RESERVE = 1024
+# Math/science prompts weigh provider reasoning capability this much more
+AUTO_MATH_REASONING_BOOST = 2.0
 
 # Adaptive score weights
 SCORE_FAILURE_WEIGHT = 0.5
 SCORE_LATENCY_WEIGHT = 0.3
 SCORE_REASONING_WEIGHT = 0.2
 
+# Hedging: need this many latency samples before trusting the percentile
+HEDGE_MIN_SAMPLES = 20
+
+
+class ContextLengthError(ValueError):
+    """The prompt does not fit any provider's context window."""
+
+
+def _fits_context(provider: str, prompt_tokens: int) -> bool:
+    max_tokens = PROVIDERS.get(provider, {}).get("max_tokens")
+    return max_tokens is None or prompt_tokens + AUTO_OUTPUT_TOKEN_RESERVE <= max_tokens
+
+
+def _is_available(provider: str, prompt_tokens: int, model: str) -> bool:
+    """Circuit admits `model`, last probe reachable and the prompt fits its context window."""
+    return (
+        not should_skip_provider(provider, model)
+        and is_provider_reachable(provider)
+        and _fits_context(provider, prompt_tokens)
+    )
+
+
+def _reasoning_boost(prompt: str) -> float:
+    lower = prompt[:AUTO_PROMPT_SHORT_THRESHOLD].lower()
+    return AUTO_MATH_REASONING_BOOST if any(k in lower for k in AUTO_MATH_KEYWORDS) else 1.0
 
-def get_client(provider: Literal["openai", "groq", "gemini", "ollama"]):
-    if provider == "openai":
-        return OpenAIClient()
-    if provider == "groq":
-        return GroqClient()
-    if provider == "gemini":
-        return GeminiClient()
-    if provider == "ollama":
-        return OllamaClient()
-    raise ValueError(f"Unknown provider: {provider}")
+
+def _expected_latency(provider: str, prompt_tokens: int | None) -> float:
+    """Latency (ms) the scorer uses: p95 if configured, else the size-aware
+    prediction fitted from history, else the EMA."""
+    m = get_provider_metrics(provider)
+    if get_settings().score_latency_stat == "p95":
+        return m.latency_percentile(0.95) or m.avg_latency
+    if prompt_tokens is not None:
+        predicted = m.predict_latency(prompt_tokens)
+        if predicted is not None:
+            return predicted
+    return m.avg_latency
 
 
-def _compute_provider_score(provider: str) -> float:
+def _compute_provider_score(
+    provider: str,
+    prompt_tokens: int | None = None,
+    reasoning_boost: float = 1.0,
+) -> float:
     m = get_provider_metrics(provider)
     reasoning_weight = PROVIDERS.get(provider, {}).get("reasoning_weight", 0.5)
     failure_component = (1 - m.failure_rate) * SCORE_FAILURE_WEIGHT
-    latency_component = (1.0 / (m.avg_latency + 1.0)) * SCORE_LATENCY_WEIGHT
-    reasoning_component = reasoning_weight * SCORE_REASONING_WEIGHT
+    latency = _expected_latency(provider, prompt_tokens)
+    latency_component = (1.0 / (latency + 1.0)) * SCORE_LATENCY_WEIGHT
+    reasoning_component = reasoning_weight * SCORE_REASONING_WEIGHT * reasoning_boost
     return failure_component + latency_component + reasoning_component
 
 
 async def _resolve_auto_provider(
     prompt: str,
+    prompt_tokens: int | None = None,
+    model: str = "",
 ) -> tuple[Literal["openai", "groq", "gemini", "ollama"], str, float | None, bool]:
-    ollama_client = OllamaClient()
-    ollama_reachable = await ollama_client.check_reachable()
-    try:
-        await ollama_client.close()
-    except Exception:
-        pass
-
-    candidates: list[Literal["openai", "groq", "gemini", "ollama"]] = [
-        "openai",
-        "groq",
-        "gemini",
-        "ollama",
-    ]
-    available = [
-        p
-        for p in candidates
-        if not should_skip_provider(p)
-        and (p != "ollama" or ollama_reachable)
-    ]
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    boost = _reasoning_boost(prompt)
+    available = [p for p in ROUTABLE_PROVIDERS if _is_available(p, prompt_tokens, _model_for(p, model))]
 
     if not available:
-        return "ollama", "circuit_fallback", None, True
+        # Last resort ignores circuits and probes, never context size: a prompt
+        # no model can hold would only burn the deadline
+        fitting = [p for p in ROUTABLE_PROVIDERS if _fits_context(p, prompt_tokens)]
+        if not fitting:
+            largest = max((PROVIDERS.get(p, {}).get("max_tokens") or 0) for p in ROUTABLE_PROVIDERS)
+            raise ContextLengthError(
+                f"Prompt (~{prompt_tokens} tokens + {AUTO_OUTPUT_TOKEN_RESERVE} reserved for the answer) "
+                f"exceeds every provider's context window (largest {largest} tokens)"
+            )
+        if "ollama" in fitting:
+            return "ollama", "circuit_fallback", None, True
+        fallback = max(fitting, key=lambda p: _compute_provider_score(p, prompt_tokens, boost))
+        return fallback, "circuit_fallback", None, True
 
     best_provider: Literal["openai", "groq", "gemini", "ollama"] = available[0]
-    best_score = _compute_provider_score(best_provider)
+    best_score = _compute_provider_score(best_provider, prompt_tokens, boost)
     for p in available[1:]:
-        s = _compute_provider_score(p)
+        s = _compute_provider_score(p, prompt_tokens, boost)
         if s > best_score:
             best_score = s
             best_provider = p
@@ -94,108 +138,489 @@ async def _resolve_auto_provider(
     return best_provider, "adaptive", best_score, False
 
 
-async def generate_with_fallback(
-    provider: Provider,
+def _is_overload(e: BaseException) -> bool:
+    """429 / 503 / timeout: signals to shrink the provider's concurrency window."""
+    if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in (429, 503)
+    msg = str(e)
+    return "429" in msg or "503" in msg
+
+
+def _model_for(provider: str, model: str) -> str:
+    return (model or "").strip() or PROVIDER_DEFAULT_MODELS.get(provider, "gemini-1.5-flash")
+
+
+async def _call_provider(
+    provider: Literal["openai", "groq", "gemini", "ollama"],
     model: str,
     prompt: str,
     temperature: float,
-) -> tuple[str, str, float, str, str, float | None, bool]:
-    original_provider: str = provider if provider != "auto" else "auto"
-    effective_provider: Literal["openai", "groq", "gemini", "ollama"]
-    routing_reason: str
-    adaptive_score_used: float | None = None
-    circuit_triggered: bool = False
+    timeout: float,
+    prompt_tokens: int | None = None,
+    messages: list[dict] | None = None,
+) -> tuple[str, float]:
+    """One provider call with timeout, gated by the (provider, model) circuit and
+    the provider's adaptive concurrency limiter; records success/failure in
+    provider metrics and the circuit.
 
-    if provider == "auto":
-        effective_provider, routing_reason, adaptive_score_used, circuit_triggered = (
-            await _resolve_auto_provider(prompt)
+    Raises CircuitOpenError or LimiterTimeout (without counting a provider
+    failure) when the call is not admitted; time spent queued counts against
+    `timeout`. With `messages` the provider's chat API is used; `prompt` must
+    then be their flattened form (it is what the metrics are sized by).
+    """
+    ticket = get_circuit(provider, model).acquire()
+    queued_at = time.perf_counter()
+    try:
+        permit = await get_limiter(provider).acquire(min(timeout, get_settings().limiter_max_wait_sec))
+    except BaseException:
+        ticket.release()
+        raise
+    start = time.perf_counter()
+    try:
+        client = get_client(provider)
+        call = client.chat(messages, model, temperature) if messages else client.generate(prompt, model, temperature)
+        result = await asyncio.wait_for(
+            call,
+            timeout=max(0.0, timeout - (start - queued_at)),
         )
+    except Exception as e:
+        permit.release(success=False, overload=_is_overload(e))
+        ticket.release(success=False)
+        get_provider_metrics(provider).record_failure(model)
+        raise
     else:
-        effective_provider = provider
-        routing_reason = "explicit"
-        if should_skip_provider(effective_provider):
-            circuit_triggered = True
-            routing_reason = "circuit_open"
-            ollama_client = OllamaClient()
-            ollama_reachable = await ollama_client.check_reachable()
-            try:
-                await ollama_client.close()
-            except Exception:
-                pass
-            if ollama_reachable:
-                effective_provider = "ollama"
-                routing_reason = "circuit_open_fallback"
-
-    effective_model = (model or "").strip() or PROVIDER_DEFAULT_MODELS.get(
-        effective_provider, "gemini-1.5-flash"
-    )
-    timeout = get_settings().request_timeout
-    client = get_client(effective_provider)
+        permit.release(success=True)
+        ticket.release(success=True)
+    finally:
+        # Cancellation (e.g. losing a hedge) frees the slot without feedback
+        permit.release(success=False)
+        ticket.release()
+    latency_ms = (time.perf_counter() - start) * 1000
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(prompt)
+    get_provider_metrics(provider).record_success(latency_ms, model, prompt_tokens)
+    return result, latency_ms
+
+
+def _hedge_delay_sec(provider: str) -> float | None:
+    m = get_provider_metrics(provider)
+    if m.latency_sample_count < HEDGE_MIN_SAMPLES:
+        return None
+    threshold_ms = m.latency_percentile(get_settings().hedge_percentile)
+    return threshold_ms / 1000 if threshold_ms is not None else None
+
+
+def _hedge_candidate(
+    primary: str,
+    prompt_tokens: int,
+) -> Literal["openai", "groq", "gemini", "ollama"] | None:
+    candidates = _ranked_alternatives(primary, prompt_tokens)
+    return candidates[0] if candidates else None
+
+
+async def _generate_hedged(
+    primary: Literal["openai", "groq", "gemini", "ollama"],
+    model: str,
+    prompt: str,
+    temperature: float,
+    timeout: float,
+    prompt_tokens: int,
+    tried: set[str] | None = None,
+    messages: list[dict] | None = None,
+) -> tuple[str, str, float]:
+    """Call `primary`; if it is slower than its observed percentile latency, also
+    call the next-best provider and return whichever answers first.
+
+    Returns (result, provider_used, latency_ms). The losing call is cancelled.
+    A fired hedge provider is added to `tried` so the fallback chain skips it.
+    """
     start = time.perf_counter()
+    primary_task = asyncio.create_task(
+        _call_provider(primary, _model_for(primary, model), prompt, temperature, timeout, prompt_tokens, messages)
+    )
+    tasks = [primary_task]
     try:
-        result = await asyncio.wait_for(
-            client.generate(prompt, effective_model, temperature),
-            timeout=timeout,
+        delay = _hedge_delay_sec(primary)
+        if delay is None or delay >= timeout:
+            result, latency_ms = await primary_task
+            return result, primary, latency_ms
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            result, latency_ms = primary_task.result()
+            return result, primary, latency_ms
+
+        hedge = _hedge_candidate(primary, prompt_tokens)
+        if hedge is None or not HEDGE_BUDGET.try_spend():
+            result, latency_ms = await primary_task
+            return result, primary, latency_ms
+
+        get_provider_metrics(primary).hedge_requests += 1
+        if tried is not None:
+            tried.add(hedge)
+        remaining = max(0.0, timeout - (time.perf_counter() - start))
+        hedge_task = asyncio.create_task(
+            _call_provider(
+                hedge, PROVIDER_DEFAULT_MODELS[hedge], prompt, temperature, remaining, prompt_tokens, messages
+            )
         )
-        latency_ms = (time.perf_counter() - start) * 1000
-        get_provider_metrics(effective_provider).record_success(latency_ms)
+        tasks.append(hedge_task)
+        logger.info("hedge_fired", extra={"primary": primary, "hedge": hedge, "delay_ms": delay * 1000})
+        owners = {primary_task: primary, hedge_task: hedge}
+        pending = set(owners)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = owners[task]
+                    get_provider_metrics(hedge).record_hedge(won=winner == hedge)
+                    result, _ = task.result()
+                    return result, winner, (time.perf_counter() - start) * 1000
+        # Both calls failed: surface the primary's error
+        get_provider_metrics(hedge).record_hedge(won=False)
+        raise primary_task.exception()
+    finally:
+        # Cancel the loser (or everything, if we were cancelled ourselves)
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def _resolve_route(
+    provider: Provider,
+    prompt: str,
+    prompt_tokens: int | None = None,
+    model: str = "",
+) -> tuple[Literal["openai", "groq", "gemini", "ollama"], str, float | None, bool]:
+    adaptive_score_used: float | None = None
+    circuit_triggered: bool = False
+    if provider == "auto":
+        return await _resolve_auto_provider(prompt, prompt_tokens, model)
+    effective_provider: Literal["openai", "groq", "gemini", "ollama"] = provider
+    routing_reason = "explicit"
+    if should_skip_provider(effective_provider, _model_for(effective_provider, model)):
+        circuit_triggered = True
+        routing_reason = "circuit_open"
+        if prompt_tokens is None:
+            prompt_tokens = estimate_tokens(prompt)
+        alternatives = _ranked_alternatives(effective_provider, prompt_tokens, _reasoning_boost(prompt))
+        if alternatives:
+            effective_provider = alternatives[0]
+            routing_reason = "circuit_open_fallback"
+    return effective_provider, routing_reason, adaptive_score_used, circuit_triggered
+
+
+def _ranked_alternatives(
+    primary: str,
+    prompt_tokens: int,
+    reasoning_boost: float = 1.0,
+) -> list[Literal["openai", "groq", "gemini", "ollama"]]:
+    """Available providers other than `primary` (with their default model), best
+    adaptive score first."""
+    candidates = [
+        p
+        for p in ROUTABLE_PROVIDERS
+        if p != primary and _is_available(p, prompt_tokens, PROVIDER_DEFAULT_MODELS[p])
+    ]
+    candidates.sort(key=lambda p: _compute_provider_score(p, prompt_tokens, reasoning_boost), reverse=True)
+    return candidates
+
+
+def _fallback_chain(
+    primary: Literal["openai", "groq", "gemini", "ollama"],
+    prompt: str,
+    prompt_tokens: int,
+) -> list[Literal["openai", "groq", "gemini", "ollama"]]:
+    chain = [primary, *_ranked_alternatives(primary, prompt_tokens, _reasoning_boost(prompt))]
+    return chain[: max(1, get_settings().fallback_max_attempts)]
+
+
+class Deadline:
+    """End-to-end time budget for one request, split across fallback attempts.
+
+    Every attempt but the last gets FALLBACK_ATTEMPT_SHARE of what is left
+    (at least FALLBACK_MIN_ATTEMPT_SEC); the last attempt gets the rest, so the
+    whole chain never runs past the budget.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, budget_sec: float) -> None:
+        self.expires_at = time.monotonic() + budget_sec
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def attempt_timeout(self, attempts_left: int) -> float:
+        remaining = self.remaining()
+        if attempts_left <= 1:
+            return remaining
+        s = get_settings()
+        return min(remaining, max(remaining * s.fallback_attempt_share, s.fallback_min_attempt_sec))
+
+
+def _attempt_record(
+    provider: str,
+    model: str,
+    started: float,
+    budget_sec: float,
+    error: BaseException | None = None,
+) -> dict:
+    if error is None:
+        outcome = "ok"
+    elif isinstance(error, LimiterTimeout):
+        outcome = "shed"
+    elif isinstance(error, CircuitOpenError):
+        outcome = "circuit_open"
+    elif isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        outcome = "timeout"
+    else:
+        outcome = "error"
+    record = {
+        "provider": provider,
+        "model": model,
+        "outcome": outcome,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+        "budget_ms": round(budget_sec * 1000, 2),
+    }
+    if error is not None and outcome == "error":
+        record["error"] = str(error)[:200]
+    return record
+
+
+def _model_for_attempt(provider: str, model: str, index: int, routing_reason: str) -> str:
+    # The requested model belongs to the routed provider; fallbacks use their own default
+    if index == 0 and routing_reason != "circuit_open_fallback":
+        return _model_for(provider, model)
+    return PROVIDER_DEFAULT_MODELS[provider]
+
+
+async def generate_with_fallback(
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    messages: list[dict] | None = None,
+) -> tuple[str, str, float, str, str, float | None, bool, list[dict]]:
+    """Try the routed provider, then the next-best providers by adaptive score.
+
+    All attempts share one REQUEST_TIMEOUT deadline. Returns (result,
+    provider_used, latency_ms, original_provider, routing_reason,
+    adaptive_score_used, circuit_triggered, attempts) where `attempts` lists
+    every provider tried with its outcome and elapsed time. Pass `messages`
+    (with `prompt` = flatten_messages(messages)) for a multi-turn conversation.
+    """
+    original_provider: str = provider if provider != "auto" else "auto"
+    prompt_tokens = estimate_tokens(prompt)
+    effective_provider, routing_reason, adaptive_score_used, circuit_triggered = await _resolve_route(
+        provider, prompt, prompt_tokens, model
+    )
+
+    settings = get_settings()
+    deadline = Deadline(settings.request_timeout)
+    chain = _fallback_chain(effective_provider, prompt, prompt_tokens)
+    attempts: list[dict] = []
+    tried: set[str] = set()
+    last_error: Exception | None = None
+    for index, attempt_provider in enumerate(chain):
+        if attempt_provider in tried:
+            continue  # already answered (and failed) as a hedge
+        if index > 0 and deadline.remaining() < settings.fallback_min_attempt_sec:
+            break
+        attempt_model = _model_for_attempt(attempt_provider, model, index, routing_reason)
+        timeout = deadline.attempt_timeout(len(chain) - index)
+        started = time.perf_counter()
+        tried.add(attempt_provider)
+        try:
+            if index == 0 and provider == "auto" and settings.hedge_enabled:
+                HEDGE_BUDGET.deposit(settings.hedge_budget_ratio)
+                result, provider_used, latency_ms = await _generate_hedged(
+                    attempt_provider, model, prompt, temperature, timeout, prompt_tokens, tried, messages
+                )
+                if provider_used != attempt_provider:
+                    routing_reason = "hedged"
+                    attempt_model = PROVIDER_DEFAULT_MODELS[provider_used]
+            else:
+                result, latency_ms = await _call_provider(
+                    attempt_provider, attempt_model, prompt, temperature, timeout, prompt_tokens, messages
+                )
+                provider_used = attempt_provider
+        except Exception as e:
+            attempts.append(_attempt_record(attempt_provider, attempt_model, started, timeout, e))
+            logger.warning(
+                "provider_failed",
+                extra={"provider": attempt_provider, "error": str(e), "attempt": index + 1},
+            )
+            last_error = e
+            continue
+        attempts.append(_attempt_record(provider_used, attempt_model, started, timeout))
+        if index > 0:
+            routing_reason = "fallback"
         logger.info(
             "llm_used",
             extra={
                 "original_provider": original_provider,
-                "final_provider_used": effective_provider,
+                "final_provider_used": provider_used,
                 "routing_reason": routing_reason,
                 "latency_ms": latency_ms,
+                "attempts": len(attempts),
             },
         )
         return (
             result,
-            effective_provider,
+            provider_used,
             latency_ms,
             original_provider,
             routing_reason,
             adaptive_score_used,
             circuit_triggered,
+            attempts,
         )
-    except Exception as e:
-        get_provider_metrics(effective_provider).record_failure()
-        logger.warning(
-            "provider_failed",
-            extra={"provider": effective_provider, "error": str(e)},
-        )
-        try:
-            await client.close()
-        except Exception:
-            pass
 
-    fallback = OllamaClient()
-    fallback_model = (model or "").strip() or PROVIDER_DEFAULT_MODELS.get("ollama", "llama3.2")
-    start = time.perf_counter()
+    logger.warning(
+        "fallback_chain_exhausted",
+        extra={"original_provider": original_provider, "attempts": attempts},
+    )
+    if last_error is None:
+        raise asyncio.TimeoutError("request deadline exceeded before any provider was tried")
+    raise last_error
+
+
+async def _next_token(stream: AsyncIterator[str], timeout: float) -> str | None:
     try:
-        result = await asyncio.wait_for(
-            fallback.generate(prompt, fallback_model, temperature),
-            timeout=timeout,
-        )
-        latency_ms = (time.perf_counter() - start) * 1000
-        get_provider_metrics("ollama").record_success(latency_ms)
-        logger.info(
-            "llm_used",
-            extra={
-                "original_provider": original_provider,
-                "final_provider_used": "ollama",
-                "routing_reason": "fallback",
-                "latency_ms": latency_ms,
-            },
+        return await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+    except StopAsyncIteration:
+        return None
+
+
+class RoutedStream:
+    """Streamed counterpart of generate_with_fallback.
+
+    Iterate to receive text chunks. Routing, circuit skipping and the fallback
+    chain work as for generate_with_fallback, except that failover only
+    happens before the first token: once text has been sent to the caller a
+    provider error is re-raised. The shared deadline covers the time to first
+    token; after that each token may take up to REQUEST_TIMEOUT. Routing
+    details, attempts, TTFT and total latency are available as attributes once
+    iteration finishes.
+    """
+
+    def __init__(self, provider: Provider, model: str, prompt: str, temperature: float) -> None:
+        self.provider = provider
+        self.model = model
+        self.prompt = prompt
+        self.temperature = temperature
+        self.original_provider: str = provider if provider != "auto" else "auto"
+        self.provider_used: str | None = None
+        self.model_used: str | None = None
+        self.routing_reason: str | None = None
+        self.adaptive_score_used: float | None = None
+        self.circuit_triggered: bool = False
+        self.ttft_ms: float | None = None
+        self.latency_ms: float | None = None
+        self.attempts: list[dict] = []
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        prompt_tokens = estimate_tokens(self.prompt)
+        effective_provider, routing_reason, self.adaptive_score_used, self.circuit_triggered = (
+            await _resolve_route(self.provider, self.prompt, prompt_tokens, self.model)
         )
-        return (
-            result,
-            "ollama",
-            latency_ms,
-            original_provider,
-            "fallback",
-            adaptive_score_used,
-            circuit_triggered,
+        settings = get_settings()
+        deadline = Deadline(settings.request_timeout)
+        chain = _fallback_chain(effective_provider, self.prompt, prompt_tokens)
+        last_error: Exception | None = None
+        for index, attempt_provider in enumerate(chain):
+            is_last = index == len(chain) - 1
+            if index > 0 and deadline.remaining() < settings.fallback_min_attempt_sec:
+                break
+            attempt_model = _model_for_attempt(attempt_provider, self.model, index, routing_reason)
+            attempt_reason = routing_reason if index == 0 else "fallback"
+            timeout = deadline.attempt_timeout(len(chain) - index)
+            started = time.perf_counter()
+            ticket = None
+            try:
+                ticket = get_circuit(attempt_provider, attempt_model).acquire()
+                permit = await get_limiter(attempt_provider).acquire(min(timeout, settings.limiter_max_wait_sec))
+            except (CircuitOpenError, LimiterTimeout) as e:
+                if ticket is not None:
+                    ticket.release()
+                self.attempts.append(_attempt_record(attempt_provider, attempt_model, started, timeout, e))
+                if is_last:
+                    raise
+                logger.warning("provider_shed", extra={"provider": attempt_provider, "error": str(e)})
+                last_error = e
+                continue
+            except BaseException:
+                if ticket is not None:
+                    ticket.release()
+                raise
+            stream = get_client(attempt_provider).stream(self.prompt, attempt_model, self.temperature)
+            start = time.perf_counter()
+            first_token_sent = False
+            try:
+                while True:
+                    if first_token_sent:
+                        token_timeout = settings.request_timeout
+                    else:
+                        token_timeout = max(0.0, timeout - (time.perf_counter() - started))
+                    token = await _next_token(stream, token_timeout)
+                    if token is None:
+                        break
+                    if not first_token_sent:
+                        first_token_sent = True
+                        self.ttft_ms = (time.perf_counter() - start) * 1000
+                        self.provider_used = attempt_provider
+                        self.model_used = attempt_model
+                        self.routing_reason = attempt_reason
+                        get_provider_metrics(attempt_provider).record_ttft(self.ttft_ms)
+                    yield token
+                permit.release(success=True)
+                ticket.release(success=True)
+            except Exception as e:
+                permit.release(success=False, overload=_is_overload(e))
+                ticket.release(success=False)
+                get_provider_metrics(attempt_provider).record_failure(attempt_model)
+                self.attempts.append(_attempt_record(attempt_provider, attempt_model, started, timeout, e))
+                if first_token_sent or is_last:
+                    raise
+                logger.warning(
+                    "provider_failed",
+                    extra={"provider": attempt_provider, "error": str(e), "stream": True, "attempt": index + 1},
+                )
+                last_error = e
+                continue
+            finally:
+                # Releases the provider connection back to the pool, also when
+                # the caller stops iterating early (client disconnect)
+                permit.release(success=False)
+                ticket.release()
+                await stream.aclose()
+            self.latency_ms = (time.perf_counter() - start) * 1000
+            self.attempts.append(_attempt_record(attempt_provider, attempt_model, started, timeout))
+            if not first_token_sent:
+                # Empty completion still counts as an answer from this provider
+                self.ttft_ms = self.latency_ms
+                self.provider_used = attempt_provider
+                self.model_used = attempt_model
+                self.routing_reason = attempt_reason
+            get_provider_metrics(attempt_provider).record_success(self.latency_ms, attempt_model, prompt_tokens)
+            logger.info(
+                "llm_used",
+                extra={
+                    "original_provider": self.original_provider,
+                    "final_provider_used": attempt_provider,
+                    "routing_reason": attempt_reason,
+                    "latency_ms": self.latency_ms,
+                    "ttft_ms": self.ttft_ms,
+                    "attempts": len(self.attempts),
+                },
+            )
+            return
+        logger.warning(
+            "fallback_chain_exhausted",
+            extra={"original_provider": self.original_provider, "attempts": self.attempts, "stream": True},
         )
-    finally:
-        if hasattr(fallback, "close") and callable(fallback.close):
-            await fallback.close()
+        if last_error is None:
+            raise asyncio.TimeoutError("request deadline exceeded before any provider was tried")
+        raise last_error
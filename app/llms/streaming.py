@@ -0,0 +1,55 @@
+# =============================================================================
+# app/llms/streaming.py — Wire-format helpers for streamed completions
+# =============================================================================
+# OpenAI/Groq and Gemini (alt=sse) stream Server-Sent Events; Ollama streams
+# newline-delimited JSON. These helpers turn an httpx streaming response into
+# decoded JSON payloads so each client only extracts its token text.
+# =============================================================================
+
+import json
+from collections.abc import AsyncIterator
+
+import httpx
+
+SSE_DONE = "[DONE]"
+
+
+async def iter_sse_json(response: httpx.Response) -> AsyncIterator[dict]:
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data:
+            continue
+        if data == SSE_DONE:
+            return
+        try:
+            yield json.loads(data)
+        except json.JSONDecodeError:
+            continue
+
+
+async def iter_ndjson(response: httpx.Response) -> AsyncIterator[dict]:
+    async for line in response.aiter_lines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def openai_delta_text(payload: dict) -> str:
+    choices = payload.get("choices") or []
+    if not choices:
+        return ""
+    delta = choices[0].get("delta") or {}
+    return delta.get("content") or ""
+
+
+async def raise_for_stream_status(response: httpx.Response) -> None:
+    """raise_for_status() for streamed responses, reading the error body first."""
+    if response.is_error:
+        await response.aread()
+        response.raise_for_status()
@@ -0,0 +1,84 @@
+# =============================================================================
+# app/llms/warmup.py — Keep the Ollama fallback model loaded
+# =============================================================================
+# Ollama unloads a model after its keep_alive expires, and the next request
+# then pays the full model load inside a user request — typically right when
+# the cloud providers are down and Ollama is the last resort. So:
+#   - at startup (OLLAMA_PRELOAD) the default Ollama model is loaded in the
+#     background, with the configured keep_alive / num_ctx / num_thread;
+#   - every OLLAMA_KEEP_WARM_SEC without an Ollama call, a preload request
+#     resets the keep_alive timer (OLLAMA_KEEP_WARM_SEC=0 disables this).
+# =============================================================================
+
+import asyncio
+import time
+
+from app.core.config import get_settings
+from app.llms.registry import get_client
+from app.llms.router import PROVIDER_DEFAULT_MODELS
+from app.utils.logger import logger
+
+
+class OllamaWarmer:
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self.model = PROVIDER_DEFAULT_MODELS["ollama"]
+        self.warm_count = 0
+        self.last_warm_ms: float | None = None
+        self.last_error: str | None = None
+
+    async def warm_once(self) -> None:
+        start = time.perf_counter()
+        try:
+            await get_client("ollama").preload(self.model)
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+            logger.warning("ollama_warm_failed", extra={"model": self.model, "error": self.last_error})
+            return
+        self.last_error = None
+        self.warm_count += 1
+        self.last_warm_ms = (time.perf_counter() - start) * 1000
+        logger.info("ollama_warmed", extra={"model": self.model, "latency_ms": self.last_warm_ms})
+
+    async def _run(self, preload: bool, keep_warm_sec: float) -> None:
+        if preload:
+            await self.warm_once()
+        if keep_warm_sec <= 0:
+            return
+        client = get_client("ollama")
+        while True:
+            last_used = client.last_used or 0.0
+            idle = time.monotonic() - last_used
+            if idle >= keep_warm_sec:
+                await self.warm_once()
+                await asyncio.sleep(keep_warm_sec)
+            else:
+                await asyncio.sleep(keep_warm_sec - idle)
+
+    async def start(self) -> None:
+        """Preload and keep-warm in the background; startup does not wait for the model load."""
+        s = get_settings()
+        if not s.ollama_preload and s.ollama_keep_warm_sec <= 0:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(s.ollama_preload, s.ollama_keep_warm_sec))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def to_dict(self) -> dict:
+        return {
+            "model": self.model,
+            "warm_count": self.warm_count,
+            "last_warm_ms": round(self.last_warm_ms, 2) if self.last_warm_ms is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+OLLAMA_WARMER = OllamaWarmer()
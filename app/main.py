@@ -1,57 +1,59 @@
 import asyncio
+import json
 import time
 from contextlib import asynccontextmanager
 
-import httpx
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
 
+from app.adaptive.circuit import CircuitOpenError, provider_circuits
+from app.adaptive.health import HEALTH_PROBER
+from app.adaptive.limiter import LimiterTimeout, get_limiter
 from app.adaptive.metrics import PROVIDER_STATS
+from app.adaptive.persistence import METRICS_SNAPSHOTTER
+from app.adaptive.shared_state import SHARED_STATE
 from app.core.config import get_settings
 from app.db.models import init_db
-from app.db.session import get_db_connection, get_dashboard_stats, get_last_logs
+from app.db.session import get_dashboard_stats, get_last_logs
+from app.llms.registry import close_clients, start_clients
+from app.llms.router import ContextLengthError
+from app.llms.warmup import OLLAMA_WARMER
+from app.rag.bulk_ingest import (
+    IngestInputError,
+    IngestPipeline,
+    body_format,
+    ndjson_documents,
+    text_document,
+    upload_documents,
+)
+from app.rag.embedding_cache import EMBEDDING_CACHE
 from app.rag.embeddings import get_embedding_model
-from app.rag.index import index_count
+from app.rag.index import index_count, index_info, is_read_only, memory_info, recall_at_k
 from app.rag.ingest import ingest_text
-from app.schemas.request import GenerateRequest
-from app.schemas.response import GenerateResponse
+from app.rag.jobs import INGEST_JOBS, JobQueueFull
+from app.rag.persistence import RAG_SNAPSHOTTER
+from app.rag.query_batcher import QUERY_BATCHER
+from app.schemas.request import BatchGenerateRequest, GenerateRequest, SessionTurnRequest
+from app.schemas.response import (
+    BatchGenerateItem,
+    BatchGenerateResponse,
+    GenerateResponse,
+    SessionTurnResponse,
+)
 from app.security.analyzer import analyze_prompt
 from app.security.rate_guard import make_fingerprint
-from app.services.llm_service import generate
+from app.services.llm_service import generate, generate_batch, generate_stream
+from app.services.response_cache import RESPONSE_CACHE
+from app.services.session_service import SESSION_STORE, TutoringSession, post_turn
 
-# Free-tier friendly: lower rate limit to avoid provider 429
-RATE_LIMIT_REQUESTS = 15
+# Free-tier friendly: low per-IP limit (RATE_LIMIT_REQUESTS) to avoid provider 429
 RATE_LIMIT_WINDOW_SEC = 60
 _rate_store: dict[str, list[float]] = {}
 _rate_lock = asyncio.Lock()
 
 
-async def check_ollama_reachable() -> bool:
-    try:
-        base = get_settings().ollama_base_url.rstrip("/")
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            r = await client.get(f"{base}/api/tags")
-            return r.status_code == 200
-    except Exception:
-        return False
-
-
-def check_db_connected() -> bool:
-    try:
-        with get_db_connection() as conn:
-            conn.execute("SELECT 1")
-        return True
-    except Exception:
-        return False
-
-
-def _provider_status(ollama_ok: bool) -> dict[str, str]:
-    s = get_settings()
-    return {
-        "openai": "configured" if (s.openai_api_key and s.openai_api_key.strip()) else "missing_key",
-        "groq": "configured" if (s.groq_api_key and s.groq_api_key.strip()) else "missing_key",
-        "gemini": "configured" if (s.gemini_api_key and s.gemini_api_key.strip()) else "missing_key",
-        "ollama": "reachable" if ollama_ok else "unreachable",
-    }
+def _provider_status() -> dict[str, str]:
+    return {name: health.status for name, health in HEALTH_PROBER.providers.items()}
 
 
 MAX_PROMPT_LENGTH = 20_000
@@ -60,7 +62,25 @@ MAX_PROMPT_LENGTH = 20_000
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
-    yield
+    await METRICS_SNAPSHOTTER.start()
+    await RAG_SNAPSHOTTER.start()
+    INGEST_JOBS.start()
+    await start_clients()
+    await OLLAMA_WARMER.start()
+    await HEALTH_PROBER.start()
+    await SHARED_STATE.start(rate_counts=_local_rate_counts)
+    try:
+        yield
+    finally:
+        await SHARED_STATE.stop()
+        await HEALTH_PROBER.stop()
+        await OLLAMA_WARMER.stop()
+        await INGEST_JOBS.stop()
+        await QUERY_BATCHER.stop()
+        await RAG_SNAPSHOTTER.stop()
+        await METRICS_SNAPSHOTTER.stop()
+        await close_clients()
+        EMBEDDING_CACHE.close()
 
 
 app = FastAPI(title="Multi-LLM Orchestrator", lifespan=lifespan)
@@ -73,9 +93,10 @@ async def root():
 
 @app.get("/health")
 async def get_health():
-    db_ok = check_db_connected()
-    ollama_ok = await check_ollama_reachable()
-    providers = _provider_status(ollama_ok)
+    # Served from the background prober's cache: no network or DB work here
+    db_ok = bool(HEALTH_PROBER.db_ok)
+    ollama_ok = HEALTH_PROBER.providers["ollama"].reachable is True
+    providers = _provider_status()
     if not db_ok:
         status = "unhealthy"
     elif ollama_ok:
@@ -87,31 +108,158 @@ async def get_health():
         "status": status,
         "database": database,
         "providers": providers,
+        "provider_checks": HEALTH_PROBER.to_dict(),
+        "shared_state": SHARED_STATE.to_dict(),
+        "ollama_warmup": OLLAMA_WARMER.to_dict(),
     }
 
 
-async def rate_limit_check(ip: str) -> None:
+def _local_rate_counts() -> dict[str, int]:
+    """This worker's requests per IP in the current window (published to other workers)."""
+    now = time.monotonic()
+    counts = {}
+    for ip, timestamps in list(_rate_store.items()):
+        count = sum(1 for t in timestamps if now - t < RATE_LIMIT_WINDOW_SEC)
+        if count:
+            counts[ip] = count
+        else:
+            del _rate_store[ip]
+    return counts
+
+
+async def rate_limit_check(ip: str, cost: int = 1) -> None:
+    """Charge `cost` requests (one per provider call) to the per-IP window, or raise 429."""
     async with _rate_lock:
         now = time.monotonic()
         if ip not in _rate_store:
             _rate_store[ip] = []
         timestamps = _rate_store[ip]
         timestamps[:] = [t for t in timestamps if now - t < RATE_LIMIT_WINDOW_SEC]
-        if len(timestamps) >= RATE_LIMIT_REQUESTS:
+        # Other workers' counts come from the last shared-state sync (0 if disabled)
+        if len(timestamps) + SHARED_STATE.peer_rate_count(ip) + cost > get_settings().rate_limit_requests:
             raise HTTPException(status_code=429, detail="Rate limit exceeded")
-        timestamps.append(now)
+        timestamps.extend([now] * cost)
 
 
 @app.get("/rag/stats")
-async def get_rag_stats() -> dict:
-    return {"chunks_indexed": index_count()}
+async def get_rag_stats(recall: bool = False) -> dict:
+    """`recall=1` adds recall_at_k, measured in the background (see app.rag.index.recall_at_k)."""
+    return {
+        "chunks_indexed": index_count(),
+        "index": index_info(),
+        "memory": memory_info(),
+        "recall_at_k": recall_at_k() if recall else None,
+        "embedding_cache": EMBEDDING_CACHE.to_dict(),
+        "query_batching": QUERY_BATCHER.to_dict(),
+        "ingest_jobs": INGEST_JOBS.to_dict(),
+        "persistence": RAG_SNAPSHOTTER.to_dict(),
+    }
+
+
+def _require_writable_index() -> None:
+    if is_read_only():
+        raise HTTPException(
+            status_code=503,
+            detail="RAG index is read-only in this worker (another process owns RAG_DATA_DIR); ingest with one worker",
+        )
 
 
 @app.post("/rag/ingest")
 async def post_rag_ingest(body: dict) -> dict:
+    _require_writable_index()
     text = body.get("text", "") or ""
-    chunks_indexed = await ingest_text(text)
-    return {"chunks_indexed": chunks_indexed}
+    if body.get("background"):
+        job = await _submit_job(lambda job: job.add_text(body.get("source"), text))
+        return job.to_dict(INGEST_JOBS.position(job))
+    chunks_indexed, duplicates_skipped = await ingest_text(text, body.get("source"))
+    return {"chunks_indexed": chunks_indexed, "duplicates_skipped": duplicates_skipped}
+
+
+@app.post("/rag/ingest/bulk")
+async def post_rag_ingest_bulk(request: Request, source: str | None = None) -> dict:
+    """Streaming ingest: multipart files (txt/markdown/PDF), NDJSON documents or a raw text body."""
+    _require_writable_index()
+    fmt = body_format(request.headers.get("content-type", ""))
+    pipeline = IngestPipeline()
+    if fmt == "multipart":
+        # Starlette spools uploads to temp files; they are then read incrementally
+        form = await request.form()
+        try:
+            uploads = [v for v in form.values() if isinstance(v, UploadFile)]
+            if not uploads:
+                raise HTTPException(status_code=400, detail="No files in multipart body")
+            stats = await pipeline.run(upload_documents(uploads))
+        finally:
+            await form.close()
+    elif fmt == "ndjson":
+        stats = await pipeline.run(ndjson_documents(request.stream()))
+    elif fmt == "text":
+        stats = await pipeline.run(text_document(source, request.stream()))
+    else:
+        raise HTTPException(status_code=415, detail="Expected multipart/form-data, NDJSON or text/plain body")
+    if stats["error"] and not stats["chunks"]:
+        raise HTTPException(status_code=pipeline.error_status or 400, detail=stats["error"])
+    if stats["failed_chunks"] and not stats["chunks_indexed"] and not stats["duplicates_skipped"]:
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {stats['last_failure']}")
+    return stats
+
+
+async def _submit_job(add_inputs):
+    """Create a job, let `add_inputs(job)` spool its input, then queue it."""
+    try:
+        job = INGEST_JOBS.create()
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        await add_inputs(job)
+    except IngestInputError as e:
+        INGEST_JOBS.discard(job)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except BaseException:
+        INGEST_JOBS.discard(job)
+        raise
+    INGEST_JOBS.enqueue(job)
+    return job
+
+
+@app.post("/rag/jobs", status_code=202)
+async def post_rag_job(request: Request, source: str | None = None) -> dict:
+    """Queue a background ingest job; same bodies as /rag/ingest/bulk, or JSON {"text", "source"}."""
+    _require_writable_index()
+    fmt = body_format(request.headers.get("content-type", ""))
+    if fmt == "multipart":
+        form = await request.form()
+        try:
+            uploads = [v for v in form.values() if isinstance(v, UploadFile)]
+            if not uploads:
+                raise HTTPException(status_code=400, detail="No files in multipart body")
+
+            async def add_uploads(job) -> None:
+                for upload in uploads:
+                    await job.add_upload(upload)
+
+            job = await _submit_job(add_uploads)
+        finally:
+            await form.close()
+    elif fmt in ("ndjson", "text"):
+        job = await _submit_job(lambda job: job.add_stream(source, fmt, request.stream()))
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=415, detail="Expected multipart/form-data, NDJSON, text/plain or JSON body")
+        if not isinstance(body, dict) or not isinstance(body.get("text"), str):
+            raise HTTPException(status_code=400, detail='Expected {"text": "..."}')
+        job = await _submit_job(lambda job: job.add_text(body.get("source") or source, body["text"]))
+    return job.to_dict(INGEST_JOBS.position(job))
+
+
+@app.get("/rag/jobs/{job_id}")
+async def get_rag_job(job_id: str) -> dict:
+    job = INGEST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingest job")
+    return job.to_dict(INGEST_JOBS.position(job))
 
 
 @app.get("/admin/logs")
@@ -128,20 +276,48 @@ async def get_dashboard_stats_route() -> dict:
 @app.get("/metrics/providers")
 async def get_metrics_providers() -> dict:
     return {
-        name: m.to_dict()
+        name: {
+            **m.to_dict(),
+            "concurrency": get_limiter(name).to_dict(),
+            "circuits": provider_circuits(name),
+        }
         for name, m in PROVIDER_STATS.items()
     }
 
 
-@app.post("/generate", response_model=GenerateResponse)
-async def post_generate(request: Request, body: GenerateRequest) -> GenerateResponse:
-    if len(body.prompt) > MAX_PROMPT_LENGTH:
-        raise HTTPException(status_code=413, detail="Prompt exceeds maximum length")
+def _client_context(request: Request, prompt: str) -> tuple[str, str]:
     client_host = request.client.host if request.client else "unknown"
     forwarded = request.headers.get("x-forwarded-for")
     ip = forwarded.split(",")[0].strip() if forwarded else client_host
     user_agent = request.headers.get("user-agent", "") or ""
-    fingerprint = make_fingerprint(ip, user_agent, len(body.prompt))
+    return ip, make_fingerprint(ip, user_agent, len(prompt))
+
+
+def _provider_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, ContextLengthError):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, ValueError):
+        return HTTPException(status_code=400, detail=str(e))
+    if isinstance(e, (CircuitOpenError, LimiterTimeout)):
+        return HTTPException(status_code=503, detail="LLM providers overloaded or unavailable. Retry shortly.")
+    msg = str(e)
+    if "connection" in msg.lower() or "unreachable" in msg.lower() or "timeout" in msg.lower():
+        return HTTPException(status_code=502, detail="LLM provider unreachable. Check API keys and network.")
+    return HTTPException(status_code=500, detail=msg)
+
+
+@app.get("/metrics/cache")
+async def get_metrics_cache() -> dict:
+    return RESPONSE_CACHE.to_dict()
+
+
+@app.post("/generate", response_model=GenerateResponse)
+async def post_generate(request: Request, body: GenerateRequest) -> GenerateResponse:
+    if len(body.prompt) > MAX_PROMPT_LENGTH:
+        raise HTTPException(status_code=413, detail="Prompt exceeds maximum length")
+    ip, fingerprint = _client_context(request, body.prompt)
     risk_score = analyze_prompt(body.prompt)
     await rate_limit_check(ip)
     try:
@@ -152,6 +328,8 @@ async def post_generate(request: Request, body: GenerateRequest) -> GenerateResp
             temperature=body.temperature,
             risk_score=risk_score,
             fingerprint=fingerprint,
+            rag_nprobe=body.rag_nprobe,
+            rag_ef_search=body.rag_ef_search,
         )
         return GenerateResponse(
             provider_used=provider_used,
@@ -159,12 +337,152 @@ async def post_generate(request: Request, body: GenerateRequest) -> GenerateResp
             latency_ms=round(latency_ms, 2),
             routing_reason=routing_reason,
         )
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except HTTPException:
-        raise
     except Exception as e:
-        msg = str(e)
-        if "connection" in msg.lower() or "unreachable" in msg.lower() or "timeout" in msg.lower():
-            raise HTTPException(status_code=502, detail="LLM provider unreachable. Check API keys and network.")
-        raise HTTPException(status_code=500, detail=msg)
+        raise _provider_http_error(e)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate/stream")
+async def post_generate_stream(request: Request, body: GenerateRequest) -> StreamingResponse:
+    """Server-Sent Events: `token` events with text chunks, then `done` (or `error`)."""
+    if len(body.prompt) > MAX_PROMPT_LENGTH:
+        raise HTTPException(status_code=413, detail="Prompt exceeds maximum length")
+    ip, fingerprint = _client_context(request, body.prompt)
+    risk_score = analyze_prompt(body.prompt)
+    await rate_limit_check(ip)
+    events = generate_stream(
+        provider=body.provider,
+        model=body.model,
+        prompt=body.prompt,
+        temperature=body.temperature,
+        risk_score=risk_score,
+        fingerprint=fingerprint,
+        rag_nprobe=body.rag_nprobe,
+        rag_ef_search=body.rag_ef_search,
+    )
+    # Pull the first event before responding so failures that happen before
+    # any token (all providers down) still surface as a normal HTTP error
+    try:
+        first = await events.__anext__()
+    except Exception as e:
+        raise _provider_http_error(e)
+
+    async def body_iter():
+        yield _sse_event(*first)
+        try:
+            async for event in events:
+                yield _sse_event(*event)
+        except Exception as e:
+            err = _provider_http_error(e)
+            yield _sse_event("error", {"status_code": err.status_code, "detail": err.detail})
+
+    return StreamingResponse(
+        body_iter(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _batch_item(index: int, outcome: tuple | Exception) -> BatchGenerateItem:
+    if isinstance(outcome, Exception):
+        err = _provider_http_error(outcome)
+        return BatchGenerateItem(index=index, status_code=err.status_code, error=str(err.detail))
+    response_text, provider_used, latency_ms, routing_reason = outcome
+    return BatchGenerateItem(
+        index=index,
+        provider_used=provider_used,
+        response=response_text,
+        latency_ms=round(latency_ms, 2),
+        routing_reason=routing_reason,
+    )
+
+
+@app.post("/generate/batch", response_model=BatchGenerateResponse)
+async def post_generate_batch(request: Request, body: BatchGenerateRequest) -> Response:
+    """Fan out many prompts concurrently; results in request order, or NDJSON as they complete."""
+    for i, item in enumerate(body.items):
+        if len(item.prompt) > MAX_PROMPT_LENGTH:
+            raise HTTPException(status_code=413, detail=f"Prompt at index {i} exceeds maximum length")
+    contexts = [_client_context(request, item.prompt) for item in body.items]
+    ip = contexts[0][0]
+    # Each item is a provider call: charge the per-IP limit for all of them
+    await rate_limit_check(ip, cost=len(body.items))
+    risk_scores = [analyze_prompt(item.prompt) for item in body.items]
+    fingerprints = [fingerprint for _, fingerprint in contexts]
+    start = time.perf_counter()
+    outcomes = generate_batch(body.items, risk_scores, fingerprints)
+
+    if body.stream:
+        async def ndjson_iter():
+            async for index, outcome in outcomes:
+                yield _batch_item(index, outcome).model_dump_json() + "\n"
+
+        return StreamingResponse(ndjson_iter(), media_type="application/x-ndjson")
+
+    results: list[BatchGenerateItem | None] = [None] * len(body.items)
+    async for index, outcome in outcomes:
+        results[index] = _batch_item(index, outcome)
+    return BatchGenerateResponse(
+        results=results,
+        total_latency_ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+
+
+@app.post("/sessions")
+async def post_session() -> dict:
+    session = SESSION_STORE.create()
+    return {"session_id": session.session_id}
+
+
+def _get_session_or_404(session_id: str) -> TutoringSession:
+    session = SESSION_STORE.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str) -> dict:
+    return _get_session_or_404(session_id).to_dict()
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str) -> dict:
+    if not SESSION_STORE.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": True}
+
+
+@app.post("/sessions/{session_id}/turns", response_model=SessionTurnResponse)
+async def post_session_turn(request: Request, session_id: str, body: SessionTurnRequest) -> SessionTurnResponse:
+    if len(body.prompt) > MAX_PROMPT_LENGTH:
+        raise HTTPException(status_code=413, detail="Prompt exceeds maximum length")
+    session = _get_session_or_404(session_id)
+    ip, fingerprint = _client_context(request, body.prompt)
+    risk_score = analyze_prompt(body.prompt)
+    await rate_limit_check(ip)
+    try:
+        turn = await post_turn(
+            session,
+            provider=body.provider,
+            model=body.model,
+            prompt=body.prompt,
+            temperature=body.temperature,
+            risk_score=risk_score,
+            fingerprint=fingerprint,
+        )
+    except Exception as e:
+        raise _provider_http_error(e)
+    return SessionTurnResponse(
+        session_id=session.session_id,
+        provider_used=turn["provider_used"],
+        response=turn["response"],
+        latency_ms=round(turn["latency_ms"], 2),
+        routing_reason=turn["routing_reason"],
+        prompt_tokens=turn["prompt_tokens"],
+        history_turns=turn["history_turns"],
+        rag_reused=turn["rag_reused"],
+    )
@@ -0,0 +1,338 @@
+# -----------------------------------------------------------------------------
+# app/rag/bulk_ingest.py — Streaming bulk ingest (files / NDJSON) with pipelining
+# -----------------------------------------------------------------------------
+# Documents are read as a stream of text pieces and chunked incrementally
+# (SentenceChunker; source and offsets are stored with each chunk). Three
+# stages run concurrently, connected by queues of RAG_INGEST_QUEUE_DEPTH batches:
+#   chunk  — reader + chunker, emits batches of RAG_INGEST_BATCH_SIZE chunks;
+#   embed  — drops already-indexed chunks, embeds the rest (embedding cache);
+#   index  — add_to_index (log append + FAISS add).
+# While one batch is encoding, the next is being chunked and the previous one
+# indexed. Memory is bounded by the queue depth and batch size, not by the
+# size of the documents: nothing holds a whole document.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import codecs
+import json
+import time
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import UploadFile
+
+from app.core.config import get_settings
+from app.rag.embedding_cache import EMBEDDING_CACHE
+from app.rag.index import add_to_index
+from app.rag.chunking import Chunk
+from app.rag.ingest import dedupe_chunks, make_chunker
+from app.rag.query_batcher import QUERY_BATCHER
+from app.utils.logger import logger
+
+READ_SIZE = 64 * 1024
+PDF_TYPES = ("application/pdf",)
+PDF_SUFFIXES = (".pdf",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+TEXT_TYPES = ("text/plain", "text/markdown", "text/x-markdown")
+
+# (source name, text pieces of one document)
+Document = tuple[str | None, AsyncIterator[str]]
+
+
+class IngestInputError(Exception):
+    """Malformed or oversized bulk ingest input."""
+
+    def __init__(self, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# -----------------------------------------------------------------------------
+# Readers: request bodies / uploads -> documents of text pieces
+# -----------------------------------------------------------------------------
+
+def body_format(content_type: str) -> str | None:
+    """"multipart", "ndjson" or "text" for a supported bulk ingest Content-Type, else None."""
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type == "multipart/form-data":
+        return "multipart"
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    if media_type in TEXT_TYPES:
+        return "text"
+    return None
+
+
+async def decode_pieces(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """UTF-8 text pieces of a byte stream (multi-byte characters split across reads are kept whole)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for data in byte_chunks:
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _upload_bytes(upload: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        data = await upload.read(READ_SIZE)
+        if not data:
+            return
+        yield data
+
+
+async def read_file_bytes(path: Path) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            data = await asyncio.to_thread(f.read, READ_SIZE)
+            if not data:
+                return
+            yield data
+
+
+async def pdf_pages(file: BinaryIO, name: str | None) -> AsyncIterator[str]:
+    """Text of each PDF page, extracted one page at a time in a worker thread."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise IngestInputError("PDF ingest requires the pypdf package", status_code=415)
+    try:
+        reader = await asyncio.to_thread(PdfReader, file)
+        pages = len(reader.pages)
+    except Exception as e:
+        raise IngestInputError(f"{name}: unreadable PDF ({e})")
+    for number in range(pages):
+        text = await asyncio.to_thread(lambda: reader.pages[number].extract_text() or "")
+        if text:
+            yield text + "\n"
+
+
+def is_pdf(upload: UploadFile) -> bool:
+    return (upload.content_type or "").lower() in PDF_TYPES or (upload.filename or "").lower().endswith(PDF_SUFFIXES)
+
+
+async def upload_documents(uploads: list[UploadFile]) -> AsyncIterator[Document]:
+    """One document per uploaded file: PDF text page by page, anything else as UTF-8 text."""
+    for upload in uploads:
+        if is_pdf(upload):
+            yield upload.filename, pdf_pages(upload.file, upload.filename)
+        else:
+            yield upload.filename, decode_pieces(_upload_bytes(upload))
+
+
+async def text_document(source: str | None, byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[Document]:
+    """A raw text/markdown body as a single document."""
+    yield source, decode_pieces(byte_chunks)
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def ndjson_documents(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[Document]:
+    """One document per NDJSON line: {"text": "...", "source": "..."} ("id" also names the source).
+
+    Lines are parsed as they arrive; only the current line is buffered, up to
+    RAG_INGEST_MAX_LINE_BYTES.
+    """
+    max_line = get_settings().rag_ingest_max_line_bytes
+    buffer = bytearray()
+    line_no = 0
+
+    def parse(line: bytes) -> Document | None:
+        if not line.strip():
+            return None
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            raise IngestInputError(f"line {line_no}: invalid JSON ({e})")
+        if not isinstance(obj, dict) or not isinstance(obj.get("text"), str):
+            raise IngestInputError(f'line {line_no}: expected an object with a "text" string')
+        source = obj.get("source") or obj.get("id")
+        return (str(source) if source is not None else f"line-{line_no}"), _single(obj["text"])
+
+    async for data in byte_chunks:
+        scanned = len(buffer)  # no newline before this offset
+        buffer += data
+        while True:
+            end = buffer.find(b"\n", scanned)
+            if end < 0:
+                break
+            line_no += 1
+            document = parse(bytes(buffer[:end]))
+            del buffer[: end + 1]
+            scanned = 0
+            if document is not None:
+                yield document
+        if len(buffer) > max_line:
+            raise IngestInputError(f"line {line_no + 1} exceeds {max_line} bytes", status_code=413)
+    if buffer:
+        line_no += 1
+        document = parse(bytes(buffer))
+        if document is not None:
+            yield document
+
+
+# -----------------------------------------------------------------------------
+# Pipeline
+# -----------------------------------------------------------------------------
+
+class IngestPipeline:
+    """Chunk -> embed -> index with bounded queues between the stages; one per ingest run.
+
+    `background` runs below live retrieval: each embed batch first waits (up to
+    RAG_JOB_YIELD_MAX_MS) for queued queries to be served; `executor` runs
+    model.encode (default: asyncio's thread pool).
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        executor: Executor | None = None,
+        background: bool = False,
+    ) -> None:
+        s = get_settings()
+        self.batch_size = max(1, batch_size or s.rag_ingest_batch_size)
+        self._executor = executor
+        self._background = background
+        depth = max(1, s.rag_ingest_queue_depth)
+        self._embed_queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self._index_queue: asyncio.Queue = asyncio.Queue(maxsize=depth)
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.documents = 0
+        self.chars = 0
+        self.chunks = 0
+        self.chunks_indexed = 0
+        self.duplicates_skipped = 0
+        self.failed_chunks = 0
+        self.batches = 0
+        self.embed_ms = 0.0
+        self.index_ms = 0.0
+        self.yield_ms = 0.0
+        self.error: str | None = None
+        self.error_status: int | None = None
+        self.last_failure: str | None = None
+
+    # -- stages -------------------------------------------------------------------
+
+    async def _chunk_stage(self, documents: AsyncIterator[Document]) -> None:
+        chunks: list[Chunk] = []
+        sources: list[str | None] = []
+
+        async def emit(new_chunks: Iterator[Chunk], source: str | None) -> None:
+            nonlocal chunks, sources
+            for chunk in new_chunks:
+                chunks.append(chunk)
+                sources.append(source)
+                if len(chunks) >= self.batch_size:
+                    self.chunks += len(chunks)
+                    await self._embed_queue.put((chunks, sources))
+                    chunks, sources = [], []
+
+        try:
+            async for source, pieces in documents:
+                self.documents += 1
+                chunker = make_chunker()
+                async for piece in pieces:
+                    self.chars += len(piece)
+                    await emit(chunker.feed(piece), source)
+                await emit(chunker.finish(), source)
+        except IngestInputError as e:
+            # Stop reading; what was already chunked is still indexed
+            self.error = str(e)
+            self.error_status = e.status_code
+        if chunks:
+            self.chunks += len(chunks)
+            await self._embed_queue.put((chunks, sources))
+
+    async def _embed_stage(self) -> None:
+        while True:
+            batch = await self._embed_queue.get()
+            if batch is None:
+                await self._index_queue.put(None)
+                return
+            chunks, sources = batch
+            try:
+                keep, hashes = dedupe_chunks([c.text for c in chunks])
+                self.duplicates_skipped += len(chunks) - len(keep)
+                if not keep:
+                    continue
+                extra = [{"source": sources[i], "start": chunks[i].start, "end": chunks[i].end} for i in keep]
+                chunks = [chunks[i].text for i in keep]
+                if self._background:
+                    waited = await QUERY_BATCHER.wait_idle(get_settings().rag_job_yield_max_ms / 1000)
+                    self.yield_ms += waited * 1000
+                start = time.perf_counter()
+                embeddings = await EMBEDDING_CACHE.embed(chunks, hashes, persist=True, executor=self._executor)
+                self.embed_ms += (time.perf_counter() - start) * 1000
+            except Exception as e:
+                self._batch_failed("embed", len(chunks), e)
+                continue
+            await self._index_queue.put((embeddings, chunks, hashes, extra))
+
+    async def _index_stage(self) -> None:
+        while True:
+            batch = await self._index_queue.get()
+            if batch is None:
+                return
+            embeddings, chunks, hashes, extra = batch
+            try:
+                start = time.perf_counter()
+                added = await add_to_index(embeddings, chunks, hashes, extra)
+                self.index_ms += (time.perf_counter() - start) * 1000
+            except Exception as e:
+                self._batch_failed("index", len(chunks), e)
+                continue
+            self.batches += 1
+            self.chunks_indexed += added
+            # Repeats of chunks that were still in flight are dropped under the index lock
+            self.duplicates_skipped += len(chunks) - added
+
+    def _batch_failed(self, stage: str, size: int, error: Exception) -> None:
+        self.failed_chunks += size
+        self.last_failure = f"{stage}: {error}"
+        logger.warning("rag_bulk_ingest_batch_failed", extra={"stage": stage, "chunks": size, "error": str(error)})
+
+    # -- public API ---------------------------------------------------------------
+
+    async def run(self, documents: AsyncIterator[Document]) -> dict:
+        """Ingest every document; returns the final stats (see to_dict)."""
+        self.started_at = time.time()
+        embed_task = asyncio.create_task(self._embed_stage())
+        index_task = asyncio.create_task(self._index_stage())
+        try:
+            await self._chunk_stage(documents)
+            await self._embed_queue.put(None)
+            await asyncio.gather(embed_task, index_task)
+        finally:
+            # No-op on success; stops the stages if the run was cancelled or the reader failed
+            embed_task.cancel()
+            index_task.cancel()
+            self.finished_at = time.time()
+        logger.info("rag_bulk_ingest", extra=self.to_dict())
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "documents": self.documents,
+            "chars": self.chars,
+            "chunks": self.chunks,
+            "chunks_indexed": self.chunks_indexed,
+            "duplicates_skipped": self.duplicates_skipped,
+            "failed_chunks": self.failed_chunks,
+            "batch_size": self.batch_size,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "chunks_per_sec": round(self.chunks / elapsed, 1) if elapsed > 0 else None,
+            "embed_ms": round(self.embed_ms, 1),
+            "index_ms": round(self.index_ms, 1),
+            "yield_ms": round(self.yield_ms, 1),
+            "error": self.error,
+            "last_failure": self.last_failure,
+        }
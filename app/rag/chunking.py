@@ -0,0 +1,222 @@
+# -----------------------------------------------------------------------------
+# app/rag/chunking.py — Sentence-aware chunking sized by estimated tokens
+# -----------------------------------------------------------------------------
+# SentenceChunker walks text once, as one string or as pieces arriving from a
+# stream, and yields chunks lazily with their character offsets in the source:
+#   - sentences end at . ! ? (plus closing quotes/brackets) before whitespace,
+#     paragraphs at blank lines;
+#   - whole sentences are packed up to RAG_CHUNK_TOKENS tokens, as estimated
+#     by app.utils.token_estimator (the embedding model truncates past 256),
+#     and at most RAG_CHUNK_TOKENS * CHARS_PER_TOKEN characters;
+#   - a chunk also ends at a paragraph break once it is half full;
+#   - consecutive chunks share up to RAG_CHUNK_OVERLAP_TOKENS of trailing
+#     sentences (not across paragraph breaks);
+#   - a sentence over either budget is split at whitespace.
+# Chunk text is a slice of the source, so offsets map straight back to it.
+# Only the current chunk window and unfinished sentence are held in memory.
+#
+# chunk_text is the earlier fixed 500-word chunker, kept for comparison
+# (scripts/benchmark_chunking.py).
+# -----------------------------------------------------------------------------
+
+import re
+from collections import deque
+from collections.abc import Iterable, Iterator
+
+from app.utils.token_estimator import CHARS_PER_TOKEN, estimate_tokens
+
+CHUNK_SIZE_WORDS = 500
+CHUNK_OVERLAP_WORDS = 50
+CHUNK_TOKENS = 256
+CHUNK_OVERLAP_TOKENS = 32
+PARAGRAPH_MIN_FILL = 0.5  # end a chunk at a paragraph break once this full
+
+# Sentence end (group 1) + the whitespace after it, or a paragraph break
+_BOUNDARY = re.compile(r"([.!?…]+[\"'”’)\]]*)\s+|\n[ \t]*\n\s*")
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> list[str]:
+    words = re.findall(r"\S+|\s+", text)
+    word_tokens = [w for w in words if w.strip()]
+    if not word_tokens:
+        return [text] if text.strip() else []
+    step = chunk_size - overlap
+    if step <= 0:
+        step = 1
+    chunks = []
+    for start in range(0, len(word_tokens), step):
+        end = min(start + chunk_size, len(word_tokens))
+        chunk_words = word_tokens[start:end]
+        chunk_str = " ".join(chunk_words)
+        if chunk_str.strip():
+            chunks.append(chunk_str)
+        if end >= len(word_tokens):
+            break
+    return chunks if chunks else [text]
+
+
+class Chunk:
+    __slots__ = ("text", "start", "end", "tokens")
+
+    def __init__(self, text: str, start: int, end: int, tokens: int) -> None:
+        self.text = text
+        self.start = start  # character offsets in the source: source[start:end] == text
+        self.end = end
+        self.tokens = tokens
+
+
+class _Sentence:
+    __slots__ = ("start", "end", "tokens")
+
+    def __init__(self, start: int, end: int, tokens: int) -> None:
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+
+
+class SentenceChunker:
+    """Incremental chunker: feed() text pieces in order, then finish().
+
+    Each call returns a generator that must be consumed before the next call.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> None:
+        self.max_tokens = max(1, max_tokens)
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+        self.max_chars = self.max_tokens * CHARS_PER_TOKEN
+        self._buf = ""
+        self._base = 0  # source offset of _buf[0]
+        self._scan = 0  # source offset where the unfinished sentence starts
+        self._window: deque[_Sentence] = deque()
+        self._tokens = 0
+        self._fresh = 0  # sentences in the window not yet part of an emitted chunk
+
+    def _emit(self, overlap: bool) -> Chunk:
+        first, last = self._window[0], self._window[-1]
+        text = self._buf[first.start - self._base : last.end - self._base]
+        chunk = Chunk(text, first.start, last.end, estimate_tokens(text))
+        kept = 0
+        if overlap and len(self._window) > 1:
+            # Trailing whole sentences within the overlap budget; never the whole window
+            for i in range(len(self._window) - 1, 0, -1):
+                if kept + self._window[i].tokens > self.overlap_tokens:
+                    break
+                kept += self._window[i].tokens
+            while self._tokens > kept:
+                self._tokens -= self._window.popleft().tokens
+        else:
+            self._window.clear()
+            self._tokens = 0
+        self._fresh = 0
+        return chunk
+
+    def _fits(self, start: int, end: int, tokens: int) -> bool:
+        """Would the window plus sentence [start, end) stay within both budgets?
+
+        Per-sentence estimates round down, so allow one token per sentence of slack.
+        """
+        if not self._window:
+            return True
+        first = self._window[0].start
+        return (
+            self._tokens + tokens + len(self._window) <= self.max_tokens
+            and end - first <= self.max_chars
+        )
+
+    def _fit(self, start: int, end: int) -> tuple[int, int]:
+        """(cut, tokens): the longest prefix of [start, end) that fits one chunk, cut at whitespace if possible."""
+        buf, base = self._buf, self._base
+        limit = min(end, start + self.max_chars)
+        while True:
+            cut = limit
+            if limit < end:
+                # Whitespace at `limit` itself is a clean cut too
+                lo, hi = start + 1 - base, limit + 1 - base
+                space = max(buf.rfind(" ", lo, hi), buf.rfind("\n", lo, hi))
+                if space >= 0:
+                    cut = space + base
+            tokens = estimate_tokens(buf[start - base : cut - base])
+            if tokens <= self.max_tokens:
+                return cut, tokens
+            limit = start + max(1, (cut - start) * self.max_tokens // tokens)
+
+    def _add(self, start: int, end: int, paragraph_end: bool) -> Iterator[Chunk]:
+        buf, base = self._buf, self._base
+        while start < end and buf[start - base].isspace():
+            start += 1
+        while end > start and buf[end - base - 1].isspace():
+            end -= 1
+        while start < end:
+            cut, tokens = self._fit(start, end)
+            piece_end = cut
+            while buf[piece_end - base - 1].isspace():
+                piece_end -= 1
+            if not self._fits(start, piece_end, tokens):
+                yield self._emit(overlap=True)
+                if not self._fits(start, piece_end, tokens):
+                    self._window.clear()
+                    self._tokens = 0
+            self._window.append(_Sentence(start, piece_end, tokens))
+            self._tokens += tokens
+            self._fresh += 1
+            start = cut
+            while start < end and buf[start - base].isspace():
+                start += 1
+        if paragraph_end and self._fresh and self._tokens >= self.max_tokens * PARAGRAPH_MIN_FILL:
+            yield self._emit(overlap=False)
+
+    def _segment(self, final: bool) -> Iterator[Chunk]:
+        buf, base = self._buf, self._base
+        end_of_buf = base + len(buf)
+        while True:
+            m = _BOUNDARY.search(buf, self._scan - base)
+            # A boundary touching the end of the buffer may continue (e.g. into a blank line)
+            if m is None or (m.end() == len(buf) and not final):
+                break
+            end = base + (m.end(1) if m.group(1) else m.start())
+            paragraph_end = m.group(1) is None or m.group().count("\n") >= 2
+            yield from self._add(self._scan, end, paragraph_end)
+            self._scan = base + m.end()
+        if final:
+            yield from self._add(self._scan, end_of_buf, True)
+            self._scan = end_of_buf
+        else:
+            # Bound the unfinished sentence: cut text without boundaries into chunk-sized pieces
+            while end_of_buf - self._scan > 2 * self.max_chars:
+                cut, _ = self._fit(self._scan, end_of_buf)
+                yield from self._add(self._scan, cut, False)
+                self._scan = cut
+                while self._scan < end_of_buf and buf[self._scan - base].isspace():
+                    self._scan += 1
+
+    def feed(self, text: str) -> Iterator[Chunk]:
+        if not text:
+            return
+        self._buf += text
+        yield from self._segment(final=False)
+        # Drop text that is in no pending sentence
+        keep_from = min(self._window[0].start, self._scan) if self._window else self._scan
+        if keep_from > self._base:
+            self._buf = self._buf[keep_from - self._base :]
+            self._base = keep_from
+
+    def finish(self) -> Iterator[Chunk]:
+        yield from self._segment(final=True)
+        if self._fresh:
+            yield self._emit(overlap=False)
+        self._buf = ""
+        self._base = self._scan
+        self._window.clear()
+        self._tokens = 0
+
+
+def iter_chunks(
+    source: str | Iterable[str],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Chunk]:
+    """Chunks of `source` (a string, or text pieces in order), yielded as soon as each is complete."""
+    chunker = SentenceChunker(max_tokens, overlap_tokens)
+    for piece in [source] if isinstance(source, str) else source:
+        yield from chunker.feed(piece)
+    yield from chunker.finish()
@@ -0,0 +1,187 @@
+# -----------------------------------------------------------------------------
+# app/rag/embedding_cache.py — Content-addressed embedding cache
+# -----------------------------------------------------------------------------
+# Embeddings are keyed by (embedding model, content_hash(text)):
+#   - in-memory LRU of RAG_EMBEDDING_CACHE_SIZE vectors, used by ingest and
+#     by query retrieval (repeated questions skip model.encode);
+#   - optional SQLite store at RAG_EMBEDDING_CACHE_PATH for ingested chunks,
+#     so re-uploading a document after a restart (or after it was trimmed
+#     from memory) is not re-embedded either.
+# Texts repeated within one call are embedded once.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.rag.embeddings import EMBEDDING_MODEL_NAME, content_hash, embed_array
+from app.utils.logger import logger
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def _store_path() -> Path | None:
+    raw = get_settings().rag_embedding_cache_path
+    if not raw:
+        return None
+    path = Path(raw)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+class EmbeddingCache:
+    def __init__(self) -> None:
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._conn_lock = threading.Lock()
+        self._store_failed = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(text_hash: str) -> str:
+        return f"{EMBEDDING_MODEL_NAME}:{text_hash}"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        capacity = get_settings().rag_embedding_cache_size
+        while len(self._memory) > capacity:
+            self._memory.popitem(last=False)
+
+    # -- on-disk store (called in worker threads) --------------------------------
+
+    def _store(self) -> sqlite3.Connection | None:
+        if self._conn is None and not self._store_failed:
+            path = _store_path()
+            if path is None:
+                return None
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(path), timeout=5.0, check_same_thread=False, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+                self._conn = conn
+            except sqlite3.Error as e:
+                self._store_failed = True
+                logger.warning("embedding_store_unavailable", extra={"error": str(e)})
+        return self._conn
+
+    def _disk_get(self, keys: list[str]) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        with self._conn_lock:
+            conn = self._store()
+            if conn is None:
+                return found
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                marks = ",".join("?" * len(batch))
+                for key, blob in conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def _disk_put(self, items: dict[str, np.ndarray]) -> None:
+        with self._conn_lock:
+            conn = self._store()
+            if conn is None:
+                return
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings VALUES (?, ?)",
+                [(key, vec.astype(np.float32).tobytes()) for key, vec in items.items()],
+            )
+
+    # -- public API ---------------------------------------------------------------
+
+    async def embed(
+        self,
+        texts: list[str],
+        hashes: list[str] | None = None,
+        persist: bool = False,
+        executor: Executor | None = None,
+    ) -> np.ndarray:
+        """Embeddings of `texts` (rows in order).
+
+        `persist` also writes misses to the on-disk store; `executor` runs
+        model.encode (default: asyncio's thread pool).
+        """
+        if hashes is None:
+            hashes = [content_hash(t) for t in texts]
+        keys = [self._key(h) for h in hashes]
+        rows: list[np.ndarray | None] = [None] * len(texts)
+        missing: list[int] = []
+        for i, key in enumerate(keys):
+            vector = self._memory.get(key)
+            if vector is None:
+                missing.append(i)
+            else:
+                self._memory.move_to_end(key)
+                rows[i] = vector
+                self.memory_hits += 1
+
+        if missing and persist and _store_path() is not None:
+            try:
+                found = await asyncio.to_thread(self._disk_get, list({keys[i] for i in missing}))
+            except sqlite3.Error as e:
+                logger.warning("embedding_store_read_failed", extra={"error": str(e)})
+                found = {}
+            still_missing = []
+            for i in missing:
+                vector = found.get(keys[i])
+                if vector is None:
+                    still_missing.append(i)
+                else:
+                    rows[i] = vector
+                    self._remember(keys[i], vector)
+                    self.disk_hits += 1
+            missing = still_missing
+
+        if missing:
+            first: dict[str, int] = {}
+            for i in missing:
+                first.setdefault(keys[i], i)
+            to_encode = [texts[i] for i in first.values()]
+            if executor is None:
+                vectors = await asyncio.to_thread(embed_array, to_encode)
+            else:
+                vectors = await asyncio.get_running_loop().run_in_executor(executor, embed_array, to_encode)
+            fresh = dict(zip(first, vectors))
+            for i in missing:
+                rows[i] = fresh[keys[i]]
+            for key, vector in fresh.items():
+                self._remember(key, vector)
+            self.misses += len(fresh)
+            self.memory_hits += len(missing) - len(fresh)
+            if persist and _store_path() is not None:
+                try:
+                    await asyncio.to_thread(self._disk_put, fresh)
+                except sqlite3.Error as e:
+                    logger.warning("embedding_store_write_failed", extra={"error": str(e)})
+        return np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    def close(self) -> None:
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def to_dict(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "capacity": get_settings().rag_embedding_cache_size,
+            "disk_store": str(_store_path()) if _store_path() is not None else None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+        }
+
+
+EMBEDDING_CACHE = EmbeddingCache()
@@ -2,8 +2,11 @@
 # app/rag/embeddings.py — RAG embeddings (sentence-transformers, all-MiniLM-L6-v2)
 # -----------------------------------------------------------------------------
 
+import hashlib
 from typing import Any
 
+import numpy as np
+
 EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 _embedding_model: Any = None
 
@@ -16,7 +19,15 @@ def get_embedding_model():
     return _embedding_model
 
 
-def embed_texts(texts: list[str]) -> list[list[float]]:
+def embed_array(texts: list[str]) -> np.ndarray:
     model = get_embedding_model()
-    embeddings = model.encode(texts, convert_to_numpy=True)
-    return embeddings.tolist()
+    return np.asarray(model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    return embed_array(texts).tolist()
+
+
+def content_hash(text: str) -> str:
+    """Content address of a chunk (exact text; model-independent)."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
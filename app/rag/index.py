@@ -1,16 +1,64 @@
 # -----------------------------------------------------------------------------
 # app/rag/index.py — FAISS in-memory index + metadata list
 # -----------------------------------------------------------------------------
+# Persistence (snapshots, chunk log, startup load) is app/rag/persistence.py;
+# this module only keeps the vectors it needs for the next snapshot.
+#
+# The index starts as an exact IndexFlatL2. Once it holds RAG_PROMOTE_THRESHOLD
+# chunks, the configured index is trained and filled in a background thread
+# from the flat vectors; chunks added meanwhile are copied over under the lock
+# and the new index is swapped in. Searches keep using the flat index until
+# then. The configured index combines:
+#   - RAG_INDEX_TYPE: flat | hnsw | ivf_flat | ivf_pq
+#   - RAG_STORAGE: float32 | fp16 | int8 (scalar quantization) | pq
+#   - RAG_PCA_DIM: optional PCA reduction before encoding
+# With RAG_METRIC=cosine vectors are L2-normalized, so L2 ranking is cosine
+# ranking. Lossy indexes fetch RAG_RERANK_FACTOR * k candidates and re-rank
+# them exactly against the original float32 vectors (memory-mapped from the
+# last snapshot, plus those added since). nprobe (IVF) and efSearch (HNSW)
+# default to the settings and can be overridden per search.
 
 import asyncio
+import math
+import sys
+import time
 from typing import Any
 
 import numpy as np
 
+from app.core.config import get_settings
+from app.rag.embeddings import content_hash
+from app.utils.logger import logger
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+STORAGE_TYPES = ("float32", "fp16", "int8", "pq")
+TRAIN_POINTS_PER_LIST = 64  # k-means sample size per IVF list (faiss warns below 39)
+MIN_POINTS_PER_LIST = 39
+MIN_TRAIN_SAMPLE = 10_000  # PQ / PCA / SQ training sample
+RECALL_K = 10
+GROUND_TRUTH_BLOCK = 65_536
+
 _rag_lock = asyncio.Lock()
 _faiss_index: Any = None
 _metadata_list: list[dict] = []
+_chunk_hashes: set[str] = set()  # content_hash of every indexed chunk (exact-duplicate check)
+_duplicates_skipped = 0
 _index_dim: int | None = None
+_index_version: int = 0  # bumped on every change; keys response-cache entries
+_chunk_log: Any = None  # ChunkLog when RAG_DATA_DIR is set
+_disk_vectors: np.ndarray | None = None  # last snapshot's original vectors (memory-mapped)
+_new_vectors: list[np.ndarray] = []  # originals added since the last snapshot
+_index_kind = "flat"  # "flat" (exact) or the promoted index key, e.g. "hnsw/int8/cosine"
+_promotion: asyncio.Task | None = None
+_promotion_retry_at = 0  # after a failed promotion, retry once the index doubles
+_promotion_stats: dict = {"last_ms": None, "last_error": None, "count": 0}
+_recall_cache: tuple[tuple, dict] | None = None
+_recall_task: asyncio.Task | None = None
+_read_only = False  # RAG_DATA_DIR is owned by another worker process
+
+
+class IndexReadOnlyError(Exception):
+    """Chunks added in a worker that loaded RAG_DATA_DIR read-only."""
 
 
 def _get_index_dim() -> int:
@@ -36,22 +84,542 @@ def index_count() -> int:
     return len(_metadata_list)
 
 
-async def add_to_index(embeddings: list[list[float]], chunks: list[str]) -> None:
-    global _metadata_list
+def index_version() -> int:
+    return _index_version
+
+
+def _cosine() -> bool:
+    return get_settings().rag_metric == "cosine"
+
+
+def _prepare(vectors: np.ndarray) -> np.ndarray:
+    """Vectors as stored in / queried against the index (normalized for cosine)."""
+    if not _cosine():
+        return vectors
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _keep_originals() -> bool:
+    # Needed for snapshots, and for re-ranking when there is no snapshot to read them from
+    return _chunk_log is not None or get_settings().rag_rerank_factor > 1
+
+
+def new_chunk_positions(hashes: list[str]) -> list[int]:
+    """Positions of `hashes` not indexed yet and not repeated earlier in the list."""
+    seen: set[str] = set()
+    positions = []
+    for i, h in enumerate(hashes):
+        if h not in _chunk_hashes and h not in seen:
+            seen.add(h)
+            positions.append(i)
+    return positions
+
+
+def record_duplicates(count: int) -> None:
+    global _duplicates_skipped
+    _duplicates_skipped += count
+
+
+async def add_to_index(
+    embeddings: list[list[float]] | np.ndarray,
+    chunks: list[str],
+    hashes: list[str] | None = None,
+    extra: list[dict] | None = None,
+) -> int:
+    """Index the chunks not already present (exact content); returns how many were added.
+
+    `extra` holds per-chunk fields (source, offsets) stored with each chunk's metadata.
+    """
+    if _read_only:
+        # They could not be logged, and would be lost on restart
+        raise IndexReadOnlyError("RAG index is read-only in this worker: another process owns RAG_DATA_DIR")
+    if hashes is None:
+        hashes = [content_hash(c) for c in chunks]
     async with _rag_lock:
+        # Re-checked under the lock: a concurrent ingest may have added the same chunks
+        keep = new_chunk_positions(hashes)
+        record_duplicates(len(chunks) - len(keep))
+        if not keep:
+            return 0
         index = get_faiss_index()
-        arr = np.array(embeddings, dtype=np.float32)
-        index.add(arr)
+        arr = np.asarray(embeddings, dtype=np.float32)
+        if len(keep) < len(chunks):
+            arr = arr[keep]
+            chunks = [chunks[i] for i in keep]
+            hashes = [hashes[i] for i in keep]
+            extra = [extra[i] for i in keep] if extra is not None else None
         base = len(_metadata_list)
-        for i, chunk in enumerate(chunks):
-            _metadata_list.append({"text": chunk, "chunk_index": base + i})
+        metas = [
+            {"text": chunk, "chunk_index": base + i, "hash": h}
+            for i, (chunk, h) in enumerate(zip(chunks, hashes))
+        ]
+        if extra is not None:
+            for meta, fields in zip(metas, extra):
+                meta.update({key: value for key, value in fields.items() if value is not None})
+
+        async def commit() -> None:
+            global _index_version
+            if _chunk_log is not None:
+                # Logged before the chunks become searchable: an acknowledged ingest survives a crash
+                await asyncio.to_thread(_chunk_log.append, metas, arr)
+            if _keep_originals():
+                _new_vectors.append(arr)
+            # Graph / list insertion (HNSW, IVF) costs real CPU per vector: off the event
+            # loop, under the lock (batched searches take it too, see QueryBatcher)
+            await asyncio.to_thread(index.add, _prepare(arr))
+            _metadata_list.extend(metas)
+            _chunk_hashes.update(hashes)
+            _index_version += 1
+
+        # A cancelled caller still waits for the threads, so the lock covers them and
+        # index ids stay in step with the metadata
+        committing = asyncio.ensure_future(commit())
+        try:
+            await asyncio.shield(committing)
+        except asyncio.CancelledError:
+            await committing
+            raise
+        _maybe_promote()
+        return len(metas)
+
+
+# -- index construction and promotion -----------------------------------------
+
+
+def target_index_kind() -> str:
+    """Key of the configured index; "flat" means exact float32 search, never promoted."""
+    s = get_settings()
+    kind = s.rag_index_type if s.rag_index_type in INDEX_TYPES else "flat"
+    storage = s.rag_storage if s.rag_storage in STORAGE_TYPES else "float32"
+    if kind == "ivf_pq":
+        kind, storage = "ivf_flat", "pq"
+    if kind == "flat" and storage == "float32" and s.rag_pca_dim <= 0:
+        return "flat"
+    key = f"{kind}/{storage}"
+    if s.rag_pca_dim > 0:
+        key += f"/pca{s.rag_pca_dim}"
+    if _cosine():
+        key += "/cosine"
+    return key
+
+
+def _parse_kind(key: str) -> tuple[str, str, int]:
+    """(index type, storage, pca dim) of an index key."""
+    if key == "flat":
+        return "flat", "float32", 0
+    parts = key.split("/")
+    pca = next((int(p[3:]) for p in parts[2:] if p.startswith("pca")), 0)
+    return parts[0], parts[1], pca
+
+
+def _encoding_index(kind: str, storage: str, dim: int, n: int) -> Any:
+    import faiss
+    s = get_settings()
+    if storage == "pq" and dim % s.rag_pq_m:
+        raise ValueError(f"RAG_PQ_M={s.rag_pq_m} must divide the vector dimension {dim}")
+    if kind == "hnsw":
+        if storage == "fp16":
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, s.rag_hnsw_m)
+        elif storage == "int8":
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, s.rag_hnsw_m)
+        elif storage == "pq":
+            index = faiss.IndexHNSWPQ(dim, s.rag_pq_m, s.rag_hnsw_m)
+        else:
+            index = faiss.IndexHNSWFlat(dim, s.rag_hnsw_m)
+        index.hnsw.efConstruction = s.rag_hnsw_ef_construction
+        index.hnsw.efSearch = s.rag_hnsw_ef_search
+        return index
+    codes = {"float32": "Flat", "fp16": "SQfp16", "int8": "SQ8", "pq": f"PQ{s.rag_pq_m}x{s.rag_pq_nbits}"}
+    if kind == "flat":
+        return faiss.index_factory(dim, codes[storage])
+    nlist = s.rag_ivf_nlist or int(4 * math.sqrt(n))
+    nlist = max(1, min(nlist, n // MIN_POINTS_PER_LIST))
+    index = faiss.index_factory(dim, f"IVF{nlist},{codes[storage]}")
+    index.nprobe = s.rag_ivf_nprobe
+    return index
+
+
+def build_ann_index(kind: str, vectors: np.ndarray) -> Any:
+    """Train and fill the index described by key `kind` (blocking; run in a thread)."""
+    import faiss
+    index_type, storage, pca = _parse_kind(kind)
+    n, dim = vectors.shape
+    pca = pca if 0 < pca < dim else 0
+    inner = _encoding_index(index_type, storage, pca or dim, n)
+    index = faiss.IndexPreTransform(faiss.PCAMatrix(dim, pca), inner) if pca else inner
+    if not index.is_trained:
+        sample_size = max(getattr(inner, "nlist", 0) * TRAIN_POINTS_PER_LIST, MIN_TRAIN_SAMPLE)
+        if n > sample_size:
+            rows = np.sort(np.random.default_rng(0).choice(n, sample_size, replace=False))
+            index.train(np.ascontiguousarray(vectors[rows]))
+        else:
+            index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def _maybe_promote() -> None:
+    """Start a background promotion if the flat index has grown past the threshold."""
+    global _promotion
+    target = target_index_kind()
+    if _index_kind != "flat" or target == "flat":
+        return
+    if _promotion is not None and not _promotion.done():
+        return
+    count = len(_metadata_list)
+    if count < get_settings().rag_promote_threshold or count < _promotion_retry_at:
+        return
+    _promotion = asyncio.create_task(_promote(target))
+
+
+async def _promote(kind: str) -> None:
+    global _faiss_index, _index_kind, _promotion_retry_at
+    start = time.perf_counter()
+    try:
+        async with _rag_lock:
+            flat = _faiss_index
+            base = flat.ntotal
+            vectors = flat.reconstruct_n(0, base)
+        built = await asyncio.to_thread(build_ann_index, kind, vectors)
+        async with _rag_lock:
+            if _faiss_index is not flat:
+                return  # replaced meanwhile (restore)
+            if flat.ntotal > base:
+                built.add(flat.reconstruct_n(base, flat.ntotal - base))
+            _faiss_index = built
+            _index_kind = kind
+    except Exception as e:
+        _promotion_retry_at = len(_metadata_list) * 2
+        _promotion_stats["last_error"] = str(e)
+        logger.warning("rag_index_promotion_failed", extra={"index_type": kind, "error": str(e)})
+        return
+    _promotion_stats["last_ms"] = (time.perf_counter() - start) * 1000
+    _promotion_stats["last_error"] = None
+    _promotion_stats["count"] += 1
+    logger.info(
+        "rag_index_promoted",
+        extra={"index_type": kind, "chunks": built.ntotal, "latency_ms": _promotion_stats["last_ms"]},
+    )
+
+
+# -- persistence hooks (app/rag/persistence.py) ---------------------------------
+
+
+def rag_lock() -> asyncio.Lock:
+    return _rag_lock
+
+
+def set_chunk_log(log: Any) -> None:
+    global _chunk_log
+    _chunk_log = log
+
+
+def set_read_only(read_only: bool) -> None:
+    global _read_only
+    _read_only = read_only
+
+
+def is_read_only() -> bool:
+    return _read_only
+
 
+def unsaved_count() -> int:
+    return sum(len(v) for v in _new_vectors)
 
-def search_index(query_embedding: list[float], k: int = 3) -> list[str]:
+
+def snapshot_state() -> tuple[np.ndarray | None, list[np.ndarray], list[dict], int | None, str, Any]:
+    """(snapshot vectors, vectors added since, metadata, dim, index kind, serialized index); hold rag_lock().
+
+    Safe to write out after the lock is released: vector arrays are never
+    modified once added (the lists are copied), and a trained index is
+    serialized (None while flat: the flat index is rebuilt from the vectors).
+    """
+    index_bytes = None
+    if _index_kind != "flat":
+        import faiss
+        index_bytes = faiss.serialize_index(_faiss_index)
+    return _disk_vectors, list(_new_vectors), list(_metadata_list), _index_dim, _index_kind, index_bytes
+
+
+def mark_snapshot(vectors: np.ndarray, previous: np.ndarray | None, saved_parts: int) -> None:
+    """`vectors` (memory-mapped) now hold `previous` plus the first `saved_parts` arrays added since.
+
+    Chunks added while the snapshot was being written stay in memory for the next one.
+    """
+    global _disk_vectors, _new_vectors
+    if _disk_vectors is not previous:
+        return  # index restored meanwhile
+    _disk_vectors = vectors
+    _new_vectors = _new_vectors[saved_parts:]
+
+
+def restore_index(
+    disk_vectors: np.ndarray | None,
+    new_vectors: np.ndarray | None,
+    metadata: list[dict],
+    dim: int,
+    ann_index: Any = None,
+    ann_kind: str = "flat",
+) -> None:
+    """Rebuild the index from persisted vectors (no re-embedding).
+
+    `ann_index` is a saved trained index already holding `disk_vectors`.
+    """
+    global _faiss_index, _metadata_list, _index_dim, _index_version, _disk_vectors, _new_vectors, _index_kind
+    global _chunk_hashes
+    import faiss
+    if ann_index is not None:
+        index, parts = ann_index, (new_vectors,)
+    else:
+        index, parts, ann_kind = faiss.IndexFlatL2(dim), (disk_vectors, new_vectors), "flat"
+    for part in parts:
+        if part is None:
+            continue
+        for start in range(0, len(part), GROUND_TRUTH_BLOCK):
+            index.add(_prepare(np.asarray(part[start : start + GROUND_TRUTH_BLOCK], dtype=np.float32)))
+    _faiss_index = index
+    _index_kind = ann_kind
+    _index_dim = dim
+    _metadata_list = metadata
+    _chunk_hashes = {m.get("hash") or content_hash(m["text"]) for m in metadata}
+    _disk_vectors = disk_vectors
+    _new_vectors = [new_vectors] if new_vectors is not None and len(new_vectors) else []
+    _index_version += 1
+    _maybe_promote()
+
+
+# -- search -------------------------------------------------------------------
+
+
+def _originals_available() -> bool:
+    disk = len(_disk_vectors) if _disk_vectors is not None else 0
+    return disk + unsaved_count() == len(_metadata_list)
+
+
+def _original_vectors(
+    ids: np.ndarray,
+    originals: tuple[np.ndarray | None, list[np.ndarray]] | None = None,
+) -> np.ndarray:
+    """Original float32 vectors of chunk ids (snapshot on disk, or added since).
+
+    `originals` reads a copy taken earlier ((snapshot vectors, arrays added
+    since)) instead of the live ones, which need rag_lock().
+    """
+    disk_vectors, new_vectors = originals if originals is not None else (_disk_vectors, _new_vectors)
+    out = np.empty((len(ids), _index_dim), dtype=np.float32)
+    disk = len(disk_vectors) if disk_vectors is not None else 0
+    on_disk = ids < disk
+    if on_disk.any():
+        out[on_disk] = disk_vectors[ids[on_disk]]
+    if not on_disk.all():
+        starts = np.cumsum([0] + [len(v) for v in new_vectors])
+        for j in np.flatnonzero(~on_disk):
+            offset = ids[j] - disk
+            part = int(np.searchsorted(starts, offset, side="right")) - 1
+            out[j] = new_vectors[part][offset - starts[part]]
+    return out
+
+
+def _exact_distances(query: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Smaller is closer; `query` is already prepared."""
+    if _cosine():
+        return -(_prepare(vectors) @ query)
+    return ((vectors - query) ** 2).sum(axis=1)
+
+
+def _search_params(k: int, nprobe: int | None, ef_search: int | None) -> Any:
+    import faiss
+    index_type, _, _ = _parse_kind(_index_kind)
+    params = None
+    if index_type == "hnsw" and ef_search:
+        params = faiss.SearchParametersHNSW(efSearch=max(ef_search, k))
+    elif index_type == "ivf_flat" and nprobe:
+        params = faiss.SearchParametersIVF(nprobe=nprobe)
+    if params is not None and isinstance(_faiss_index, faiss.IndexPreTransform):
+        params = faiss.SearchParametersPreTransform(index_params=params)
+    return params
+
+
+def search_ids(
+    queries: np.ndarray,
+    k: int,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+    rerank: bool = True,
+) -> list[list[int]]:
+    """Top-k chunk ids per query row (closest first)."""
+    index = get_faiss_index()
+    prepared = _prepare(np.ascontiguousarray(queries, dtype=np.float32))
+    factor = get_settings().rag_rerank_factor
+    rerank = rerank and _index_kind != "flat" and factor > 1 and _originals_available()
+    fetch = min(index.ntotal, k * factor if rerank else k)
+    params = _search_params(k, nprobe, ef_search)
+    if params is not None:
+        _, ids = index.search(prepared, fetch, params=params)
+    else:
+        _, ids = index.search(prepared, fetch)
+    results = []
+    for row, query in zip(ids, prepared):
+        candidates = row[row >= 0]
+        if rerank and len(candidates) > 1:
+            order = np.argsort(_exact_distances(query, _original_vectors(candidates)), kind="stable")
+            candidates = candidates[order]
+        results.append([int(i) for i in candidates[:k]])
+    return results
+
+
+def search_index(
+    query_embedding: list[float],
+    k: int = 3,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+) -> list[str]:
+    """Top-k chunk texts; nprobe / ef_search override the index defaults for this search."""
     if index_count() == 0:
         return []
-    index = get_faiss_index()
-    arr = np.array([query_embedding], dtype=np.float32)
-    _, indices = index.search(arr, min(k, index.ntotal))
+    ids = search_ids(np.array([query_embedding], dtype=np.float32), k, nprobe, ef_search)[0]
     meta = get_metadata_list()
-    return [meta[int(i)]["text"] for i in indices[0] if 0 <= int(i) < len(meta)]
+    return [meta[i]["text"] for i in ids if 0 <= i < len(meta)]
+
+
+# -- stats --------------------------------------------------------------------
+
+
+def _vector_bytes_per_chunk() -> float | None:
+    """Estimated index bytes per chunk (codes + graph links / list ids)."""
+    if _index_dim is None:
+        return None
+    s = get_settings()
+    index_type, storage, pca = _parse_kind(_index_kind)
+    dim = pca if 0 < pca < _index_dim else _index_dim
+    code = {"float32": 4 * dim, "fp16": 2 * dim, "int8": dim, "pq": s.rag_pq_m * s.rag_pq_nbits / 8}[storage]
+    if index_type == "hnsw":
+        code += 2 * s.rag_hnsw_m * 4 * 1.1  # level-0 links + upper levels
+    elif index_type == "ivf_flat":
+        code += 8  # stored id per list entry
+    return code
+
+
+def memory_info() -> dict:
+    count = len(_metadata_list)
+    metadata_bytes = None
+    if count:
+        step = max(1, count // 1000)
+        sample = _metadata_list[::step]
+        metadata_bytes = sum(
+            sys.getsizeof(m) + sum(sys.getsizeof(v) for v in m.values()) for m in sample
+        ) / len(sample) + 8  # + list slot
+    vector_bytes = _vector_bytes_per_chunk()
+    in_memory_originals = unsaved_count()
+    return {
+        "index_bytes_per_chunk": round(vector_bytes, 1) if vector_bytes is not None else None,
+        "metadata_bytes_per_chunk": round(metadata_bytes, 1) if metadata_bytes is not None else None,
+        "original_bytes_per_chunk": 4 * _index_dim if _index_dim else None,
+        "originals_on_disk": count - in_memory_originals if _disk_vectors is not None else 0,
+        "originals_in_memory": in_memory_originals,
+    }
+
+
+def _ground_truth(
+    queries: np.ndarray,
+    query_ids: np.ndarray,
+    k: int,
+    originals: tuple[np.ndarray | None, list[np.ndarray]],
+) -> list[set[int]]:
+    """Exact top-k ids over a copy of the original vectors, excluding each query's own id."""
+    disk_vectors, new_vectors = originals
+    n = (len(disk_vectors) if disk_vectors is not None else 0) + sum(len(v) for v in new_vectors)
+    prepared = _prepare(queries)
+    best_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+    best_i = np.full((len(queries), k), -1, dtype=np.int64)
+    for start in range(0, n, GROUND_TRUTH_BLOCK):
+        ids = np.arange(start, min(n, start + GROUND_TRUTH_BLOCK))
+        block = _original_vectors(ids, originals)
+        if _cosine():
+            dist = -(prepared @ _prepare(block).T)
+        else:
+            dist = (prepared**2).sum(1)[:, None] - 2 * prepared @ block.T + (block**2).sum(1)[None, :]
+        dist[ids[None, :] == query_ids[:, None]] = np.inf
+        all_d = np.concatenate([best_d, dist], axis=1)
+        all_i = np.concatenate([best_i, np.broadcast_to(ids, dist.shape)], axis=1)
+        top = np.argsort(all_d, axis=1, kind="stable")[:, :k]
+        best_d = np.take_along_axis(all_d, top, axis=1)
+        best_i = np.take_along_axis(all_i, top, axis=1)
+    return [set(row[row >= 0].tolist()) for row in best_i]
+
+
+async def _measure_recall(k: int, sample: int) -> None:
+    global _recall_cache
+    start = time.perf_counter()
+    try:
+        # Only the index searches (a few ms) hold the lock; the exact scan over
+        # every original vector runs on a copy of the references, outside it
+        async with _rag_lock:
+            key = (_index_version, _index_kind, k)
+            n = len(_metadata_list)
+            rng = np.random.default_rng(0)
+            query_ids = np.sort(rng.choice(n, min(sample, n), replace=False))
+            queries = _original_vectors(query_ids)
+            originals = (_disk_vectors, list(_new_vectors))
+            found, found_without_rerank = await asyncio.to_thread(
+                lambda: (search_ids(queries, k + 1), search_ids(queries, k + 1, rerank=False))
+            )
+        truth = await asyncio.to_thread(_ground_truth, queries, query_ids, k, originals)
+    except Exception as e:
+        logger.warning("rag_recall_failed", extra={"error": str(e)})
+        return
+
+    def recall(results: list[list[int]]) -> float:
+        hits = 0
+        for own, ids, expected in zip(query_ids, results, truth):
+            ids = [i for i in ids if i != own][:k]
+            hits += len(expected.intersection(ids))
+        return hits / max(1, sum(len(t) for t in truth))
+
+    _recall_cache = (
+        key,
+        {
+            "k": k,
+            "queries": len(query_ids),
+            "recall": round(recall(found), 4),
+            "recall_without_rerank": round(recall(found_without_rerank), 4),
+            "chunks": n,
+            "measured_at": time.time(),
+            "measure_ms": round((time.perf_counter() - start) * 1000, 1),
+        },
+    )
+
+
+def recall_at_k(k: int = RECALL_K) -> dict | None:
+    """Last sampled recall@k of the live index against exact search.
+
+    Never waits: if the index changed since the last measurement, a new one
+    starts in the background and the previous result is returned ("stale"),
+    or only {"k", "measuring"} before the first one finishes.
+    """
+    global _recall_task
+    if len(_metadata_list) <= k or not _originals_available():
+        return None
+    key = (_index_version, _index_kind, k)
+    cached = _recall_cache if _recall_cache is not None and _recall_cache[0][2] == k else None
+    if (cached is None or cached[0] != key) and (_recall_task is None or _recall_task.done()):
+        _recall_task = asyncio.create_task(_measure_recall(k, get_settings().rag_recall_sample))
+    measuring = _recall_task is not None and not _recall_task.done()
+    if cached is None:
+        return {"k": k, "measuring": measuring}
+    return {**cached[1], "stale": cached[0] != key, "measuring": measuring}
+
+
+def index_info() -> dict:
+    return {
+        "type": _index_kind,
+        "target_type": target_index_kind(),
+        "metric": get_settings().rag_metric,
+        "promote_threshold": get_settings().rag_promote_threshold,
+        "duplicates_skipped": _duplicates_skipped,
+        "promoting": _promotion is not None and not _promotion.done(),
+        "promotions": _promotion_stats["count"],
+        "last_promotion_ms": round(_promotion_stats["last_ms"], 2) if _promotion_stats["last_ms"] is not None else None,
+        "last_promotion_error": _promotion_stats["last_error"],
+    }
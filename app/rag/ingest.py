@@ -1,41 +1,57 @@
 # -----------------------------------------------------------------------------
-# app/rag/ingest.py — Text chunking (500 words, overlap 50) + embed + store
+# app/rag/ingest.py — Chunk (app/rag/chunking.py) + embed + store
 # -----------------------------------------------------------------------------
 
-import asyncio
-import re
-
-from app.rag.embeddings import embed_texts
-from app.rag.index import add_to_index
-
-CHUNK_SIZE_WORDS = 500
-CHUNK_OVERLAP_WORDS = 50
-
-
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE_WORDS, overlap: int = CHUNK_OVERLAP_WORDS) -> list[str]:
-    words = re.findall(r"\S+|\s+", text)
-    word_tokens = [w for w in words if w.strip()]
-    if not word_tokens:
-        return [text] if text.strip() else []
-    step = chunk_size - overlap
-    if step <= 0:
-        step = 1
-    chunks = []
-    for start in range(0, len(word_tokens), step):
-        end = min(start + chunk_size, len(word_tokens))
-        chunk_words = word_tokens[start:end]
-        chunk_str = " ".join(chunk_words)
-        if chunk_str.strip():
-            chunks.append(chunk_str)
-        if end >= len(word_tokens):
-            break
-    return chunks if chunks else [text]
-
-
-async def ingest_text(text: str) -> int:
-    chunks = chunk_text(text)
-    if not chunks:
+from app.core.config import get_settings
+from app.rag.chunking import Chunk, SentenceChunker, iter_chunks
+from app.rag.embedding_cache import EMBEDDING_CACHE
+from app.rag.embeddings import content_hash
+from app.rag.index import add_to_index, new_chunk_positions, record_duplicates
+
+
+def make_chunker() -> SentenceChunker:
+    """Streaming chunker sized by RAG_CHUNK_TOKENS / RAG_CHUNK_OVERLAP_TOKENS."""
+    s = get_settings()
+    return SentenceChunker(s.rag_chunk_tokens, s.rag_chunk_overlap_tokens)
+
+
+def dedupe_chunks(chunks: list[str]) -> tuple[list[int], list[str]]:
+    """Positions of chunks not already indexed (first of any repeats) and their hashes.
+
+    The dropped chunks are counted as duplicates.
+    """
+    hashes = [content_hash(c) for c in chunks]
+    keep = new_chunk_positions(hashes)
+    if len(keep) < len(chunks):
+        record_duplicates(len(chunks) - len(keep))
+    return keep, [hashes[i] for i in keep]
+
+
+async def _ingest_batch(chunks: list[Chunk], source: str | None) -> int:
+    # Chunks already in the index are neither embedded nor added again
+    keep, hashes = dedupe_chunks([c.text for c in chunks])
+    if not keep:
         return 0
-    embeddings = await asyncio.to_thread(embed_texts, chunks)
-    await add_to_index(embeddings, chunks)
-    return len(chunks)
+    chunks = [chunks[i] for i in keep]
+    texts = [c.text for c in chunks]
+    embeddings = await EMBEDDING_CACHE.embed(texts, hashes, persist=True)
+    extra = [{"source": source, "start": c.start, "end": c.end} for c in chunks]
+    return await add_to_index(embeddings, texts, hashes, extra)
+
+
+async def ingest_text(text: str, source: str | None = None) -> tuple[int, int]:
+    """(chunks indexed, exact-duplicate chunks skipped); chunks are embedded RAG_INGEST_BATCH_SIZE at a time."""
+    s = get_settings()
+    batch_size = max(1, s.rag_ingest_batch_size)
+    total = added = 0
+    batch: list[Chunk] = []
+    for chunk in iter_chunks(text, s.rag_chunk_tokens, s.rag_chunk_overlap_tokens):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            total += len(batch)
+            added += await _ingest_batch(batch, source)
+            batch = []
+    if batch:
+        total += len(batch)
+        added += await _ingest_batch(batch, source)
+    return added, total - added
@@ -0,0 +1,316 @@
+# -----------------------------------------------------------------------------
+# app/rag/jobs.py — Background ingest jobs
+# -----------------------------------------------------------------------------
+# Submitting a job spools its input (files, NDJSON or text) to a temp
+# directory and returns a job id at once; RAG_JOB_WORKERS workers take jobs
+# in submission order and run each through the bulk ingest pipeline.
+# Jobs run below live retrieval:
+#   - model.encode runs on RAG_JOB_EMBED_THREADS dedicated threads, not the
+#     query batcher's or asyncio's shared pool;
+#   - batches are small (RAG_JOB_BATCH_SIZE chunks), so a query never waits
+#     long behind one;
+#   - before each batch the job waits for pending queries to be answered,
+#     at most RAG_JOB_YIELD_MAX_MS, so steady query traffic slows jobs down
+#     but cannot stall them.
+# Spooled input is capped per job (RAG_JOB_MAX_BYTES, 413) and across all
+# unfinished jobs (RAG_JOB_SPOOL_MAX_BYTES, 503); a job counts toward
+# RAG_JOB_QUEUE_MAX from the moment its spooling starts.
+# Job state is in memory (the RAG_JOB_HISTORY most recent finished jobs are
+# kept); jobs still queued or running at shutdown are cancelled.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import shutil
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from app.core.config import get_settings
+from app.rag.bulk_ingest import (
+    Document,
+    IngestInputError,
+    IngestPipeline,
+    decode_pieces,
+    is_pdf,
+    ndjson_documents,
+    pdf_pages,
+    read_file_bytes,
+)
+from app.utils.logger import logger
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class _JobInput:
+    __slots__ = ("source", "path", "fmt", "size")
+
+    def __init__(self, source: str | None, path: Path, fmt: str, size: int) -> None:
+        self.source = source
+        self.path = path
+        self.fmt = fmt  # "text", "pdf" or "ndjson"
+        self.size = size
+
+
+class IngestJob:
+    def __init__(self, manager: "IngestJobManager") -> None:
+        self._manager = manager
+        self.id = uuid.uuid4().hex
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+        self.inputs: list[_JobInput] = []
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.pipeline: IngestPipeline | None = None
+        self._spool_dir = Path(tempfile.mkdtemp(prefix=f"rag-job-{self.id[:8]}-"))
+        self._cleaned = False
+
+    # -- spooling (before the job is queued) --------------------------------------
+
+    async def _spool(self, source: str | None, fmt: str, data: AsyncIterator[bytes]) -> None:
+        path = self._spool_dir / f"{len(self.inputs)}.{fmt}"
+        size = 0
+        with open(path, "wb") as f:
+            pending = bytearray()
+            async for chunk in data:
+                self._manager.charge(self, len(chunk))
+                self.bytes_total += len(chunk)
+                size += len(chunk)
+                pending += chunk
+                if len(pending) >= SPOOL_CHUNK_BYTES:
+                    await asyncio.to_thread(f.write, pending)
+                    pending = bytearray()
+            if pending:
+                await asyncio.to_thread(f.write, pending)
+        self.inputs.append(_JobInput(source, path, fmt, size))
+
+    async def add_upload(self, upload: UploadFile) -> None:
+        async def read() -> AsyncIterator[bytes]:
+            while True:
+                chunk = await upload.read(SPOOL_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+
+        await self._spool(upload.filename, "pdf" if is_pdf(upload) else "text", read())
+
+    async def add_stream(self, source: str | None, fmt: str, data: AsyncIterator[bytes]) -> None:
+        await self._spool(source, fmt, data)
+
+    async def add_text(self, source: str | None, text: str) -> None:
+        async def single() -> AsyncIterator[bytes]:
+            yield text.encode("utf-8")
+
+        await self._spool(source, "text", single())
+
+    def cleanup(self) -> None:
+        if self._cleaned:
+            return
+        self._cleaned = True
+        shutil.rmtree(self._spool_dir, ignore_errors=True)
+        self._manager.release(self)
+
+    # -- running ------------------------------------------------------------------
+
+    async def _counted(self, path: Path) -> AsyncIterator[bytes]:
+        async for data in read_file_bytes(path):
+            self.bytes_read += len(data)
+            yield data
+
+    async def documents(self) -> AsyncIterator[Document]:
+        for item in self.inputs:
+            if item.fmt == "ndjson":
+                async for document in ndjson_documents(self._counted(item.path)):
+                    yield document
+            elif item.fmt == "pdf":
+                with open(item.path, "rb") as f:
+                    yield item.source, pdf_pages(f, item.source)
+                self.bytes_read += item.size
+            else:
+                yield item.source, decode_pieces(self._counted(item.path))
+
+    def to_dict(self, position: int | None = None) -> dict:
+        now = time.time()
+        out = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_ms": round(((self.started_at or now) - self.created_at) * 1000, 1),
+            "inputs": len(self.inputs),
+            "bytes_total": self.bytes_total,
+            "bytes_read": self.bytes_read,
+            "progress": round(min(1.0, self.bytes_read / self.bytes_total), 4) if self.bytes_total else None,
+            "error": self.error,
+        }
+        if position is not None:
+            out["queue_position"] = position
+        if self.pipeline is not None:
+            stats = self.pipeline.to_dict()
+            out.update(
+                {
+                    "documents": stats["documents"],
+                    "chunks": stats["chunks"],
+                    "chunks_embedded": stats["chunks_indexed"],
+                    "duplicates_skipped": stats["duplicates_skipped"],
+                    "failed_chunks": stats["failed_chunks"],
+                    "chunks_per_sec": stats["chunks_per_sec"],
+                    "embed_ms": stats["embed_ms"],
+                    "index_ms": stats["index_ms"],
+                    "yield_ms": stats["yield_ms"],
+                }
+            )
+        return out
+
+
+class IngestJobManager:
+    def __init__(self) -> None:
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._queue: asyncio.Queue[IngestJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self._spooling: set[str] = set()  # created, input still being spooled
+        self.spooled_bytes = 0  # spooled input of jobs not yet finished
+        self.completed = 0
+        self.failed = 0
+
+    def create(self) -> IngestJob:
+        """A new job to add inputs to, then enqueue (or discard).
+
+        Its queue slot is reserved now; raises JobQueueFull past RAG_JOB_QUEUE_MAX
+        jobs queued or spooling.
+        """
+        queued = len(self._spooling) + sum(1 for job in self._jobs.values() if job.status == "queued")
+        if queued >= get_settings().rag_job_queue_max:
+            raise JobQueueFull(f"{queued} ingest jobs already queued")
+        job = IngestJob(self)
+        self._spooling.add(job.id)
+        return job
+
+    def charge(self, job: IngestJob, size: int) -> None:
+        """Account `size` more spooled bytes to `job`; IngestInputError if over a limit."""
+        s = get_settings()
+        if job.bytes_total + size > s.rag_job_max_bytes:
+            raise IngestInputError(f"ingest job input exceeds {s.rag_job_max_bytes} bytes", status_code=413)
+        if self.spooled_bytes + size > s.rag_job_spool_max_bytes:
+            raise IngestInputError("ingest job spool is full; retry later", status_code=503)
+        self.spooled_bytes += size
+
+    def release(self, job: IngestJob) -> None:
+        self.spooled_bytes -= job.bytes_total
+        self._spooling.discard(job.id)
+
+    def discard(self, job: IngestJob) -> None:
+        job.cleanup()
+
+    def enqueue(self, job: IngestJob) -> None:
+        if self._queue is None:
+            raise RuntimeError("ingest job workers not started")
+        self._spooling.discard(job.id)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self._jobs.get(job_id)
+
+    def position(self, job: IngestJob) -> int | None:
+        if job.status != "queued":
+            return None
+        return sum(1 for other in self._jobs.values() if other.status == "queued" and other.created_at < job.created_at)
+
+    def _trim(self) -> None:
+        limit = get_settings().rag_job_history
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[: max(0, len(finished) - limit)]:
+            del self._jobs[job_id]
+
+    async def _execute(self, job: IngestJob) -> None:
+        s = get_settings()
+        job.status = "running"
+        job.started_at = time.time()
+        job.pipeline = IngestPipeline(batch_size=s.rag_job_batch_size, executor=self._executor, background=True)
+        try:
+            stats = await job.pipeline.run(job.documents())
+            if stats["error"] and not stats["chunks"]:
+                job.status, job.error = "failed", stats["error"]
+            elif stats["failed_chunks"] and not stats["chunks_indexed"] and not stats["duplicates_skipped"]:
+                job.status, job.error = "failed", stats["last_failure"]
+            else:
+                job.status, job.error = "done", stats["error"] or stats["last_failure"]
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+            logger.warning("rag_ingest_job_failed", extra={"job_id": job.id, "error": str(e)})
+        finally:
+            job.finished_at = time.time()
+            job.cleanup()
+            if job.status == "done":
+                self.completed += 1
+            elif job.status == "failed":
+                self.failed += 1
+            self._trim()
+
+    async def _run(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status == "queued":
+                await self._execute(job)
+
+    def start(self) -> None:
+        if self._workers and not all(w.done() for w in self._workers):
+            return
+        s = get_settings()
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, s.rag_job_embed_threads), thread_name_prefix="rag-ingest")
+        self._workers = [asyncio.create_task(self._run()) for _ in range(max(1, s.rag_job_workers))]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        for job in self._jobs.values():
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                job.cleanup()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def to_dict(self) -> dict:
+        s = get_settings()
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": s.rag_job_workers,
+            "embed_threads": s.rag_job_embed_threads,
+            "batch_size": s.rag_job_batch_size,
+            "queued": statuses.count("queued"),
+            "spooling": len(self._spooling),
+            "running": statuses.count("running"),
+            "spooled_bytes": self.spooled_bytes,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+INGEST_JOBS = IngestJobManager()
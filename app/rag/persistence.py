@@ -0,0 +1,432 @@
+# -----------------------------------------------------------------------------
+# app/rag/persistence.py — On-disk RAG index: snapshots + append-only chunk log
+# -----------------------------------------------------------------------------
+# RAG_DATA_DIR holds:
+#   manifest.json      current snapshot generation g, chunk count, dim, model
+#   vectors.<g>.npy    float32 embeddings of snapshot g (loaded memory-mapped)
+#   metadata.<g>.json  chunk metadata of snapshot g
+#   index.<g>.faiss    trained index of snapshot g (absent while flat)
+#   chunks.<h>.log     chunks added after snapshot h (JSON lines, base64 vector)
+# add_to_index appends every chunk to the active log before it becomes
+# searchable. Every RAG_SNAPSHOT_SEC with new chunks (and at shutdown) the log
+# is rotated and snapshot g+1 is written beside the old one, published by
+# atomically replacing manifest.json; only then are older files deleted.
+# Startup maps vectors.<g>.npy into the flat index and replays chunks.<h>.log
+# for h >= g, so restarts cost a disk read, never a re-embedding (nor an ANN
+# re-training, unless RAG_INDEX_TYPE changed).
+# One process owns the directory: the holder of an exclusive flock on
+# writer.lock. With several uvicorn workers the others load it read-only —
+# they search what was persisted when they started, and reject ingest
+# (IndexReadOnlyError) instead of writing logs and snapshots of their own.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import base64
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.rag.embeddings import EMBEDDING_MODEL_NAME
+from app.rag.index import (
+    index_count,
+    index_info,
+    mark_snapshot,
+    rag_lock,
+    restore_index,
+    set_chunk_log,
+    set_read_only,
+    snapshot_state,
+    target_index_kind,
+    unsaved_count,
+)
+from app.utils.file_lock import release, try_lock
+from app.utils.logger import logger
+
+MANIFEST_NAME = "manifest.json"
+WRITER_LOCK_NAME = "writer.lock"
+READ_ONLY_LOAD_ATTEMPTS = 3  # the owner may delete old generations mid-load
+MANIFEST_VERSION = 1
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+_GENERATION_FILE = re.compile(r"^(vectors|metadata|chunks|index)\.(\d+)\.(npy|json|log|faiss)$")
+
+
+def _data_dir() -> Path | None:
+    raw = get_settings().rag_data_dir
+    if not raw:
+        return None
+    path = Path(raw)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def _fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_json_atomic(path: Path, data) -> None:
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _generations(data_dir: Path) -> dict[int, list[Path]]:
+    found: dict[int, list[Path]] = {}
+    for path in data_dir.iterdir():
+        m = _GENERATION_FILE.match(path.name)
+        if m:
+            found.setdefault(int(m.group(2)), []).append(path)
+    return found
+
+
+class ChunkLog:
+    """Append-only log of chunks added since the last snapshot."""
+
+    def __init__(self, path: Path, generation: int, fsync: bool) -> None:
+        self.path = path
+        self.generation = generation
+        self._fsync = fsync
+        self._file = open(path, "ab")
+
+    def append(self, metas: list[dict], vectors: np.ndarray) -> None:
+        lines = b"".join(
+            json.dumps({"meta": meta, "v": base64.b64encode(vec.tobytes()).decode("ascii")}).encode("utf-8") + b"\n"
+            for meta, vec in zip(metas, vectors)
+        )
+        self._file.write(lines)
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def _read_log(path: Path, dim: int | None) -> tuple[list[dict], list[np.ndarray], int]:
+    """(metadata, vectors, valid bytes); stops at the first torn or corrupt line."""
+    metas: list[dict] = []
+    vectors: list[np.ndarray] = []
+    valid = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+                vec = np.frombuffer(base64.b64decode(entry["v"]), dtype=np.float32)
+                meta = entry["meta"]
+            except (ValueError, KeyError, TypeError):
+                break
+            if dim is not None and vec.shape[0] != dim:
+                break
+            dim = vec.shape[0]
+            metas.append(meta)
+            vectors.append(vec)
+            valid += len(line)
+    return metas, vectors, valid
+
+
+def load_data_dir(data_dir: Path, read_only: bool = False) -> dict:
+    """Read the latest snapshot plus every newer chunk log (runs in a thread).
+
+    `read_only` leaves a snapshot of another embedding model in place for the owner to set aside.
+    """
+    generations = _generations(data_dir)
+    manifest_path = data_dir / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text("utf-8")) if manifest_path.exists() else None
+    if manifest is not None and (
+        manifest.get("version") != MANIFEST_VERSION or manifest.get("model") != EMBEDDING_MODEL_NAME
+    ):
+        # Vectors of another embedding model cannot be searched: set them aside and start empty
+        if not read_only:
+            stale_dir = data_dir / f"stale-{int(time.time())}"
+            stale_dir.mkdir()
+            for path in [manifest_path, *(p for paths in generations.values() for p in paths)]:
+                os.replace(path, stale_dir / path.name)
+            logger.warning("rag_snapshot_set_aside", extra={"model": manifest.get("model"), "path": str(stale_dir)})
+        generations, manifest = {}, None
+
+    generation = manifest["generation"] if manifest else 0
+    disk_vectors = None
+    ann_index = None
+    ann_kind = "flat"
+    metadata: list[dict] = []
+    dim = manifest.get("dim") if manifest else None
+    if manifest and manifest["count"] > 0:
+        disk_vectors = np.load(data_dir / f"vectors.{generation}.npy", mmap_mode="r")
+        metadata = json.loads((data_dir / f"metadata.{generation}.json").read_text("utf-8"))
+        saved_kind = manifest.get("index_type", "flat")
+        index_path = data_dir / f"index.{generation}.faiss"
+        # A saved trained index is reused only if it is still the configured one
+        if saved_kind != "flat" and saved_kind == target_index_kind() and index_path.exists():
+            import faiss
+            ann_index = faiss.read_index(str(index_path))
+            ann_kind = saved_kind
+
+    new_vectors: list[np.ndarray] = []
+    active = generation
+    valid_bytes = 0
+    for log_gen in sorted(g for g in generations if g >= generation):
+        log_path = data_dir / f"chunks.{log_gen}.log"
+        if not log_path.exists():
+            continue
+        metas, vectors, valid_bytes = _read_log(log_path, dim)
+        active = log_gen
+        for meta, vec in zip(metas, vectors):
+            if meta.get("chunk_index") != len(metadata):
+                continue  # already in the snapshot
+            metadata.append(meta)
+            new_vectors.append(vec)
+            dim = vec.shape[0]
+    return {
+        "generation": active,
+        "disk_vectors": disk_vectors,
+        "ann_index": ann_index,
+        "ann_kind": ann_kind,
+        "new_vectors": np.stack(new_vectors) if new_vectors else None,
+        "metadata": metadata,
+        "dim": dim,
+        "replayed": len(new_vectors),
+        "log_valid_bytes": valid_bytes,
+    }
+
+
+def _write_snapshot(
+    data_dir: Path,
+    generation: int,
+    disk_vectors: np.ndarray | None,
+    new_vectors: list[np.ndarray],
+    metadata: list[dict],
+    dim: int,
+    index_kind: str,
+    index_bytes: np.ndarray | None,
+) -> np.ndarray:
+    """Write snapshot `generation` and publish it; returns its vectors memory-mapped."""
+    count = len(metadata)
+    vectors_path = data_dir / f"vectors.{generation}.npy"
+    tmp = vectors_path.with_name(f"{vectors_path.name}.tmp")
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(count, dim))
+    offset = 0
+    for part in ([disk_vectors] if disk_vectors is not None else []) + new_vectors:
+        out[offset : offset + len(part)] = part
+        offset += len(part)
+    out.flush()
+    del out
+    _fsync_path(tmp)
+    os.replace(tmp, vectors_path)
+    _write_json_atomic(data_dir / f"metadata.{generation}.json", metadata)
+    if index_bytes is not None:
+        # faiss.serialize_index output is the faiss.write_index file format
+        index_path = data_dir / f"index.{generation}.faiss"
+        tmp = index_path.with_name(f"{index_path.name}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(index_bytes.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, index_path)
+    _write_json_atomic(
+        data_dir / MANIFEST_NAME,
+        {
+            "version": MANIFEST_VERSION,
+            "generation": generation,
+            "count": count,
+            "dim": dim,
+            "model": EMBEDDING_MODEL_NAME,
+            "index_type": index_kind,
+            "saved_at": time.time(),
+        },
+    )
+    return np.load(vectors_path, mmap_mode="r")
+
+
+def _remove_older(data_dir: Path, generation: int) -> None:
+    for gen, paths in _generations(data_dir).items():
+        if gen < generation:
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+
+class RagSnapshotter:
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._log: ChunkLog | None = None
+        self._data_dir: Path | None = None
+        self._writer_lock: int | None = None
+        self.read_only = False
+        self.generation = 0
+        self._saved_kind = "flat"  # index type in the last snapshot
+        self._save_lock = asyncio.Lock()
+        self.loaded_chunks = 0
+        self.replayed_chunks = 0
+        self.load_ms: float | None = None
+        self.last_snapshot_at: float | None = None
+        self.last_snapshot_ms: float | None = None
+
+    async def load(self, data_dir: Path) -> None:
+        start = time.perf_counter()
+        state = await asyncio.to_thread(load_data_dir, data_dir, self.read_only)
+        async with rag_lock():
+            if state["metadata"]:
+                restore_index(
+                    state["disk_vectors"],
+                    state["new_vectors"],
+                    state["metadata"],
+                    state["dim"],
+                    ann_index=state["ann_index"],
+                    ann_kind=state["ann_kind"],
+                )
+            if not self.read_only:
+                log_path = data_dir / f"chunks.{state['generation']}.log"
+                if log_path.exists():
+                    # Drop a torn tail so new entries start on a clean line
+                    os.truncate(log_path, state["log_valid_bytes"])
+                self._log = ChunkLog(log_path, state["generation"], get_settings().rag_log_fsync)
+                set_chunk_log(self._log)
+        self.generation = state["generation"]
+        self._saved_kind = state["ann_kind"]
+        self.loaded_chunks = len(state["metadata"])
+        self.replayed_chunks = state["replayed"]
+        self.load_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            "rag_index_loaded",
+            extra={
+                "chunks": self.loaded_chunks,
+                "replayed": self.replayed_chunks,
+                "read_only": self.read_only,
+                "latency_ms": self.load_ms,
+            },
+        )
+
+    async def save(self) -> None:
+        data_dir = self._data_dir
+        if data_dir is None or self._log is None:
+            return
+        async with self._save_lock:
+            # New chunks, or a promoted index worth keeping so restarts skip the training
+            if unsaved_count() == 0 and index_info()["type"] == self._saved_kind:
+                return
+            await self._save(data_dir)
+
+    async def _save(self, data_dir: Path) -> None:
+        start = time.perf_counter()
+        # Only the log rotation and the state copy hold the index lock; the
+        # files are written while ingest and search carry on
+        async with rag_lock():
+            disk_vectors, new_vectors, metadata, dim, index_kind, index_bytes = snapshot_state()
+            # Chunks added from now on go to the next generation's log
+            generation = self._log.generation + 1
+            old_log = self._log
+            self._log = ChunkLog(data_dir / f"chunks.{generation}.log", generation, get_settings().rag_log_fsync)
+            set_chunk_log(self._log)
+            old_log.close()
+        vectors = await asyncio.to_thread(
+            _write_snapshot, data_dir, generation, disk_vectors, new_vectors, metadata, dim, index_kind, index_bytes
+        )
+        async with rag_lock():
+            mark_snapshot(vectors, disk_vectors, len(new_vectors))
+        self.generation = generation
+        self._saved_kind = index_kind
+        await asyncio.to_thread(_remove_older, data_dir, generation)
+        self.last_snapshot_at = time.time()
+        self.last_snapshot_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            "rag_snapshot_saved",
+            extra={"generation": generation, "chunks": len(metadata), "latency_ms": self.last_snapshot_ms},
+        )
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.warning("rag_snapshot_failed", extra={"error": str(e)})
+
+    async def start(self) -> None:
+        """Load the persisted index and start snapshotting; no-op unless RAG_DATA_DIR is set.
+
+        Only the worker holding writer.lock logs and snapshots; any other
+        loads the directory read-only.
+        """
+        data_dir = _data_dir()
+        if data_dir is None:
+            return
+        await asyncio.to_thread(data_dir.mkdir, parents=True, exist_ok=True)
+        self._data_dir = data_dir
+        self._writer_lock = await asyncio.to_thread(try_lock, data_dir / WRITER_LOCK_NAME)
+        self.read_only = self._writer_lock is None
+        if self.read_only:
+            set_read_only(True)
+            error = None
+            for _ in range(READ_ONLY_LOAD_ATTEMPTS):
+                try:
+                    await self.load(data_dir)
+                    error = None
+                    break
+                except FileNotFoundError as e:
+                    error = e  # a newer snapshot replaced the one being read: read that
+                except Exception as e:
+                    error = e
+                    break
+            if error is not None:
+                logger.warning("rag_index_load_failed", extra={"error": str(error), "read_only": True})
+            logger.warning("rag_index_read_only", extra={"path": str(data_dir)})
+            return
+        try:
+            await self.load(data_dir)
+        except Exception as e:
+            # Never fail startup over the RAG index; keep logging new chunks after the old ones
+            logger.warning("rag_index_load_failed", extra={"error": str(e)})
+            if self._log is None:
+                generation = max(_generations(data_dir), default=0) + 1
+                self._log = ChunkLog(data_dir / f"chunks.{generation}.log", generation, get_settings().rag_log_fsync)
+                set_chunk_log(self._log)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(get_settings().rag_snapshot_sec))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.save()
+        except Exception as e:
+            logger.warning("rag_snapshot_failed", extra={"error": str(e)})
+        if self._log is not None:
+            set_chunk_log(None)
+            self._log.close()
+            self._log = None
+        if self._writer_lock is not None:
+            release(self._writer_lock)
+            self._writer_lock = None
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self._data_dir is not None,
+            "read_only": self.read_only,
+            "generation": self.generation,
+            "chunks": index_count(),
+            "unsaved_chunks": unsaved_count(),
+            "loaded_chunks": self.loaded_chunks,
+            "replayed_chunks": self.replayed_chunks,
+            "load_ms": round(self.load_ms, 2) if self.load_ms is not None else None,
+            "last_snapshot_at": self.last_snapshot_at,
+            "last_snapshot_ms": round(self.last_snapshot_ms, 2) if self.last_snapshot_ms is not None else None,
+        }
+
+
+RAG_SNAPSHOTTER = RagSnapshotter()
@@ -0,0 +1,193 @@
+# -----------------------------------------------------------------------------
+# app/rag/query_batcher.py — Micro-batched query embedding + FAISS search
+# -----------------------------------------------------------------------------
+# Concurrent retrievals are queued instead of each running its own one-row
+# model.encode and index.search. A worker takes the first queued query,
+# collects more for up to RAG_QUERY_BATCH_WINDOW_MS (or RAG_QUERY_BATCH_MAX
+# queries), then:
+#   - embeds the batch's cache misses in one model.encode, on a dedicated
+#     executor of RAG_EMBED_THREADS threads (not asyncio's shared pool);
+#   - runs one multi-row search per (nprobe, efSearch) group, under the index
+#     lock (adds run in a thread and must not overlap a search);
+#   - resolves each caller's future with its own top-k.
+# embed() queues a query for its embedding alone (the response cache's
+# semantic layer), batched with the searches on the same executor.
+# While a batch is encoding, new queries queue up, so batches grow with load.
+# Background ingest jobs wait for pending queries (wait_idle) before encoding.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.rag.embedding_cache import EMBEDDING_CACHE
+from app.rag.index import get_metadata_list, index_count, rag_lock, search_ids
+from app.utils.logger import logger
+
+
+class _PendingQuery:
+    __slots__ = ("query", "k", "nprobe", "ef_search", "future")
+
+    def __init__(self, query: str, k: int, nprobe: int | None, ef_search: int | None) -> None:
+        self.query = query
+        self.k = k  # 0: embed only, the future gets the query's vector
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class QueryBatcher:
+    def __init__(self) -> None:
+        self._queue: asyncio.Queue[_PendingQuery] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self.batches = 0
+        self.queries = 0
+        self.max_batch = 0
+        self.encode_ms_total = 0.0
+        self._pending = 0  # queries submitted and not yet answered
+        self._idle = asyncio.Event()  # set while _pending == 0
+        self._idle.set()
+
+    def _ensure_started(self) -> None:
+        if self._workers and not all(w.done() for w in self._workers):
+            return
+        s = get_settings()
+        threads = max(1, s.rag_embed_threads)
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="rag-embed")
+        self._workers = [asyncio.create_task(self._run()) for _ in range(threads)]
+
+    async def search(self, query: str, k: int, nprobe: int | None = None, ef_search: int | None = None) -> list[str]:
+        """Top-k chunk texts for `query`, embedded and searched together with concurrent queries."""
+        if k <= 0:
+            return []
+        return await self._submit(_PendingQuery(query, k, nprobe, ef_search))
+
+    async def embed(self, query: str) -> np.ndarray:
+        """Embedding of `query`, encoded in the same batches as concurrent searches."""
+        return await self._submit(_PendingQuery(query, 0, None, None))
+
+    async def _submit(self, pending: _PendingQuery):
+        self._ensure_started()
+        self._queue.put_nowait(pending)
+        self._pending += 1
+        self._idle.clear()
+        try:
+            return await pending.future
+        finally:
+            self._pending -= 1
+            if not self._pending:
+                self._idle.set()
+
+    async def wait_idle(self, max_wait: float) -> float:
+        """Wait until no query is queued or being served, at most `max_wait` seconds; returns seconds waited.
+
+        Background work (ingest jobs) calls this before each model.encode so
+        live retrieval gets the embedding model first.
+        """
+        if not self._pending:
+            return 0.0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await asyncio.wait_for(self._idle.wait(), max_wait)
+        except asyncio.TimeoutError:
+            pass
+        return loop.time() - start
+
+    async def _collect(self) -> list[_PendingQuery]:
+        s = get_settings()
+        max_batch = max(1, s.rag_query_batch_max)
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + s.rag_query_batch_window_ms / 1000
+        while len(batch) < max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return [p for p in batch if not p.future.done()]  # drop callers that went away
+
+    async def _process(self, batch: list[_PendingQuery]) -> None:
+        start = time.perf_counter()
+        vectors = await EMBEDDING_CACHE.embed([p.query for p in batch], executor=self._executor)
+        self.encode_ms_total += (time.perf_counter() - start) * 1000
+        searches = []
+        for i, p in enumerate(batch):
+            if p.future.done():
+                continue
+            if p.k == 0:
+                p.future.set_result(vectors[i])
+            elif index_count() == 0:
+                p.future.set_result([])
+            else:
+                searches.append(i)
+        groups: dict[tuple, list[int]] = {}
+        for i in searches:
+            groups.setdefault((batch[i].nprobe, batch[i].ef_search), []).append(i)
+        if not groups:
+            return
+        # add_to_index inserts in a worker thread under the same lock; FAISS cannot search meanwhile
+        async with rag_lock():
+            meta = get_metadata_list()
+            for (nprobe, ef_search), rows in groups.items():
+                k = max(batch[i].k for i in rows)
+                results = search_ids(vectors[rows], k, nprobe, ef_search)
+                for i, ids in zip(rows, results):
+                    p = batch[i]
+                    if not p.future.done():
+                        p.future.set_result([meta[j]["text"] for j in ids[: p.k] if 0 <= j < len(meta)])
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            try:
+                await self._process(batch)
+            except Exception as e:
+                logger.warning("rag_query_batch_failed", extra={"batch_size": len(batch), "error": str(e)})
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def to_dict(self) -> dict:
+        return {
+            "window_ms": get_settings().rag_query_batch_window_ms,
+            "max_batch": get_settings().rag_query_batch_max,
+            "embed_threads": get_settings().rag_embed_threads,
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else None,
+            "largest_batch": self.max_batch,
+            "avg_encode_ms": round(self.encode_ms_total / self.batches, 2) if self.batches else None,
+        }
+
+
+QUERY_BATCHER = QueryBatcher()
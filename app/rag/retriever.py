@@ -2,22 +2,25 @@
 # app/rag/retriever.py — Retrieve top-k relevant chunks
 # -----------------------------------------------------------------------------
 
-import asyncio
-
 from app.rag.embeddings import embed_texts
 from app.rag.index import index_count, search_index
+from app.rag.query_batcher import QUERY_BATCHER
 
 
-def retrieve_top_k(query: str, k: int = 3) -> list[str]:
+def retrieve_top_k(query: str, k: int = 3, nprobe: int | None = None, ef_search: int | None = None) -> list[str]:
     if index_count() == 0:
         return []
     query_emb = embed_texts([query])[0]
-    return search_index(query_emb, k=k)
+    return search_index(query_emb, k=k, nprobe=nprobe, ef_search=ef_search)
 
 
-async def retrieve_top_k_async(query: str, k: int = 3) -> list[str]:
+async def retrieve_top_k_async(
+    query: str,
+    k: int = 3,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+) -> list[str]:
     if index_count() == 0:
         return []
-    embeddings = await asyncio.to_thread(embed_texts, [query])
-    query_emb = embeddings[0]
-    return search_index(query_emb, k=k)
+    # Batched with concurrent queries: one model.encode and one index.search per batch
+    return await QUERY_BATCHER.search(query, k, nprobe=nprobe, ef_search=ef_search)
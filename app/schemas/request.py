@@ -8,3 +8,21 @@ class GenerateRequest(BaseModel):
     model: str = Field("", min_length=0)  # empty = server picks per provider
     prompt: str = Field(..., min_length=1)
     temperature: float = Field(0.7, ge=0.0, le=2.0)
+    # RAG search overrides (recall vs latency); ignored while the index is flat
+    rag_nprobe: int | None = Field(None, ge=1, le=4096)  # IVF lists probed
+    rag_ef_search: int | None = Field(None, ge=1, le=4096)  # HNSW candidate list size
+
+
+MAX_BATCH_ITEMS = 50
+
+
+class BatchGenerateRequest(BaseModel):
+    items: list[GenerateRequest] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+    stream: bool = False  # true = NDJSON lines in completion order instead of one JSON body
+
+
+class SessionTurnRequest(BaseModel):
+    provider: Literal["openai", "groq", "gemini", "ollama", "auto"] = "auto"
+    model: str = Field("", min_length=0)
+    prompt: str = Field(..., min_length=1)  # the new question only; history is kept server-side
+    temperature: float = Field(0.7, ge=0.0, le=2.0)
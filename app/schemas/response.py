@@ -6,3 +6,29 @@ class GenerateResponse(BaseModel):
     response: str
     latency_ms: float
     routing_reason: str | None = None
+
+
+class BatchGenerateItem(BaseModel):
+    index: int
+    provider_used: str | None = None
+    response: str | None = None
+    latency_ms: float | None = None
+    routing_reason: str | None = None
+    status_code: int = 200
+    error: str | None = None
+
+
+class BatchGenerateResponse(BaseModel):
+    results: list[BatchGenerateItem]
+    total_latency_ms: float
+
+
+class SessionTurnResponse(BaseModel):
+    session_id: str
+    provider_used: str
+    response: str
+    latency_ms: float
+    routing_reason: str | None = None
+    prompt_tokens: int
+    history_turns: int  # earlier turns sent with this one (after trimming)
+    rag_reused: bool
@@ -1,58 +1,313 @@
-from app.db.session import _infer_category, insert_log
-from app.llms.router import Provider, generate_with_fallback
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+from app.core.config import get_settings
+from app.db.session import _infer_category, insert_log, insert_logs
+from app.llms.router import Provider, RoutedStream, generate_with_fallback
 from app.rag.index import index_count
 from app.rag.retriever import retrieve_top_k_async
+from app.schemas.request import GenerateRequest
+from app.services.response_cache import RESPONSE_CACHE, CacheLookup
 from app.utils.logger import logger
 from app.utils.token_estimator import estimate_tokens
 
 RAG_TOP_K = 3
 
 
-async def generate(
-    provider: Provider,
-    model: str,
+async def _augment_prompt(
     prompt: str,
-    temperature: float,
-    risk_score: float | None = None,
-    fingerprint: str | None = None,
-) -> tuple[str, str, float]:
+    rag_nprobe: int | None = None,
+    rag_ef_search: int | None = None,
+) -> tuple[str, bool]:
     effective_prompt = prompt
     rag_used = False
     if index_count() > 0:
-        chunks = await retrieve_top_k_async(prompt, k=RAG_TOP_K)
+        chunks = await retrieve_top_k_async(prompt, k=RAG_TOP_K, nprobe=rag_nprobe, ef_search=rag_ef_search)
         if chunks:
             context = "\n".join(chunks)
             effective_prompt = f"Context:\n{context}\n\nUser:\n{prompt}"
             rag_used = True
     logger.info("rag_used" if rag_used else "rag_skipped", extra={"rag_used": rag_used})
-    (
-        result,
-        provider_used,
-        latency_ms,
-        original_provider,
-        routing_reason,
-        adaptive_score_used,
-        circuit_triggered,
-    ) = await generate_with_fallback(
+    return effective_prompt, rag_used
+
+
+def _write_log(log_sink: list[dict] | None, **fields) -> None:
+    """insert_log now, or defer to the caller's sink (batch requests write once)."""
+    if log_sink is not None:
+        log_sink.append(fields)
+    else:
+        insert_log(**fields)
+
+
+def _log_cache_hit(
+    lookup: CacheLookup,
+    provider: Provider,
+    model: str,
+    prompt: str,
+    latency_ms: float,
+    risk_score: float | None,
+    fingerprint: str | None,
+    log_sink: list[dict] | None = None,
+) -> None:
+    logger.info("cache_hit", extra={"layer": lookup.layer, "provider_used": lookup.entry.provider_used})
+    _write_log(
+        log_sink,
+        provider=lookup.entry.provider_used,
+        model=model,
+        prompt_length=estimate_tokens(prompt),
+        latency_ms=latency_ms,
+        original_provider=provider,
+        routing_reason="cache_hit",
+        rag_used=False,
+        risk_score=risk_score,
+        fingerprint=fingerprint,
+        prompt_preview=prompt[:300] if prompt else None,
+        category=_infer_category(prompt),
+    )
+
+
+class _Generation:
+    """Outcome of one routed provider call, shared by coalesced requests."""
+
+    __slots__ = (
+        "result",
+        "provider_used",
+        "latency_ms",
+        "original_provider",
+        "routing_reason",
+        "adaptive_score_used",
+        "circuit_triggered",
+        "attempts",
+        "rag_used",
+        "prompt_tokens",
+    )
+
+    def __init__(self, routed: tuple, rag_used: bool, prompt_tokens: int) -> None:
+        (
+            self.result,
+            self.provider_used,
+            self.latency_ms,
+            self.original_provider,
+            self.routing_reason,
+            self.adaptive_score_used,
+            self.circuit_triggered,
+            self.attempts,
+        ) = routed
+        self.rag_used = rag_used
+        self.prompt_tokens = prompt_tokens
+
+
+# (prompt, provider, model, temperature, rag_nprobe, rag_ef_search) -> task producing a _Generation
+_inflight: dict[tuple, asyncio.Task] = {}
+
+
+async def _generate_uncached(
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    lookup: CacheLookup,
+    rag_nprobe: int | None = None,
+    rag_ef_search: int | None = None,
+) -> _Generation:
+    effective_prompt, rag_used = await _augment_prompt(prompt, rag_nprobe, rag_ef_search)
+    routed = await generate_with_fallback(
         provider=provider,
         model=model,
         prompt=effective_prompt,
         temperature=temperature,
     )
-    prompt_tokens = estimate_tokens(effective_prompt)
-    insert_log(
-        provider=provider_used,
+    generation = _Generation(routed, rag_used, estimate_tokens(effective_prompt))
+    RESPONSE_CACHE.store(lookup, generation.result, generation.provider_used)
+    return generation
+
+
+def _join_or_start(
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    lookup: CacheLookup,
+    rag_nprobe: int | None = None,
+    rag_ef_search: int | None = None,
+) -> tuple[asyncio.Task, bool]:
+    """Single-flight: return the in-flight task for identical requests, or start one.
+
+    The work runs in its own task so a leader that disconnects does not cancel
+    it for the followers waiting on the same answer.
+    """
+    key = (prompt, provider, (model or "").strip(), temperature, rag_nprobe, rag_ef_search)
+    task = _inflight.get(key)
+    if task is not None:
+        return task, False
+    task = asyncio.create_task(
+        _generate_uncached(provider, model, prompt, temperature, lookup, rag_nprobe, rag_ef_search)
+    )
+    _inflight[key] = task
+
+    def _done(t: asyncio.Task) -> None:
+        if _inflight.get(key) is t:
+            del _inflight[key]
+        if not t.cancelled():
+            t.exception()  # mark retrieved even if every waiter went away
+
+    task.add_done_callback(_done)
+    return task, True
+
+
+async def generate(
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    risk_score: float | None = None,
+    fingerprint: str | None = None,
+    log_sink: list[dict] | None = None,
+    rag_nprobe: int | None = None,
+    rag_ef_search: int | None = None,
+) -> tuple[str, str, float]:
+    start = time.perf_counter()
+    lookup = await RESPONSE_CACHE.lookup(prompt, provider, model, temperature)
+    if lookup.entry is not None:
+        latency_ms = (time.perf_counter() - start) * 1000
+        _log_cache_hit(lookup, provider, model, prompt, latency_ms, risk_score, fingerprint, log_sink)
+        return lookup.entry.response, lookup.entry.provider_used, latency_ms, "cache_hit"
+    if get_settings().coalesce_requests:
+        task, is_leader = _join_or_start(provider, model, prompt, temperature, lookup, rag_nprobe, rag_ef_search)
+        generation = await asyncio.shield(task)
+    else:
+        is_leader = True
+        generation = await _generate_uncached(provider, model, prompt, temperature, lookup, rag_nprobe, rag_ef_search)
+    if is_leader:
+        latency_ms = generation.latency_ms
+        routing_reason = generation.routing_reason
+    else:
+        # Followers log their own wait; the provider call itself was the leader's
+        latency_ms = (time.perf_counter() - start) * 1000
+        routing_reason = "coalesced"
+        logger.info("request_coalesced", extra={"provider_used": generation.provider_used})
+    _write_log(
+        log_sink,
+        provider=generation.provider_used,
         model=model,
-        prompt_length=prompt_tokens,
+        prompt_length=generation.prompt_tokens,
         latency_ms=latency_ms,
-        original_provider=original_provider,
+        original_provider=generation.original_provider,
         routing_reason=routing_reason,
-        rag_used=rag_used,
+        rag_used=generation.rag_used,
         risk_score=risk_score,
         fingerprint=fingerprint,
-        adaptive_score_used=adaptive_score_used,
-        circuit_triggered=circuit_triggered,
+        adaptive_score_used=generation.adaptive_score_used if is_leader else None,
+        circuit_triggered=generation.circuit_triggered,
+        attempts=generation.attempts if is_leader else None,
         prompt_preview=prompt[:300] if prompt else None,
         category=_infer_category(prompt),
     )
-    return result, provider_used, latency_ms, routing_reason
+    return generation.result, generation.provider_used, latency_ms, routing_reason
+
+
+async def generate_stream(
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    risk_score: float | None = None,
+    fingerprint: str | None = None,
+    rag_nprobe: int | None = None,
+    rag_ef_search: int | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """Stream a completion as ("token", {"text": ...}) events, then one ("done", {...})."""
+    start = time.perf_counter()
+    lookup = await RESPONSE_CACHE.lookup(prompt, provider, model, temperature)
+    if lookup.entry is not None:
+        latency_ms = (time.perf_counter() - start) * 1000
+        _log_cache_hit(lookup, provider, model, prompt, latency_ms, risk_score, fingerprint)
+        yield "token", {"text": lookup.entry.response}
+        yield "done", {
+            "provider_used": lookup.entry.provider_used,
+            "latency_ms": round(latency_ms, 2),
+            "ttft_ms": round(latency_ms, 2),
+            "routing_reason": "cache_hit",
+        }
+        return
+    effective_prompt, rag_used = await _augment_prompt(prompt, rag_nprobe, rag_ef_search)
+    stream = RoutedStream(provider=provider, model=model, prompt=effective_prompt, temperature=temperature)
+    parts: list[str] = []
+    stream_start = time.perf_counter()
+    completed = False
+    try:
+        async for text in stream:
+            parts.append(text)
+            yield "token", {"text": text}
+        completed = True
+    finally:
+        # Also log a stream cut short (client disconnect or provider error): the call was made
+        insert_log(
+            provider=stream.provider_used or provider,
+            model=model,
+            prompt_length=estimate_tokens(effective_prompt),
+            latency_ms=stream.latency_ms if completed else (time.perf_counter() - stream_start) * 1000,
+            original_provider=stream.original_provider,
+            routing_reason=stream.routing_reason,
+            rag_used=rag_used,
+            risk_score=risk_score,
+            fingerprint=fingerprint,
+            adaptive_score_used=stream.adaptive_score_used,
+            circuit_triggered=stream.circuit_triggered,
+            prompt_preview=prompt[:300] if prompt else None,
+            category=_infer_category(prompt),
+            ttft_ms=stream.ttft_ms,
+            attempts=stream.attempts,
+            aborted=not completed,
+        )
+    RESPONSE_CACHE.store(lookup, "".join(parts), stream.provider_used)
+    yield "done", {
+        "provider_used": stream.provider_used,
+        "latency_ms": round(stream.latency_ms, 2),
+        "ttft_ms": round(stream.ttft_ms, 2),
+        "routing_reason": stream.routing_reason,
+    }
+
+
+async def generate_batch(
+    items: list[GenerateRequest],
+    risk_scores: list[float],
+    fingerprints: list[str] | None = None,
+) -> AsyncIterator[tuple[int, tuple | Exception]]:
+    """Run many generate() calls concurrently, yielding (index, result or error) as each completes.
+
+    Concurrency is capped per requested provider ("auto" items share one cap)
+    and all log rows are written in a single transaction at the end.
+    """
+    limit = max(1, get_settings().batch_concurrency_per_provider)
+    semaphores: dict[str, asyncio.Semaphore] = {}
+    log_records: list[dict] = []
+
+    async def run(index: int, item: GenerateRequest) -> tuple[int, tuple | Exception]:
+        semaphore = semaphores.setdefault(item.provider, asyncio.Semaphore(limit))
+        async with semaphore:
+            try:
+                return index, await generate(
+                    provider=item.provider,
+                    model=item.model,
+                    prompt=item.prompt,
+                    temperature=item.temperature,
+                    risk_score=risk_scores[index],
+                    fingerprint=fingerprints[index] if fingerprints else None,
+                    log_sink=log_records,
+                    rag_nprobe=item.rag_nprobe,
+                    rag_ef_search=item.rag_ef_search,
+                )
+            except Exception as e:
+                return index, e
+
+    tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        insert_logs(log_records)
@@ -0,0 +1,200 @@
+# =============================================================================
+# app/services/response_cache.py — Exact + semantic response cache
+# =============================================================================
+# Sits in front of generate_with_fallback. Two layers:
+#   1. Exact: normalized prompt + provider + model + temperature bucket +
+#      RAG index version (so new course material invalidates old answers).
+#   2. Semantic (optional): prompt embedding searched in a small FAISS
+#      inner-product index; a hit needs cosine similarity >=
+#      RESPONSE_CACHE_SIMILARITY and the same provider/model/temperature/index.
+#      The prompt is embedded through QUERY_BATCHER (batched with RAG queries,
+#      kept in EMBEDDING_CACHE), so RAG retrieval reuses the same vector.
+# Entries are evicted LRU-first and expire after RESPONSE_CACHE_TTL_SEC; the
+# cache is capped both by entry count and by approximate memory.
+# =============================================================================
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.rag.index import index_version
+from app.rag.query_batcher import QUERY_BATCHER
+
+TEMPERATURE_BUCKET = 0.25
+SEMANTIC_SEARCH_K = 4
+ENTRY_OVERHEAD_BYTES = 256  # dict slot, tuple key, timestamps
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split()).rstrip("?.! ")
+
+
+def _temperature_bucket(temperature: float) -> int:
+    return int(round(temperature / TEMPERATURE_BUCKET))
+
+
+class CachedResponse:
+    __slots__ = ("response", "provider_used", "expires_at", "size_bytes", "vector_id")
+
+    def __init__(self, response: str, provider_used: str, expires_at: float, size_bytes: int) -> None:
+        self.response = response
+        self.provider_used = provider_used
+        self.expires_at = expires_at
+        self.size_bytes = size_bytes
+        self.vector_id: int | None = None
+
+
+class CacheLookup:
+    """Result of a lookup; pass back to store() on a miss to reuse key and embedding."""
+
+    __slots__ = ("key", "context", "embedding", "entry", "layer")
+
+    def __init__(self, key: tuple, context: tuple) -> None:
+        self.key = key
+        self.context = context
+        self.embedding: np.ndarray | None = None
+        self.entry: CachedResponse | None = None
+        self.layer: str | None = None  # "exact" | "semantic" on hit
+
+
+class ResponseCache:
+    def __init__(self) -> None:
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        # Semantic layer: FAISS IndexIDMap2(IndexFlatIP) over normalized embeddings
+        self._vector_index: Any = None
+        self._vector_keys: dict[int, tuple] = {}
+        self._next_vector_id = 0
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # -- lookup ---------------------------------------------------------------
+
+    async def lookup(self, prompt: str, provider: str, model: str, temperature: float) -> CacheLookup:
+        s = get_settings()
+        context = (provider, (model or "").strip(), _temperature_bucket(temperature), index_version())
+        lookup = CacheLookup((normalize_prompt(prompt), *context), context)
+        if not s.response_cache_enabled:
+            return lookup
+        entry = self._get_live(lookup.key)
+        if entry is not None:
+            self.hits_exact += 1
+            lookup.entry, lookup.layer = entry, "exact"
+            return lookup
+        if s.response_cache_semantic:
+            vector = await QUERY_BATCHER.embed(prompt)
+            lookup.embedding = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))
+            entry = self._get_similar(lookup.embedding, context, s.response_cache_similarity)
+            if entry is not None:
+                self.hits_semantic += 1
+                lookup.entry, lookup.layer = entry, "semantic"
+                return lookup
+        self.misses += 1
+        return lookup
+
+    def _get_live(self, key: tuple) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _get_similar(self, embedding: np.ndarray, context: tuple, threshold: float) -> CachedResponse | None:
+        if self._vector_index is None or self._vector_index.ntotal == 0:
+            return None
+        k = min(SEMANTIC_SEARCH_K, self._vector_index.ntotal)
+        scores, ids = self._vector_index.search(embedding, k)
+        for score, vid in zip(scores[0], ids[0]):
+            if score < threshold:
+                break
+            key = self._vector_keys.get(int(vid))
+            # Similar wording is only reusable under the same routing/RAG context
+            if key is None or key[1:] != context:
+                continue
+            entry = self._get_live(key)
+            if entry is not None:
+                return entry
+        return None
+
+    # -- store / evict --------------------------------------------------------
+
+    def store(self, lookup: CacheLookup, response: str, provider_used: str) -> None:
+        s = get_settings()
+        if not s.response_cache_enabled or not response:
+            return
+        if lookup.key in self._entries:
+            self._remove(lookup.key)
+        size = len(response.encode("utf-8")) + len(lookup.key[0]) + ENTRY_OVERHEAD_BYTES
+        if lookup.embedding is not None:
+            size += lookup.embedding.nbytes
+        if size > s.response_cache_max_bytes:
+            return
+        entry = CachedResponse(response, provider_used, time.monotonic() + s.response_cache_ttl_sec, size)
+        if lookup.embedding is not None:
+            entry.vector_id = self._add_vector(lookup.embedding, lookup.key)
+        self._entries[lookup.key] = entry
+        self._bytes += size
+        while self._entries and (
+            len(self._entries) > s.response_cache_max_entries or self._bytes > s.response_cache_max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _add_vector(self, embedding: np.ndarray, key: tuple) -> int:
+        if self._vector_index is None:
+            import faiss
+            self._vector_index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+        vid = self._next_vector_id
+        self._next_vector_id += 1
+        self._vector_index.add_with_ids(embedding, np.array([vid], dtype=np.int64))
+        self._vector_keys[vid] = key
+        return vid
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size_bytes
+        if entry.vector_id is not None and self._vector_index is not None:
+            self._vector_index.remove_ids(np.array([entry.vector_id], dtype=np.int64))
+            self._vector_keys.pop(entry.vector_id, None)
+
+    def clear(self) -> None:
+        for key in list(self._entries):
+            self._remove(key)
+
+    def to_dict(self) -> dict:
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        hits = self.hits_exact + self.hits_semantic
+        return {
+            "enabled": get_settings().response_cache_enabled,
+            "semantic": get_settings().response_cache_semantic,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _normalize(arr: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(arr, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return arr / norms
+
+
+RESPONSE_CACHE = ResponseCache()
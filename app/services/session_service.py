@@ -0,0 +1,201 @@
+# =============================================================================
+# app/services/session_service.py — Multi-turn tutoring sessions
+# =============================================================================
+# History lives server-side, so a follow-up only sends the new question:
+#   - each turn is sent as chat messages (Ollama: /api/chat, which reuses the
+#     runner's KV cache for the unchanged prefix; other providers get the
+#     flattened conversation, history first so provider prefix caches match);
+#   - history is trimmed oldest-first to SESSION_HISTORY_TOKEN_BUDGET
+#     (estimate_tokens);
+#   - the previous turn's RAG chunks are reused for short follow-ups ("why?",
+#     "give an example") instead of re-embedding and re-searching.
+# Sessions are in-memory per worker, expire after SESSION_TTL_SEC idle and
+# are evicted LRU-first beyond SESSION_MAX_SESSIONS.
+# =============================================================================
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+
+from app.core.config import get_settings
+from app.db.session import _infer_category, insert_log
+from app.llms.base import flatten_messages
+from app.llms.router import Provider, generate_with_fallback
+from app.rag.index import index_count, index_version
+from app.rag.retriever import retrieve_top_k_async
+from app.utils.logger import logger
+from app.utils.token_estimator import estimate_tokens
+
+SESSION_RAG_TOP_K = 3
+
+
+class TutoringSession:
+    __slots__ = ("session_id", "created_at", "last_active", "turns", "rag_chunks", "rag_index_version", "lock")
+
+    def __init__(self) -> None:
+        self.session_id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.turns: list[dict] = []  # {"role", "content", "tokens"}
+        self.rag_chunks: list[str] = []
+        self.rag_index_version: int | None = None
+        self.lock = asyncio.Lock()  # one turn at a time per session
+
+    def add_turn(self, role: str, content: str) -> None:
+        self.turns.append({"role": role, "content": content, "tokens": estimate_tokens(content)})
+        max_turns = get_settings().session_max_turns
+        if len(self.turns) > max_turns:
+            del self.turns[: len(self.turns) - max_turns]
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "created_at": self.created_at,
+            "turns": [{"role": t["role"], "content": t["content"]} for t in self.turns],
+            "history_tokens": sum(t["tokens"] for t in self.turns),
+        }
+
+
+class SessionStore:
+    def __init__(self) -> None:
+        self._sessions: OrderedDict[str, TutoringSession] = OrderedDict()
+
+    def create(self) -> TutoringSession:
+        session = TutoringSession()
+        self._sessions[session.session_id] = session
+        max_sessions = get_settings().session_max_sessions
+        while len(self._sessions) > max_sessions:
+            self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> TutoringSession | None:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_active > get_settings().session_ttl_sec:
+            del self._sessions[session_id]
+            return None
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+SESSION_STORE = SessionStore()
+
+
+def _trim_history(turns: list[dict], budget: int) -> list[dict]:
+    """Most recent turns whose estimated tokens fit `budget`, starting with a user turn."""
+    kept: list[dict] = []
+    used = 0
+    for turn in reversed(turns):
+        if used + turn["tokens"] > budget:
+            break
+        kept.append(turn)
+        used += turn["tokens"]
+    kept.reverse()
+    while kept and kept[0]["role"] != "user":
+        kept.pop(0)
+    return kept
+
+
+async def _session_chunks(session: TutoringSession, prompt: str) -> tuple[list[str], bool]:
+    """(chunks, reused): the previous turn's chunks for short follow-ups, else a fresh search."""
+    if index_count() == 0:
+        return [], False
+    version = index_version()
+    if (
+        session.rag_chunks
+        and session.rag_index_version == version
+        and estimate_tokens(prompt) <= get_settings().session_rag_reuse_max_tokens
+    ):
+        return session.rag_chunks, True
+    chunks = await retrieve_top_k_async(prompt, k=SESSION_RAG_TOP_K)
+    if chunks:
+        session.rag_chunks = chunks
+        session.rag_index_version = version
+    return chunks, False
+
+
+def _build_messages(history: list[dict], chunks: list[str], prompt: str) -> list[dict]:
+    messages = [{"role": t["role"], "content": t["content"]} for t in history]
+    # Retrieved context goes with the newest question only, so earlier
+    # messages (the reusable prefix) stay byte-identical between turns
+    content = f"Context:\n{chr(10).join(chunks)}\n\nUser:\n{prompt}" if chunks else prompt
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+async def post_turn(
+    session: TutoringSession,
+    provider: Provider,
+    model: str,
+    prompt: str,
+    temperature: float,
+    risk_score: float | None = None,
+    fingerprint: str | None = None,
+) -> dict:
+    async with session.lock:
+        history = _trim_history(session.turns, get_settings().session_history_token_budget)
+        chunks, rag_reused = await _session_chunks(session, prompt)
+        messages = _build_messages(history, chunks, prompt)
+        effective_prompt = flatten_messages(messages)
+        (
+            result,
+            provider_used,
+            latency_ms,
+            original_provider,
+            routing_reason,
+            adaptive_score_used,
+            circuit_triggered,
+            attempts,
+        ) = await generate_with_fallback(
+            provider=provider,
+            model=model,
+            prompt=effective_prompt,
+            temperature=temperature,
+            messages=messages,
+        )
+        session.add_turn("user", prompt)
+        session.add_turn("assistant", result)
+    prompt_tokens = estimate_tokens(effective_prompt)
+    logger.info(
+        "session_turn",
+        extra={
+            "session_id": session.session_id,
+            "history_turns": len(history),
+            "prompt_tokens": prompt_tokens,
+            "rag_reused": rag_reused,
+        },
+    )
+    insert_log(
+        provider=provider_used,
+        model=model,
+        prompt_length=prompt_tokens,
+        latency_ms=latency_ms,
+        original_provider=original_provider,
+        routing_reason=routing_reason,
+        rag_used=bool(chunks),
+        risk_score=risk_score,
+        fingerprint=fingerprint,
+        adaptive_score_used=adaptive_score_used,
+        circuit_triggered=circuit_triggered,
+        prompt_preview=prompt[:300] if prompt else None,
+        category=_infer_category(prompt),
+        attempts=attempts,
+    )
+    return {
+        "response": result,
+        "provider_used": provider_used,
+        "latency_ms": latency_ms,
+        "routing_reason": routing_reason,
+        "prompt_tokens": prompt_tokens,
+        "history_turns": len(history),
+        "rag_reused": rag_reused,
+    }
@@ -0,0 +1,23 @@
+import fcntl
+import os
+from pathlib import Path
+
+
+def try_lock(path: Path) -> int | None:
+    """Take an exclusive flock on `path` (created if missing) without blocking.
+
+    Returns the open descriptor holding the lock, or None if another process
+    holds it. The lock lasts until the descriptor is closed (release) or the
+    process exits.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def release(fd: int) -> None:
+    os.close(fd)
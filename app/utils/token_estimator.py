@@ -1,11 +1,14 @@
 import re
 
+# Every estimate is at least one token per CHARS_PER_TOKEN characters
+CHARS_PER_TOKEN = 4
+
 
 def estimate_tokens(text: str) -> int:
     if not text or not text.strip():
         return 0
     words = len(re.findall(r"\S+", text))
     if words == 0:
-        return max(1, len(text) // 4)
+        return max(1, len(text) // CHARS_PER_TOKEN)
     estimated = int(words * 1.3)
-    return max(estimated, len(text) // 4)
+    return max(estimated, len(text) // CHARS_PER_TOKEN)
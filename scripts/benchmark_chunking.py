@@ -0,0 +1,118 @@
+# =============================================================================
+# scripts/benchmark_chunking.py — Sentence chunker vs the previous word chunker
+# =============================================================================
+# Times chunk_text (500 words, regex over the whole document) against the
+# streaming SentenceChunker on a synthetic multi-MB document (or --file),
+# reporting throughput, peak memory while chunking, chunk count / size, and
+# how many chunks end mid-sentence. The sentence chunker is run on the whole string
+# and fed in 64 KB pieces (the bulk ingest path).
+#
+# Usage: python scripts/benchmark_chunking.py --mb 8 [--file doc.txt] [--repeat 3]
+# =============================================================================
+
+import argparse
+import gc
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.rag.chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, chunk_text, iter_chunks  # noqa: E402
+
+WORDS = (
+    "the a of to and in retrieval index vector embedding query latency model token chunk sentence "
+    "paragraph document search cache batch throughput memory recall dimension cosine distance "
+    "neighbor cluster graph quantization training sample provider request response stream"
+).split()
+SENTENCE_ENDS = (".", ".", ".", "?", "!", '."')
+PIECE_CHARS = 64 * 1024
+
+
+def synthetic_text(mb: float, seed: int = 0) -> str:
+    """English-like prose: sentences of 5-35 words, paragraphs of 2-8 sentences."""
+    rng = random.Random(seed)
+    target = int(mb * 1024 * 1024)
+    paragraphs = []
+    size = 0
+    while size < target:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = rng.choices(WORDS, k=rng.randint(5, 35))
+            sentences.append(" ".join(words).capitalize() + rng.choice(SENTENCE_ENDS))
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def pieces(text: str):
+    for start in range(0, len(text), PIECE_CHARS):
+        yield text[start : start + PIECE_CHARS]
+
+
+def ends_mid_sentence(chunk: str) -> bool:
+    return not chunk.rstrip("\"')]”’").endswith((".", "!", "?", "…"))
+
+
+def measure(name: str, run, repeat: int) -> dict:
+    """`run()` returns an iterable of chunk texts; peak memory is traced while consuming it without keeping them."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        chunks = list(run())
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    for _ in run():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"name": name, "seconds": statistics.median(times), "peak_bytes": peak, "chunks": chunks}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark RAG chunkers")
+    parser.add_argument("--mb", type=float, default=8.0, help="size of the synthetic document")
+    parser.add_argument("--file", help="benchmark this UTF-8 file instead")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokens", type=int, default=CHUNK_TOKENS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    text = Path(args.file).read_text(encoding="utf-8") if args.file else synthetic_text(args.mb)
+    mb = len(text.encode("utf-8")) / 1024 / 1024
+    print(f"document: {mb:.1f} MB, {len(text):,} chars, repeat={args.repeat}")
+
+    results = [
+        measure("chunk_text (500 words)", lambda: chunk_text(text), args.repeat),
+        measure(
+            f"iter_chunks ({args.tokens} tokens)",
+            lambda: (c.text for c in iter_chunks(text, args.tokens, args.overlap)),
+            args.repeat,
+        ),
+        measure(
+            f"iter_chunks, {PIECE_CHARS // 1024} KB pieces",
+            lambda: (c.text for c in iter_chunks(pieces(text), args.tokens, args.overlap)),
+            args.repeat,
+        ),
+    ]
+
+    print(f"{'chunker':34} {'MB/s':>8} {'peak MB':>9} {'chunks':>8} {'avg chars':>10} {'mid-sentence':>13}")
+    for r in results:
+        chunks = r["chunks"]
+        avg = sum(len(c) for c in chunks) / len(chunks) if chunks else 0
+        mid = sum(ends_mid_sentence(c) for c in chunks) / len(chunks) if chunks else 0
+        print(
+            f"{r['name']:34} {mb / r['seconds']:8.1f} {r['peak_bytes'] / 1024 / 1024:9.1f} "
+            f"{len(chunks):8d} {avg:10.0f} {mid:12.1%}"
+        )
+    print("peak MB: memory allocated while chunking, beyond the document itself (chunks consumed one at a time)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# =============================================================================
+# scripts/load_test.py — Drive /generate at a target rate and report latency
+# =============================================================================
+# Open loop (--rps > 0): requests start on a fixed schedule regardless of how
+# fast earlier ones finish, capped at --concurrency in flight (requests that
+# could not start on time are counted as "late"). Closed loop (--rps 0):
+# --concurrency workers send back-to-back. Prompts are unique per request so
+# the response cache does not hide provider latency (--repeat-prompt to test
+# the cache instead).
+#
+# Offline: start scripts/mock_providers.py and point the *_BASE_URL settings
+# at it (see .env.example), then run the backend and this script.
+#
+# Usage: python scripts/load_test.py --rps 20 --duration 30 --concurrency 64
+# =============================================================================
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+try:
+    import httpx
+except ImportError:
+    print("Install httpx: pip install httpx")
+    sys.exit(1)
+
+BASE = os.environ.get("BASE_URL", "http://127.0.0.1:8000")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latencies_ms: list[float] = []
+        self.server_ms: list[float] = []
+        self.statuses: Counter[str] = Counter()
+        self.reasons: Counter[str] = Counter()
+        self.providers: Counter[str] = Counter()
+        self.late = 0
+
+    def record(self, status: str, elapsed_ms: float, body: dict | None) -> None:
+        self.statuses[status] += 1
+        if status != "200":
+            return
+        self.latencies_ms.append(elapsed_ms)
+        if body:
+            if body.get("latency_ms") is not None:
+                self.server_ms.append(float(body["latency_ms"]))
+            self.reasons[body.get("routing_reason") or "-"] += 1
+            self.providers[body.get("provider_used") or "-"] += 1
+
+
+async def one_request(client: httpx.AsyncClient, args: argparse.Namespace, n: int, results: Results) -> None:
+    prompt = args.prompt if args.repeat_prompt else f"{args.prompt} (load test #{n})"
+    payload = {"provider": args.provider, "model": "", "prompt": prompt, "temperature": 0.7}
+    start = time.perf_counter()
+    try:
+        r = await client.post(f"{BASE}/generate", json=payload)
+        elapsed = (time.perf_counter() - start) * 1000
+        body = r.json() if r.status_code == 200 else None
+        results.record(str(r.status_code), elapsed, body)
+    except httpx.HTTPError as e:
+        results.record(type(e).__name__, (time.perf_counter() - start) * 1000, None)
+
+
+async def open_loop(client: httpx.AsyncClient, args: argparse.Namespace, results: Results) -> int:
+    slots = asyncio.Semaphore(args.concurrency)
+    interval = 1.0 / args.rps
+    start = time.perf_counter()
+    tasks: set[asyncio.Task] = set()
+    n = 0
+
+    async def run(i: int) -> None:
+        try:
+            await one_request(client, args, i, results)
+        finally:
+            slots.release()
+
+    while (due := start + n * interval) < start + args.duration:
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if slots.locked():
+            results.late += 1
+        await slots.acquire()
+        task = asyncio.create_task(run(n))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        n += 1
+    if tasks:
+        await asyncio.gather(*tasks)
+    return n
+
+
+async def closed_loop(client: httpx.AsyncClient, args: argparse.Namespace, results: Results) -> int:
+    deadline = time.perf_counter() + args.duration
+    counter = iter(range(sys.maxsize))
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            await one_request(client, args, next(counter), results)
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return sum(results.statuses.values())
+
+
+def report(results: Results, sent: int, wall_sec: float, args: argparse.Namespace) -> None:
+    ok = results.statuses.get("200", 0)
+    mode = f"open loop @ {args.rps} rps" if args.rps > 0 else "closed loop"
+    print(f"{mode}, concurrency {args.concurrency}, {wall_sec:.1f}s")
+    print(f"  sent {sent}  ok {ok}  throughput {ok / wall_sec:.2f} req/s  late starts {results.late}")
+    errors = {k: v for k, v in results.statuses.items() if k != "200"}
+    if errors:
+        print("  errors: " + ", ".join(f"{k}={v}" for k, v in sorted(errors.items())))
+    for label, values in (("client ms", results.latencies_ms), ("server ms", results.server_ms)):
+        values = sorted(values)
+        if not values:
+            continue
+        stats = "  ".join(f"p{q}={percentile(values, q):.0f}" for q in (50, 90, 95, 99))
+        print(f"  {label:<10} {stats}  max={values[-1]:.0f}")
+    if results.providers:
+        print("  providers: " + ", ".join(f"{k}={v}" for k, v in results.providers.most_common()))
+    if results.reasons:
+        print("  routing:   " + ", ".join(f"{k}={v}" for k, v in results.reasons.most_common()))
+
+
+async def run(args: argparse.Namespace) -> int:
+    results = Results()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        if args.rps > 0:
+            sent = await open_loop(client, args, results)
+        else:
+            sent = await closed_loop(client, args, results)
+        wall = time.perf_counter() - start
+    report(results, sent, wall, args)
+    return 0 if results.statuses.get("200", 0) else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load generator for POST /generate")
+    parser.add_argument("--rps", type=float, default=10.0, help="target request rate (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=32, help="max requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--provider", default="auto")
+    parser.add_argument("--prompt", default="Explain the chain rule with an example")
+    parser.add_argument("--repeat-prompt", action="store_true", help="send the same prompt (exercises the cache)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# =============================================================================
+# scripts/mock_providers.py — Local mock of every LLM provider API
+# =============================================================================
+# One server speaks all four wire formats, told apart by path:
+#   OpenAI  POST /v1/chat/completions            (OPENAI_BASE_URL=http://HOST:PORT/v1)
+#   Groq    POST /openai/v1/chat/completions     (GROQ_BASE_URL=http://HOST:PORT/openai/v1)
+#   Gemini  POST /v1beta/models/M:generateContent, :streamGenerateContent?alt=sse
+#                                                (GEMINI_BASE_URL=http://HOST:PORT/v1beta)
+#   Ollama  POST /api/generate, /api/chat, GET /api/tags  (OLLAMA_BASE_URL=http://HOST:PORT)
+# plus the GET /models endpoints used by the health prober. Streaming is
+# supported for all of them (SSE / NDJSON).
+#
+# Latency is log-normal: median --latency-ms, spread --latency-sigma (0 =
+# fixed). --error-rate answers 500, --rate-limit-rate answers 429. Per-provider
+# overrides: --provider-latency openai=800,ollama=2500 (median ms).
+#
+# Usage: python scripts/mock_providers.py --port 9000 --latency-ms 300 --error-rate 0.02
+# =============================================================================
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+try:
+    import uvicorn
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
+except ImportError:
+    print("Install the backend requirements: pip install -r requirements.txt")
+    sys.exit(1)
+
+WORDS = (
+    "the derivative measures how a function changes as its input changes and the "
+    "integral accumulates those changes over an interval which is why the two are inverse"
+).split()
+
+
+class MockConfig:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.latency_ms = args.latency_ms
+        self.latency_sigma = args.latency_sigma
+        self.error_rate = args.error_rate
+        self.rate_limit_rate = args.rate_limit_rate
+        self.response_tokens = args.response_tokens
+        self.token_interval_ms = args.token_interval_ms
+        self.provider_latency: dict[str, float] = {}
+        for item in filter(None, (args.provider_latency or "").split(",")):
+            name, _, value = item.partition("=")
+            self.provider_latency[name.strip()] = float(value)
+        self.requests: dict[str, int] = {}
+
+    def latency_sec(self, provider: str) -> float:
+        median = self.provider_latency.get(provider, self.latency_ms)
+        if self.latency_sigma <= 0:
+            return median / 1000
+        return random.lognormvariate(0.0, self.latency_sigma) * median / 1000
+
+    def failure(self) -> Response | None:
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse({"error": {"message": "mock rate limit"}}, status_code=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": {"message": "mock server error"}}, status_code=500)
+        return None
+
+    def tokens(self) -> list[str]:
+        return [WORDS[i % len(WORDS)] + " " for i in range(self.response_tokens)]
+
+
+def build_app(cfg: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM providers")
+
+    async def begin(provider: str) -> Response | None:
+        """Count the call, wait for time-to-first-byte, maybe fail."""
+        cfg.requests[provider] = cfg.requests.get(provider, 0) + 1
+        await asyncio.sleep(cfg.latency_sec(provider))
+        return cfg.failure()
+
+    async def paced(chunks: list[str]):
+        for chunk in chunks:
+            yield chunk
+            if cfg.token_interval_ms > 0:
+                await asyncio.sleep(cfg.token_interval_ms / 1000)
+
+    # -- OpenAI / Groq --------------------------------------------------------
+
+    async def chat_completions(provider: str, request: Request) -> Response:
+        body = await request.json()
+        failed = await begin(provider)
+        if failed is not None:
+            return failed
+        model = body.get("model", "mock")
+        tokens = cfg.tokens()
+        if not body.get("stream"):
+            return JSONResponse({
+                "id": "mock",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+            })
+        events = [
+            "data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": t}}]}) + "\n\n"
+            for t in tokens
+        ] + ["data: [DONE]\n\n"]
+        return StreamingResponse(paced(events), media_type="text/event-stream")
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request) -> Response:
+        return await chat_completions("openai", request)
+
+    @app.post("/openai/v1/chat/completions")
+    async def groq_chat(request: Request) -> Response:
+        return await chat_completions("groq", request)
+
+    @app.api_route("/v1/models", methods=["GET", "HEAD"])
+    @app.api_route("/openai/v1/models", methods=["GET", "HEAD"])
+    @app.api_route("/v1beta/models", methods=["GET", "HEAD"])
+    async def list_models() -> dict:
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    # -- Gemini ---------------------------------------------------------------
+
+    @app.get("/v1beta/models/{model}")
+    async def gemini_model(model: str) -> dict:
+        return {"name": f"models/{model}"}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini_generate(model_action: str, request: Request) -> Response:
+        _, _, action = model_action.partition(":")
+        failed = await begin("gemini")
+        if failed is not None:
+            return failed
+        tokens = cfg.tokens()
+
+        def candidate(text: str) -> dict:
+            return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+        if action == "streamGenerateContent":
+            events = ["data: " + json.dumps(candidate(t)) + "\r\n\r\n" for t in tokens]
+            return StreamingResponse(paced(events), media_type="text/event-stream")
+        return JSONResponse(candidate("".join(tokens)))
+
+    # -- Ollama ---------------------------------------------------------------
+
+    @app.get("/api/tags")
+    async def ollama_tags() -> dict:
+        return {"models": [{"name": "llama3.2"}]}
+
+    async def ollama_reply(request: Request, chat: bool) -> Response:
+        body = await request.json()
+        if not chat and not body.get("prompt"):
+            return JSONResponse({"model": body.get("model"), "response": "", "done": True})  # preload
+        failed = await begin("ollama")
+        if failed is not None:
+            return failed
+        tokens = cfg.tokens()
+
+        def line(text: str, done: bool) -> dict:
+            if chat:
+                return {"message": {"role": "assistant", "content": text}, "done": done}
+            return {"response": text, "done": done}
+
+        if body.get("stream", True):
+            lines = [json.dumps(line(t, False)) + "\n" for t in tokens] + [json.dumps(line("", True)) + "\n"]
+            return StreamingResponse(paced(lines), media_type="application/x-ndjson")
+        return JSONResponse(line("".join(tokens), True))
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request) -> Response:
+        return await ollama_reply(request, chat=False)
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request) -> Response:
+        return await ollama_reply(request, chat=True)
+
+    @app.api_route("/", methods=["GET", "HEAD"])
+    async def root() -> dict:
+        return {"mock": True, "requests": cfg.requests, "started_at": started_at}
+
+    started_at = time.time()
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mock OpenAI/Groq/Gemini/Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="median time to first byte")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread (0 = fixed)")
+    parser.add_argument("--provider-latency", default="", help="per-provider medians, e.g. openai=800,ollama=2500")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0, help="delay between streamed tokens")
+    args = parser.parse_args()
+    uvicorn.run(build_app(MockConfig(args)), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())